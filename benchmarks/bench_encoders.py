@@ -0,0 +1,35 @@
+"""Compare payload size, encode time and heap allocated per encode of the payload encoders.
+
+json_fixed writes into a reused buffer, so its per-reading allocation is the
+figure to watch; its batches go through json.dumps like json's.
+
+Run from the repository root:
+    python benchmarks/bench_encoders.py
+    micropython benchmarks/bench_encoders.py
+"""
+import bench_utils
+
+bench_utils.add_src_to_path()
+
+from encoders import get_encoder
+
+ITERATIONS = 2000
+BATCH_SIZE = 10
+READING = (22.53, 1013.25, 41.7, 120345.0, 1712345678)
+
+
+def main():
+    batch = [READING] * BATCH_SIZE
+    print(f"{'format':<10} {'bytes/reading':>14} {'encode us':>10} {'alloc B':>8} {'bytes/batch':>12} {'batch us':>9}")
+    for name in ("json", "json_fixed", "struct"):
+        encoder = get_encoder(name)
+        single = len(encoder.encode(*READING))
+        batched = len(encoder.encode_batch(batch))
+        single_us = bench_utils.time_per_call_us(lambda: encoder.encode(*READING), ITERATIONS)
+        batch_us = bench_utils.time_per_call_us(lambda: encoder.encode_batch(batch), ITERATIONS // BATCH_SIZE)
+        alloc = bench_utils.allocated_bytes_per_call(lambda: encoder.encode(*READING))
+        print(f"{name:<10} {single:>14} {single_us:>10.1f} {alloc:>8.0f} {batched:>12} {batch_us:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Failover time between MQTT brokers, using the firmware's broker pool and connect path.
+
+Starts --brokers in-process tools/fake_broker.py instances on separate
+ports (reply latencies from --latency-ms), loads src/main.py against the
+fake hardware in sim/ with MQTT_BROKERS pointing at them, and publishes a
+QoS 1 message every --tick seconds through main.connect_mqtt, as task_main
+does once a second. Then it stops brokers and measures how long publishing
+is interrupted:
+
+    primary_down    the broker in use stops
+    second_down     the broker failed over to stops as well
+    all_down        every broker stops for --outage seconds; the time is
+                    counted from the moment one comes back, so it shows
+                    what the backoff costs
+
+Results are written as JSON; pass --compare to print the change against an
+earlier results file.
+
+Usage (CPython, from the repository root):
+    python benchmarks/bench_failover.py [--brokers 3] [--latency-ms 20 5 50] [--tick 1]
+        [--outage 10] [--output bench_failover.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import bench_utils
+
+bench_utils.add_src_to_path("sim")
+
+import run_sim  # noqa: E402  (also puts src/ and tools/ on sys.path)
+import clock as sim_clock  # noqa: E402
+from fake_broker import FakeBroker  # noqa: E402
+
+TOPIC = "bench/failover"
+
+
+class Publisher:
+    """Publishes every tick and records (time, broker port) of each acknowledged message."""
+
+    def __init__(self, main, client, tick):
+        self.main = main
+        self.client = client
+        self.tick = tick
+        self.delivered = []
+
+    async def run(self):
+        while True:
+            if not self.client.is_connected() and not await self.main.connect_mqtt(self.client):
+                await asyncio.sleep(self.tick)
+                continue
+            try:
+                await self.client.publish(TOPIC, b"x", qos=1)
+                self.delivered.append((time.monotonic(), self.client.port))
+            except OSError:
+                await self.client.disconnect()
+            await asyncio.sleep(self.tick)
+
+    async def resumed_after(self, since, timeout=120):
+        """Seconds from since until the first delivery after it."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for delivered, port in self.delivered:
+                if delivered > since:
+                    return round(delivered - since, 3), port
+            await asyncio.sleep(0.01)
+        raise TimeoutError("publishing did not resume")
+
+    def current_port(self):
+        return self.delivered[-1][1]
+
+
+async def bench(args):
+    latencies = (args.latency_ms * args.brokers)[:args.brokers]
+    brokers = [await FakeBroker(port=0, latency_ms=latency).start() for latency in latencies]
+    ports = [broker.port for broker in brokers]
+    by_port = dict(zip(ports, brokers))
+    sim_clock.install(1)
+    main = run_sim.load_firmware({"MQTT_BROKERS": [f"127.0.0.1:{port}" for port in ports],
+                                  "CONSOLE_LOG_LEVEL": args.log_level}, ports[0])
+    client = main.create_mqtt_client(keepalive=0)
+    publisher = Publisher(main, client, args.tick)
+    task = asyncio.create_task(publisher.run())
+    results = {
+        "benchmark": "failover",
+        "implementation": sys.implementation.name,
+        "settings": {"brokers": args.brokers, "latency_ms": latencies, "tick_s": args.tick, "outage_s": args.outage},
+        "scenarios": {},
+    }
+
+    async def stop(port):
+        await by_port[port].stop()
+
+    async def restart(port):
+        by_port[port].port = port
+        await by_port[port].start()
+
+    try:
+        await publisher.resumed_after(0)
+        await asyncio.sleep(args.tick * 3)
+        for name in ("primary_down", "second_down"):
+            port = publisher.current_port()
+            since = time.monotonic()
+            await stop(port)
+            seconds, new_port = await publisher.resumed_after(since)
+            results["scenarios"][name] = {"seconds": seconds, "from": ports.index(port), "to": ports.index(new_port)}
+            await asyncio.sleep(args.tick * 3)
+        for port in ports:
+            if by_port[port]._server is None:
+                await restart(port)
+        await asyncio.sleep(args.tick * 3)
+
+        for port in ports:
+            await stop(port)
+        await asyncio.sleep(args.outage)
+        since = time.monotonic()
+        await restart(ports[0])
+        seconds, new_port = await publisher.resumed_after(since, timeout=args.outage + 600)
+        results["scenarios"]["all_down"] = {"seconds": seconds, "to": ports.index(new_port)}
+    finally:
+        task.cancel()
+        await client.disconnect()
+        for broker in brokers:
+            await broker.stop()
+        run_sim._unload_firmware()
+
+    pool = main.get_broker_pool()
+    results["endpoints"] = [{"latency_ms": round(e.latency_ms, 1) if e.latency_ms is not None else None,
+                             "connects": e.connects, "failures": e.failures} for e in pool.endpoints]
+    results["failovers"] = main.registry.counter("broker_failovers").value
+    return results
+
+
+def print_results(results):
+    for name, row in results["scenarios"].items():
+        moved = f"broker {row['from']} -> {row['to']}" if "from" in row else f"back on broker {row['to']}"
+        print(f"{name:<14} {row['seconds']:>8.3f}s  {moved}")
+    for i, endpoint in enumerate(results["endpoints"]):
+        print(f"broker {i}: connect {endpoint['latency_ms']}ms, {endpoint['connects']} connects, "
+              f"{endpoint['failures']} consecutive failures")
+    print(f"failovers: {results['failovers']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--brokers", type=int, default=3)
+    parser.add_argument("--latency-ms", type=int, nargs="+", default=[20, 5, 50], help="reply delay per broker")
+    parser.add_argument("--tick", type=float, default=1, help="seconds between publish attempts (task_main: 1)")
+    parser.add_argument("--outage", type=float, default=10, help="seconds every broker is down in all_down")
+    parser.add_argument("--log-level", type=int, default=3, help="console log level of the firmware")
+    parser.add_argument("--output", default="bench_failover.json", help="results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    os.chdir(tempfile.mkdtemp(prefix="bench-flash-"))
+
+    results = asyncio.run(bench(args))
+    print_results(results)
+    bench_utils.write_results(output, results)
+    print(f"results written to {output}")
+
+    if baseline is not None:
+        print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+        for name, old, new, ratio in bench_utils.compare_results(baseline, results):
+            if name.startswith("settings."):
+                continue
+            print(f"{name:<28} {old:>10} {new:>10} {ratio:>7.2f}" if ratio is not None else
+                  f"{name:<28} {old:>10} {new:>10} {'-':>7}")
+
+
+if __name__ == "__main__":
+    main()
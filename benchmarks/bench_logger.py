@@ -0,0 +1,78 @@
+"""Cost of a suppressed DEBUG record: eager f-string log() versus lazy logf(),
+and the flash used per record by the text and binary file formats.
+
+Run from the repository root:
+    python benchmarks/bench_logger.py
+    micropython benchmarks/bench_logger.py
+"""
+import os
+
+import bench_utils
+
+bench_utils.add_src_to_path()
+
+import logger
+from logger import log, logf, LOG_LEVEL_DEBUG, LOG_LEVEL_INFO, LOG_LEVEL_ERROR
+
+ITERATIONS = 5000
+RECORDS = 200
+STATUS = 1
+
+
+def eager():
+    log(f"Waiting for connection... status={STATUS}", LOG_LEVEL_DEBUG)
+
+
+def lazy():
+    logf("Waiting for connection... status=%s", STATUS, level=LOG_LEVEL_DEBUG)
+
+
+# Lines the firmware logs repeatedly in the field
+FIELD_MESSAGES = (
+    "Retrying in %ds...",
+    "Error occurred while sending data: [Errno %d] EHOSTUNREACH",
+    "Wi-Fi connected in %dms (fast path): ('192.168.1.50', '255.255.255.0', '192.168.1.1', '192.168.1.1')",
+    "MQTT resending %d unacknowledged message(s)",
+    "Memory recovered (%d bytes free): resuming normal operation",
+)
+
+
+def file_bytes(file_format, records=RECORDS):
+    """Bytes on flash after records log() calls, as (log file, string table)."""
+    path = f"bench_{file_format}.log"
+    logger.set_file_format(file_format)
+    for i in range(records):
+        log(FIELD_MESSAGES[i % len(FIELD_MESSAGES)] % (i * 37), LOG_LEVEL_INFO, path)
+    logger.flush()
+    sizes = []
+    for name in (path, path + ".str"):
+        try:
+            sizes.append(os.stat(name)[6])
+            os.remove(name)
+        except OSError:
+            sizes.append(0)
+    return sizes
+
+
+def main():
+    logger.set_level(LOG_LEVEL_INFO)
+    print(f"{'call':<8} {'us/call':>8} {'bytes/call':>11}")
+    for name, fn in (("log", eager), ("logf", lazy)):
+        us = bench_utils.time_per_call_us(fn, ITERATIONS)
+        allocated = bench_utils.allocated_bytes_per_call(fn)
+        print(f"{name:<8} {us:>8.2f} {allocated:>11.0f}")
+
+    logger.set_level(LOG_LEVEL_INFO, console=LOG_LEVEL_ERROR + 1, file=LOG_LEVEL_INFO)
+    budget = logger.LOG_FILE_MAX_SIZE * (logger.LOG_FILE_BACKUP_COUNT + 1)
+    logger.LOG_FILE_MAX_SIZE = 1 << 30  # keep everything in one file
+    text = file_bytes("text")[0]
+    binary, table = file_bytes("binary")
+    print(f"file bytes/record: text {text / RECORDS:.1f}, binary {binary / RECORDS:.1f} "
+          f"({text / binary:.1f}x denser) + {table} bytes of string table")
+    # The table is paid once, so what counts is how many records fit the log files' budget with it
+    print(f"records in {budget} bytes: text {budget * RECORDS // text}, "
+          f"binary {(budget - table) * RECORDS // binary} ({(budget - table) / binary * text / budget:.1f}x more)")
+
+
+if __name__ == "__main__":
+    main()
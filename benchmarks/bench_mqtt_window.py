@@ -0,0 +1,123 @@
+"""Backlog drain throughput of QoS 1 publishing with and without a PUBACK window.
+
+Publishes --messages JSON readings through src/mqtt_async.py to an
+in-process tools/fake_broker.py that delays every reply by --latency-ms
+(plus up to --jitter-ms, so PUBACKs come back out of order). For each
+latency it measures:
+
+    sequential   MQTTClient.publish(qos=1) per message, one round trip each
+    window N     MQTTClient.publish_pipelined with max_inflight=N
+
+and reports messages per second and the speedup over sequential. Results
+are written as JSON; pass --compare to print the change against an earlier
+results file.
+
+Usage (CPython, from the repository root):
+    python benchmarks/bench_mqtt_window.py [--messages 200] [--latency-ms 50 100 150]
+        [--jitter-ms 20] [--windows 2 4 8 16] [--output bench_mqtt_window.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import bench_utils
+
+bench_utils.add_src_to_path("sim")
+
+import run_sim  # noqa: E402  (also puts src/ and tools/ on sys.path)
+import clock as sim_clock  # noqa: E402
+from fake_broker import FakeBroker  # noqa: E402
+from encoders import get_encoder  # noqa: E402
+from mqtt_async import MQTTClient  # noqa: E402
+
+TOPIC = "bench/bme688"
+
+
+def payloads(n):
+    encoder = get_encoder("json")
+    return [encoder.encode(21.5 + i * 0.01, 1013.2, 45.0, 120000.0, 1700000000 + i * 60) for i in range(n)]
+
+
+async def drain(broker, messages, window):
+    """Publish messages to the broker; window None publishes one at a time. Returns messages per second."""
+    client = MQTTClient("bench", "127.0.0.1", broker.port, keepalive=0, max_inflight=window or 1)
+    await client.connect()
+    try:
+        started = bench_utils.ticks_us()
+        if window is None:
+            for msg in messages:
+                await client.publish(TOPIC, msg, qos=1)
+        else:
+            acked = await client.publish_pipelined(TOPIC, messages)
+            assert acked == len(messages), acked
+        elapsed_us = bench_utils.ticks_diff(bench_utils.ticks_us(), started)
+    finally:
+        await client.disconnect()
+    return round(len(messages) / (elapsed_us / 1e6), 1)
+
+
+async def bench(args):
+    sim_clock.install(1)
+    messages = payloads(args.messages)
+    results = {
+        "benchmark": "mqtt_window",
+        "implementation": sys.implementation.name,
+        "settings": {"messages": args.messages, "jitter_ms": args.jitter_ms, "windows": args.windows},
+        "latency": {},
+    }
+    for latency in args.latency_ms:
+        broker = await FakeBroker(port=0, latency_ms=latency, jitter_ms=args.jitter_ms).start()
+        try:
+            row = {"sequential": await drain(broker, messages, None)}
+            for window in args.windows:
+                row[f"window_{window}"] = await drain(broker, messages, window)
+        finally:
+            await broker.stop()
+        results["latency"][f"{latency}ms"] = row
+    return results
+
+
+def print_results(results):
+    columns = list(next(iter(results["latency"].values())))
+    print(f"{'latency':<9}" + "".join(f"{name:>12}" for name in columns) + "   (messages/s)")
+    for latency, row in results["latency"].items():
+        print(f"{latency:<9}" + "".join(f"{row[name]:>12}" for name in columns))
+    for latency, row in results["latency"].items():
+        best = max(columns[1:], key=lambda name: row[name]) if len(columns) > 1 else columns[0]
+        print(f"{latency}: {best} drains {row[best] / row['sequential']:.1f}x faster than sequential")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="messages per drain")
+    parser.add_argument("--latency-ms", type=int, nargs="+", default=[50, 100, 150], help="broker reply delays")
+    parser.add_argument("--jitter-ms", type=int, default=20, help="extra random reply delay")
+    parser.add_argument("--windows", type=int, nargs="+", default=[2, 4, 8, 16], help="max_inflight values")
+    parser.add_argument("--output", default="bench_mqtt_window.json", help="results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(bench(args))
+    print_results(results)
+    output = os.path.abspath(args.output)
+    bench_utils.write_results(output, results)
+    print(f"results written to {output}")
+
+    if baseline is not None:
+        print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+        for name, old, new, ratio in bench_utils.compare_results(baseline, results):
+            if name.startswith("settings."):
+                continue
+            print(f"{name:<28} {old:>10} {new:>10} {ratio:>7.2f}" if ratio is not None else
+                  f"{name:<28} {old:>10} {new:>10} {'-':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""End-to-end cost of one sensor-to-broker cycle of task_main.
+
+Runs the real src/main.py pipeline (get_sensor_data, SampleBuffer, payload
+encoder, mqtt_async publish, the loop's log calls) against the fake hardware
+in sim/ and an in-process tools/fake_broker.py, cycle after cycle with no
+sleep in between. Reports per-stage latency percentiles, the achievable
+messages per second, bytes per message, heap allocated per cycle, and how
+much of a DATA_SEND_PERIOD of --period seconds one cycle uses.
+
+Stages:
+    read     main.read_sensor_into
+    buffer   SampleBuffer.push
+    encode   PAYLOAD_ENCODER.encode
+    publish  MQTTClient.publish (waits for PUBACK with --qos 1); its heap figure
+             only counts building the packet, not the host event loop
+    log      the logf calls task_main makes per reading
+
+Results are written as JSON; pass --compare to print the change against an
+earlier results file.
+
+Usage (CPython, from the repository root):
+    python benchmarks/bench_pipeline.py [--cycles 2000] [--format json|struct] [--qos 0|1]
+        [--steady-state] [--latency-ms 0] [--log-level 1] [--period 1] [--output bench_pipeline.json]
+        [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+import bench_utils
+
+bench_utils.add_src_to_path("sim")
+
+import run_sim  # noqa: E402  (also puts src/ and tools/ on sys.path)
+import clock as sim_clock  # noqa: E402
+from fake_broker import FakeBroker  # noqa: E402
+
+STAGES = ("read", "buffer", "encode", "publish", "log")
+
+
+async def run_cycles(main, bme, client, buffer, cycles, timings=None, allocations=None):
+    """Run cycles of the pipeline, appending per-stage microseconds and/or allocated bytes."""
+    ticks_us = bench_utils.ticks_us
+    ticks_diff = bench_utils.ticks_diff
+    encoder = main.PAYLOAD_ENCODER
+    topic = main.MQTT_DATA_TOPIC
+    qos = main.MQTT_QOS
+    reading = main.array('f', (0.0, 0.0, 0.0, 0.0))
+    stamps = [0] * (len(STAGES) + 1)
+    peaks = [0] * len(STAGES)
+    trace = allocations is not None
+    baseline = [0]  # traced memory at the start of the current stage
+
+    def mark(i):
+        stamps[i] = ticks_us()
+        if trace:
+            if i:
+                peaks[i - 1] = tracemalloc.get_traced_memory()[1] - baseline[0]
+            tracemalloc.reset_peak()
+            baseline[0] = tracemalloc.get_traced_memory()[0]
+
+    for _ in range(cycles):
+        mark(0)
+        main.read_sensor_into(bme, reading)
+        mark(1)
+        buffer.push(reading[0], reading[1], reading[2], reading[3], main.time.time())
+        mark(2)
+        payload = encoder.encode(*buffer.peek(1)[0])
+        mark(3)
+        await client.publish(topic, payload, qos=qos)
+        buffer.release(1)
+        mark(4)
+        main.logf("Buffered reading (%d pending, reason: %s)", len(buffer), None, level=main.LOG_LEVEL_DEBUG)
+        main.logf("Sent %d reading(s) to %s", 1, topic, level=main.LOG_LEVEL_DEBUG)
+        mark(5)
+        if trace:
+            # The awaited publish lets the host event loop run (task objects, 256 KiB
+            # socket receive buffers), which says nothing about the device; count
+            # only what the client allocates to build the packet.
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+            client._publish_packet(topic, payload, qos, False, 1 if qos else 0)
+            peaks[3] = tracemalloc.get_traced_memory()[1] - start
+
+        if timings is not None:
+            for i, stage in enumerate(STAGES):
+                timings[stage].append(ticks_diff(stamps[i + 1], stamps[i]))
+            timings["cycle"].append(ticks_diff(stamps[-1], stamps[0]))
+        if trace:
+            for i, stage in enumerate(STAGES):
+                allocations[stage].append(peaks[i])
+
+
+async def bench(args):
+    broker = await FakeBroker(port=0, latency_ms=args.latency_ms).start()
+    sim_clock.install(1)
+    overrides = {"PAYLOAD_FORMAT": args.format, "MQTT_QOS": args.qos, "STEADY_STATE": args.steady_state,
+                 "LOG_LEVEL": args.log_level,
+                 "CONSOLE_LOG_LEVEL": args.log_level}
+    main = run_sim.load_firmware(overrides, broker.port)
+    bme = await main.setup_sensor()
+    buffer = main.create_buffer()
+    client = main.create_mqtt_client(keepalive=0)
+    await client.connect()
+
+    try:
+        await run_cycles(main, bme, client, buffer, min(100, args.cycles))  # warm up
+        timings = {stage: [] for stage in STAGES + ("cycle",)}
+        received = len(broker.messages)
+        started = bench_utils.ticks_us()
+        await run_cycles(main, bme, client, buffer, args.cycles, timings=timings)
+        elapsed_us = bench_utils.ticks_diff(bench_utils.ticks_us(), started)
+        await asyncio.sleep(0.05)  # let the broker read the last QoS 0 messages
+        payloads = [payload for _, payload, _ in broker.messages[received:]]
+
+        allocations = {stage: [] for stage in STAGES}
+        tracemalloc.start()
+        try:
+            await run_cycles(main, bme, client, buffer, min(200, args.cycles), allocations=allocations)
+        finally:
+            tracemalloc.stop()
+    finally:
+        await client.disconnect()
+        await broker.stop()
+
+    stages = {}
+    for stage in STAGES:
+        stages[stage] = bench_utils.summarize_us(timings[stage])
+        stages[stage]["alloc_bytes"] = round(sum(allocations[stage]) / len(allocations[stage]))
+    cycle = bench_utils.summarize_us(timings["cycle"])
+    cycle["alloc_bytes"] = sum(stages[stage]["alloc_bytes"] for stage in STAGES)
+    return {
+        "benchmark": "pipeline",
+        "implementation": sys.implementation.name,
+        "settings": {"cycles": args.cycles, "format": main.PAYLOAD_ENCODER.name, "qos": args.qos,
+                     "latency_ms": args.latency_ms, "log_level": args.log_level, "period_s": args.period},
+        "stages": stages,
+        "cycle": cycle,
+        "messages_per_second": round(args.cycles / (elapsed_us / 1e6), 1),
+        "messages_received": len(payloads),
+        "bytes_per_message": round(sum(len(p) for p in payloads) / len(payloads), 1) if payloads else None,
+        "period_load": round(cycle["mean_us"] / (args.period * 1e6), 6),
+    }
+
+
+def print_results(results):
+    print(f"{'stage':<8} {'mean':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'bytes':>7}")
+    for stage, row in list(results["stages"].items()) + [("cycle", results["cycle"])]:
+        print(f"{stage:<8} {row['mean_us']:>8} {row['p50_us']:>8} {row['p90_us']:>8} {row['p99_us']:>8} "
+              f"{row['max_us']:>8} {row['alloc_bytes']:>7}")
+    print(f"messages/s: {results['messages_per_second']}  bytes/message: {results['bytes_per_message']}  "
+          f"load at {results['settings']['period_s']}s period: {results['period_load'] * 100:.3f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--format", default="json", choices=("json", "struct"))
+    parser.add_argument("--qos", type=int, default=0, choices=(0, 1))
+    parser.add_argument("--steady-state", action="store_true", help="STEADY_STATE = True (json becomes json_fixed)")
+    parser.add_argument("--latency-ms", type=int, default=0, help="broker reply delay")
+    parser.add_argument("--log-level", type=int, default=1, help="global and console log level, 0 prints the DEBUG calls")
+    parser.add_argument("--period", type=float, default=1, help="DATA_SEND_PERIOD to report the load for")
+    parser.add_argument("--output", default="bench_pipeline.json", help="results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    os.chdir(tempfile.mkdtemp(prefix="bench-flash-"))
+
+    results = asyncio.run(bench(args))
+    print_results(results)
+    bench_utils.write_results(output, results)
+    print(f"results written to {output}")
+
+    if baseline is not None:
+        print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+        for name, old, new, ratio in bench_utils.compare_results(baseline, results):
+            if name.startswith("settings."):
+                continue
+            print(f"{name:<28} {old:>10} {new:>10} {ratio:>7.2f}" if ratio is not None else
+                  f"{name:<28} {old:>10} {new:>10} {'-':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Timestamp accuracy of src/time_sync.py against a drifting NTP server.
+
+Runs TimeSync.run() against an in-process tools/fake_ntp.py whose clock
+starts --offset seconds ahead of the simulated RTC and runs --drift-ppm
+faster, on the sim/ virtual clock at --speed times real time. Every virtual
+minute it compares TimeSync.now_ms() with the server's time and reports:
+
+    error_ms        mean, p90 and max of |now_ms() - server time| after the first sync
+    drift_ppm       the drift TimeSync estimated, next to the configured one
+    max_step_ms     the largest jump of now() between two checks, beyond the true
+                    (virtual clock) time that passed; includes the drift being followed
+    backwards       checks at which now() was earlier than at the one before
+    loop_lag_ms     the longest the event loop was held up during the run
+
+Results are written as JSON; pass --compare to print the change against an
+earlier results file.
+
+Usage (CPython, from the repository root):
+    python benchmarks/bench_time_sync.py [--hours 12] [--offset 3.7] [--drift-ppm 200]
+        [--interval 1800] [--speed 200] [--output bench_time_sync.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import bench_utils
+
+bench_utils.add_src_to_path("sim")
+
+import run_sim  # noqa: E402,F401  (puts src/ and tools/ on sys.path)
+import clock as sim_clock  # noqa: E402
+from fake_ntp import FakeNtpServer  # noqa: E402
+
+CHECK_INTERVAL = 60  # virtual seconds between accuracy checks
+
+
+async def loop_lag(clock, lags):
+    """Record how late a 10 ms sleep wakes up, in virtual milliseconds."""
+    while True:
+        started = clock.time()
+        await asyncio.sleep(clock.real_seconds(0.01))
+        lags.append((clock.time() - started - 0.01) * 1000)
+
+
+async def bench(args):
+    clock = sim_clock.install(args.speed)
+    import time_sync as time_sync_module  # after install(): it needs the MicroPython time functions
+    server = await FakeNtpServer(port=0, offset=args.offset, drift_ppm=args.drift_ppm, now=clock.time).start()
+    sync = time_sync_module.TimeSync("127.0.0.1", server.port, interval=args.interval)
+    lags = []
+    tasks = [asyncio.create_task(sync.run()), asyncio.create_task(loop_lag(clock, lags))]
+    errors = []
+    max_step = 0
+    backwards = 0
+    previous = None
+    try:
+        while clock.elapsed() < args.hours * 3600:
+            await asyncio.sleep(clock.real_seconds(CHECK_INTERVAL))
+            if not sync.synced():
+                continue
+            now_ms = sync.now_ms()
+            true_ms = clock.time() * 1000  # not moved by RTC steps
+            errors.append(abs(now_ms - server.server_time() * 1000))
+            if previous is not None:
+                # How far now() moved beyond the time that really passed
+                max_step = max(max_step, abs((now_ms - previous[0]) - (true_ms - previous[1])))
+                backwards += now_ms < previous[0]
+            previous = (now_ms, true_ms)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        server.stop()
+
+    errors.sort()
+    return {
+        "benchmark": "time_sync",
+        "implementation": sys.implementation.name,
+        "settings": {"hours": args.hours, "offset_s": args.offset, "drift_ppm": args.drift_ppm,
+                     "interval_s": args.interval, "speed": args.speed},
+        "error_ms": {
+            "mean": round(sum(errors) / len(errors), 1),
+            "p90": round(errors[int(0.9 * len(errors))], 1),
+            "max": round(errors[-1], 1),
+        },
+        "drift_ppm": None if sync.drift is None else round(sync.drift * 1000000, 1),
+        "max_step_ms": round(max_step, 1),
+        "backwards": backwards,
+        "loop_lag_ms": round(max(lags), 1) if lags else None,
+        "ntp_requests": server.requests,
+    }
+
+
+def print_results(results):
+    settings = results["settings"]
+    error = results["error_ms"]
+    print(f"{settings['hours']}h, NTP {settings['offset_s']}s ahead and {settings['drift_ppm']} ppm fast, "
+          f"sync every {settings['interval_s']}s")
+    print(f"timestamp error: mean {error['mean']}ms, p90 {error['p90']}ms, max {error['max']}ms")
+    print(f"estimated drift: {results['drift_ppm']} ppm  largest jump of now(): {results['max_step_ms']}ms  "
+          f"backwards: {results['backwards']}  longest loop stall: {results['loop_lag_ms']}ms  "
+          f"requests: {results['ntp_requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=12, help="virtual run time")
+    parser.add_argument("--offset", type=float, default=3.7, help="seconds the NTP server starts ahead of the RTC")
+    parser.add_argument("--drift-ppm", type=float, default=200, help="how much faster the NTP server runs")
+    parser.add_argument("--interval", type=int, default=1800, help="NTP_SYNC_INTERVAL in seconds")
+    parser.add_argument("--speed", type=float, default=200, help="virtual seconds per real second")
+    parser.add_argument("--output", default="bench_time_sync.json", help="results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(bench(args))
+    print_results(results)
+    output = os.path.abspath(args.output)
+    bench_utils.write_results(output, results)
+    print(f"results written to {output}")
+
+    if baseline is not None:
+        print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+        for name, old, new, ratio in bench_utils.compare_results(baseline, results):
+            if name.startswith("settings."):
+                continue
+            print(f"{name:<28} {old:>10} {new:>10} {ratio:>7.2f}" if ratio is not None else
+                  f"{name:<28} {old:>10} {new:>10} {'-':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Helpers shared by the benchmarks. They run under CPython and the MicroPython unix port."""
+import sys
+import time
+
+try:
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    def ticks_us():
+        return time.perf_counter_ns() // 1000
+
+    def ticks_diff(end, start):
+        return end - start
+
+
+def add_src_to_path(subdir="src"):
+    """Make the modules in src/ (or another top-level directory) importable from a benchmark script."""
+    here = __file__.replace("\\", "/").rsplit("/", 1)
+    root = here[0].rsplit("/", 1)[0] if len(here) > 1 else ".."
+    path = root + "/" + subdir
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def time_per_call_us(fn, iterations):
+    """Return the mean wall time of fn() in microseconds."""
+    start = ticks_us()
+    for _ in range(iterations):
+        fn()
+    return ticks_diff(ticks_us(), start) / iterations
+
+
+def allocated_bytes_per_call(fn, iterations=100):
+    """Return the heap bytes allocated by one call of fn(), averaged over iterations."""
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+    if tracemalloc is None:
+        # MicroPython: count what the heap grows by with the collector paused
+        import gc
+        gc.collect()
+        gc.disable()
+        try:
+            before = gc.mem_alloc()
+            for _ in range(iterations):
+                fn()
+            return (gc.mem_alloc() - before) / iterations
+        finally:
+            gc.enable()
+
+    # CPython frees temporaries immediately, so measure the peak of each call
+    tracemalloc.start()
+    try:
+        total = 0
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            fn()
+            total += tracemalloc.get_traced_memory()[1] - current
+        return total / iterations
+    finally:
+        tracemalloc.stop()
+
+
+def summarize_us(samples):
+    """Mean, percentiles and max of a list of durations in microseconds."""
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def percentile(p):
+        return ordered[min(n - 1, int(p * n))]
+
+    return {
+        "mean_us": round(sum(ordered) / n, 1),
+        "p50_us": percentile(0.50),
+        "p90_us": percentile(0.90),
+        "p99_us": percentile(0.99),
+        "max_us": ordered[-1],
+    }
+
+
+def write_results(path, results):
+    """Save benchmark results as JSON so runs can be diffed or compared with compare_results()."""
+    import json
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def compare_results(baseline, current, prefix=""):
+    """Yield (key, baseline value, current value, ratio) for every numeric value found in both."""
+    for key, value in current.items():
+        name = prefix + key
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            yield from compare_results(old or {}, value, name + ".")
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and not isinstance(value, bool):
+            yield name, old, value, (value / old) if old else None
@@ -0,0 +1,137 @@
+"""Reconnect time and wakeups of the Wi-Fi link monitor in src/wifi.py against the fake WLAN in sim/.
+
+Runs WiFi on the sim/ virtual clock at --speed times real time and reports:
+
+    cold_connect_ms     connect_async() on a board with no cache (full path)
+    boot_connect_ms     connect_async() after a reboot, with the cached BSSID (fast path)
+    idle_wakeups_min    link state polls per minute while the link is up
+    loss_detect_ms      time from the link dropping to wait_state_change() returning
+    down_wakeups_min    polls per minute from the drop until the link is back
+    reconnect_ms        time from the end of a --outage seconds outage until the
+                        link is up again, reconnecting as task_main does
+
+The per-second polling loop the monitor replaced took 60 wakeups a minute
+and saw a new link up to 1000 ms late.
+
+Results are written as JSON; pass --compare to print the change against an
+earlier results file.
+
+Usage (CPython, from the repository root):
+    python benchmarks/bench_wifi.py [--idle-minutes 10] [--outage 30] [--speed 100]
+        [--output bench_wifi.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import bench_utils
+
+bench_utils.add_src_to_path("sim")
+
+import run_sim  # noqa: E402,F401  (puts src/ and tools/ on sys.path)
+import clock as sim_clock  # noqa: E402
+import network  # noqa: E402
+
+SSID = "sim"
+PASSWORD = "sim"
+
+
+async def bench(args):
+    clock = sim_clock.install(args.speed)
+    import wifi  # after install(): it needs the MicroPython time functions
+    cache_path = os.path.join(tempfile.mkdtemp(prefix="bench-wifi-"), "wifi_cache.json")
+    network.reset()
+    network._outages[:] = []
+
+    wlan = wifi.WiFi(cache_path=cache_path)
+    try:
+        await wlan.connect_async(SSID, PASSWORD)
+        cold_connect_ms = wlan.last_connect_ms
+
+        polls = wlan.polls
+        await asyncio.sleep(clock.real_seconds(args.idle_minutes * 60))
+        idle_wakeups = (wlan.polls - polls) / args.idle_minutes
+
+        # Drop the link and wait for the monitor to notice
+        lost_at = clock.time()
+        network._outages[:] = [(clock.elapsed(), clock.elapsed() + args.outage)]
+        outage_end = clock.time() + args.outage
+        polls = wlan.polls
+        while await asyncio.wait_for(wlan.wait_state_change(), clock.real_seconds(60)):
+            pass
+        loss_detect_ms = (clock.time() - lost_at) * 1000
+
+        # Reconnect as task_main does: connect_async until it succeeds
+        while not await wlan.connect_async(SSID, PASSWORD):
+            pass
+        reconnect_ms = (clock.time() - outage_end) * 1000
+        down_wakeups = (wlan.polls - polls) / ((clock.time() - lost_at) / 60)
+    finally:
+        wlan.stop_monitor()
+
+    # A reboot: the radio forgets the link, the cache on flash is kept
+    network.reset()
+    wlan = wifi.WiFi(cache_path=cache_path)
+    try:
+        await wlan.connect_async(SSID, PASSWORD)
+        boot_connect_ms = wlan.last_connect_ms
+        boot_path = wlan.last_connect_path
+    finally:
+        wlan.stop_monitor()
+
+    return {
+        "benchmark": "wifi",
+        "implementation": sys.implementation.name,
+        "settings": {"idle_minutes": args.idle_minutes, "outage_s": args.outage, "speed": args.speed},
+        "cold_connect_ms": cold_connect_ms,
+        "boot_connect_ms": boot_connect_ms,
+        "boot_path": boot_path,
+        "idle_wakeups_min": round(idle_wakeups, 1),
+        "loss_detect_ms": round(loss_detect_ms),
+        "down_wakeups_min": round(down_wakeups, 1),
+        "reconnect_ms": round(reconnect_ms),
+    }
+
+
+def print_results(results):
+    print(f"connect: cold {results['cold_connect_ms']}ms, after reboot {results['boot_connect_ms']}ms "
+          f"({results['boot_path']} path)")
+    print(f"wakeups/min: idle {results['idle_wakeups_min']}, link down {results['down_wakeups_min']}")
+    print(f"link loss seen after {results['loss_detect_ms']}ms; up again {results['reconnect_ms']}ms "
+          f"after a {results['settings']['outage_s']}s outage ended")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--idle-minutes", type=float, default=10, help="virtual minutes with the link up")
+    parser.add_argument("--outage", type=float, default=30, help="seconds the access point is gone")
+    parser.add_argument("--speed", type=float, default=100, help="virtual seconds per real second")
+    parser.add_argument("--output", default="bench_wifi.json", help="results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = asyncio.run(bench(args))
+    print_results(results)
+    output = os.path.abspath(args.output)
+    bench_utils.write_results(output, results)
+    print(f"results written to {output}")
+
+    if baseline is not None:
+        print(f"\n{'metric':<28} {'baseline':>10} {'current':>10} {'ratio':>7}")
+        for name, old, new, ratio in bench_utils.compare_results(baseline, results):
+            if name.startswith("settings."):
+                continue
+            print(f"{name:<28} {old:>10} {new:>10} {ratio:>7.2f}" if ratio is not None else
+                  f"{name:<28} {old:>10} {new:>10} {'-':>7}")
+
+
+if __name__ == "__main__":
+    main()
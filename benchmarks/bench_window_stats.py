@@ -0,0 +1,50 @@
+"""Per-sample cost of WindowStats versus examples/WindowedSensorDataAnalyzer.py.
+
+Each step feeds one sample and queries the latest derivative, jerk and
+standard deviation, which is what a change detector does every reading.
+
+Run from the repository root:
+    python benchmarks/bench_window_stats.py
+    micropython benchmarks/bench_window_stats.py
+"""
+import bench_utils
+
+bench_utils.add_src_to_path()
+bench_utils.add_src_to_path("examples")
+
+from window_stats import WindowStats
+from WindowedSensorDataAnalyzer import WindowedSensorDataAnalyzer
+
+SAMPLES = 500
+WINDOW_SIZES = (10, 60, 240)
+
+
+def run_analyzer(window_size):
+    analyzer = WindowedSensorDataAnalyzer(window_size)
+    for i in range(SAMPLES):
+        analyzer.feed_data(20.0 + (i % 17) * 0.1, i)
+        analyzer.derivative()
+        analyzer.jerk()
+        analyzer.std_deviation()
+
+
+def run_window_stats(window_size):
+    stats = WindowStats(window_size)
+    for i in range(SAMPLES):
+        stats.feed(20.0 + (i % 17) * 0.1, i)
+        stats.derivative()
+        stats.jerk()
+        stats.std_deviation()
+
+
+def main():
+    print()
+    print(f"{'window':>6} {'analyzer us/sample':>19} {'WindowStats us/sample':>22}")
+    for window_size in WINDOW_SIZES:
+        old = bench_utils.time_per_call_us(lambda: run_analyzer(window_size), 1) / SAMPLES
+        new = bench_utils.time_per_call_us(lambda: run_window_stats(window_size), 1) / SAMPLES
+        print(f"{window_size:>6} {old:>19.1f} {new:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Replay a recorded sensor trace through ChangeDetector and report traffic and error.
+
+The CSV needs a header with timestamp, temperature, pressure, humidity and gas
+columns (extra columns are ignored). Without a file, a synthetic day is
+generated: a stable room with slow drift, noise and a few sudden events.
+
+The error is what a subscriber sees when it holds the last published value
+until the next one arrives, compared with every recorded sample.
+
+Usage:
+    python benchmarks/replay_deadband.py [trace.csv] [--sigma 3] [--heartbeat 300]
+        [--abs 0.2,0.5,1,5000] [--rel 0,0,0,0.05]
+"""
+import argparse
+import csv
+import math
+import random
+
+import bench_utils
+
+bench_utils.add_src_to_path()
+
+from change_detector import (ChangeDetector, DEFAULT_ABS_DEADBAND, DEFAULT_REL_DEADBAND,  # noqa: E402
+                             DEFAULT_SIGMA, DEFAULT_HEARTBEAT)
+
+CHANNELS = ("temperature", "pressure", "humidity", "gas")
+
+
+def read_trace(path):
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            yield float(row["timestamp"]), [float(row[name]) for name in CHANNELS]
+
+
+def synthetic_trace(seconds=86400, period=10, seed=1):
+    rng = random.Random(seed)
+    temperature, pressure, humidity, gas = 21.0, 1013.0, 45.0, 150000.0
+    for t in range(0, seconds, period):
+        temperature += 0.0005 * math.sin(t / 7200) + rng.gauss(0, 0.02)
+        pressure += rng.gauss(0, 0.03)
+        humidity += rng.gauss(0, 0.05)
+        gas += rng.gauss(0, 300)
+        if t % 21600 == 10800:
+            # Window opened: fast temperature and humidity change
+            temperature -= 3.0
+            humidity += 8.0
+        yield float(t), [temperature, pressure, humidity, gas]
+
+
+def floats(text):
+    return tuple(float(x) for x in text.split(","))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", nargs="?")
+    parser.add_argument("--abs", type=floats, default=DEFAULT_ABS_DEADBAND)
+    parser.add_argument("--rel", type=floats, default=DEFAULT_REL_DEADBAND)
+    parser.add_argument("--sigma", type=float, default=DEFAULT_SIGMA)
+    parser.add_argument("--heartbeat", type=float, default=DEFAULT_HEARTBEAT)
+    args = parser.parse_args()
+
+    detector = ChangeDetector(len(CHANNELS), args.abs, args.rel, args.sigma, args.heartbeat)
+    trace = read_trace(args.trace) if args.trace else synthetic_trace()
+
+    held = None
+    samples = 0
+    squared_error = [0.0] * len(CHANNELS)
+    max_error = [0.0] * len(CHANNELS)
+    reasons = {}
+    for timestamp, values in trace:
+        samples += 1
+        if detector.update(values, timestamp):
+            held = list(values)
+            reasons[detector.reason] = reasons.get(detector.reason, 0) + 1
+        for c in range(len(CHANNELS)):
+            error = abs(values[c] - held[c])
+            squared_error[c] += error * error
+            max_error[c] = max(max_error[c], error)
+
+    print(f"samples: {samples}, messages: {detector.reports} ({100 * detector.reports / samples:.1f}%), "
+          + ", ".join(f"{reason}: {count}" for reason, count in sorted(reasons.items())))
+    print(f"{'channel':<12} {'rms error':>10} {'max error':>10}")
+    for c, name in enumerate(CHANNELS):
+        print(f"{name:<12} {math.sqrt(squared_error[c] / samples):>10.3f} {max_error[c]:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,21 +30,22 @@ class WindowedSensorDataAnalyzer:
         return math.sqrt(variance)
 
 # Example usage:
-# Create an instance with a window size of 5
-sensor = WindowedSensorDataAnalyzer(5)
+if __name__ == "__main__":
+    # Create an instance with a window size of 5
+    sensor = WindowedSensorDataAnalyzer(5)
 
-# Feed some data
-sensor.feed_data(10, 1)  # Value of 10 at timestamp 1
-sensor.feed_data(12, 2)  # Value of 12 at timestamp 2
-sensor.feed_data(15, 3)  # Value of 15 at timestamp 3
-sensor.feed_data(13, 4)  # Value of 13 at timestamp 4
-sensor.feed_data(11, 5)  # Value of 11 at timestamp 5
+    # Feed some data
+    sensor.feed_data(10, 1)  # Value of 10 at timestamp 1
+    sensor.feed_data(12, 2)  # Value of 12 at timestamp 2
+    sensor.feed_data(15, 3)  # Value of 15 at timestamp 3
+    sensor.feed_data(13, 4)  # Value of 13 at timestamp 4
+    sensor.feed_data(11, 5)  # Value of 11 at timestamp 5
 
-# Calculate and print the derivative
-print("Derivative:", sensor.derivative())
+    # Calculate and print the derivative
+    print("Derivative:", sensor.derivative())
 
-# Calculate and print the jerk
-print("Jerk:", sensor.jerk())
+    # Calculate and print the jerk
+    print("Jerk:", sensor.jerk())
 
-# Calculate and print the standard deviation
-print("Standard Deviation:", sensor.std_deviation())
+    # Calculate and print the standard deviation
+    print("Standard Deviation:", sensor.std_deviation())
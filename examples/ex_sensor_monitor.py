@@ -1,43 +1,40 @@
 import asyncio
-import statistics
+import time
+from array import array
 from machine import I2C
 from machine import Pin
 from bme688 import *
+from window_stats import ChannelStats
 
-async def get_sensor_data(bme):
-    return {
-    "temperature": bme.temperature,
-    "pressure": bme.pressure,
-    "humidity": bme.humidity,
-    "gas": bme.gas
-    }
+CHANNELS = ("temperature", "pressure", "humidity", "gas")
 
 class SensorMonitor:
-    def __init__(self, bme, time_interval=10, deviation_threshold=1):
+    def __init__(self, bme, time_interval=10, deviation_threshold=1, window_size=60):
         self.bme = bme
         self.time_interval = time_interval  # seconds between readings
         self.deviation_threshold = deviation_threshold  # standard deviations from mean to consider change
 
-        self.data = {
-            "temperature": [],
-            "pressure": [],
-            "humidity": [],
-            "gas": []
-        }
+        # Bounded history: the last window_size readings of every channel in one flat array
+        self.stats = ChannelStats(len(CHANNELS), window_size)
+        self.reading = array('f', [0.0] * len(CHANNELS))
+        self.mean = array('f', [0.0] * len(CHANNELS))
+        self.std_dev = array('f', [0.0] * len(CHANNELS))
 
     async def get_sensor_data(self):
         while True: # Continuously gather data
-            sensor_data = await get_sensor_data(self.bme)
-            for key in self.data.keys():
-                self.data[key].append(sensor_data[key])
+            reading = self.reading
+            reading[0] = self.bme.temperature
+            reading[1] = self.bme.pressure
+            reading[2] = self.bme.humidity
+            reading[3] = self.bme.gas
+            self.stats.update(reading, time.time())
 
             # Check if latest reading is outside standard deviation for each variable
-            for key, values in self.data.items():
-                if len(values) > 1: # Need at least two points to calculate standard deviation
-                    mean = statistics.mean(values)
-                    std_dev = statistics.stdev(values)
-                    if abs(values[-1] - mean) > self.deviation_threshold * std_dev:
-                        print(f"Significant change in {key}: {values[-1]}")
+            if self.stats.std_deviation_into(self.std_dev) is not None: # Need at least two points
+                self.stats.mean_into(self.mean)
+                for i in range(len(CHANNELS)):
+                    if abs(reading[i] - self.mean[i]) > self.deviation_threshold * self.std_dev[i]:
+                        print(f"Significant change in {CHANNELS[i]}: {reading[i]}")
 
             await asyncio.sleep(self.time_interval)
 
@@ -48,4 +45,4 @@ async def main():
     await monitor.get_sensor_data()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""Fake BME680/BME688 driver returning readings from a trace or a synthetic waveform."""
+import csv
+import math
+import random
+
+from clock import clock
+
+_source = None
+
+
+def use_trace(path):
+    """Replay a CSV with timestamp, temperature, pressure, humidity and gas columns, looping at the end."""
+    global _source
+    _source = TraceSource(path)
+
+
+def use_synthetic(seed=1):
+    global _source
+    _source = SyntheticSource(seed)
+
+
+class SyntheticSource:
+    """Room climate: daily temperature swing, slow pressure drift, noise and occasional events."""
+
+    def __init__(self, seed=1):
+        self.rng = random.Random(seed)
+
+    def read(self, elapsed):
+        rng = self.rng
+        day = 2 * math.pi * elapsed / 86400
+        event = 1.0 if elapsed % 21600 < 900 else 0.0  # window open for 15 minutes every 6 hours
+        return (
+            21.0 + 1.5 * math.sin(day) - 3.0 * event + rng.gauss(0, 0.02),
+            1013.0 + 2.0 * math.sin(day / 3) + rng.gauss(0, 0.03),
+            45.0 - 5.0 * math.sin(day) + 8.0 * event + rng.gauss(0, 0.05),
+            150000.0 + 20000.0 * math.cos(day) + rng.gauss(0, 300),
+        )
+
+
+class TraceSource:
+    def __init__(self, path):
+        with open(path, newline="") as f:
+            rows = [(float(r["timestamp"]), float(r["temperature"]), float(r["pressure"]),
+                     float(r["humidity"]), float(r["gas"])) for r in csv.DictReader(f)]
+        if not rows:
+            raise ValueError(f"{path} has no readings")
+        t0 = rows[0][0]
+        self.rows = [(t - t0, temperature, pressure, humidity, gas) for t, temperature, pressure, humidity, gas in rows]
+        # Loop after the last row, keeping the trace's own sample spacing
+        self.span = self.rows[-1][0] + (self.rows[1][0] if len(self.rows) > 1 else 1)
+        self.index = 0
+
+    def read(self, elapsed):
+        elapsed %= self.span
+        rows = self.rows
+        if elapsed < rows[self.index][0]:
+            self.index = 0
+        while self.index + 1 < len(rows) and rows[self.index + 1][0] <= elapsed:
+            self.index += 1
+        return rows[self.index][1:]
+
+
+class BME680_I2C:
+    def __init__(self, i2c, address=0x77):
+        self.i2c = i2c
+        self.reads = 0
+        if _source is None:
+            use_synthetic()
+
+    def _read(self, field):
+        self.reads += 1
+        return _source.read(clock.elapsed())[field]
+
+    @property
+    def temperature(self):
+        return self._read(0)
+
+    @property
+    def pressure(self):
+        return self._read(1)
+
+    @property
+    def humidity(self):
+        return self._read(2)
+
+    @property
+    def gas(self):
+        return self._read(3)
@@ -0,0 +1,75 @@
+"""Accelerated virtual clock shared by the fake device modules.
+
+install() patches the host `time` module with the MicroPython functions the
+firmware uses (ticks_ms, ticks_diff, sleep_ms, ...) and makes time.time()
+run `speed` times faster than the wall clock. The fake uasyncio scales its
+sleeps and timeouts by the same factor.
+
+time.time(), time.time_ns() and time.localtime() read the simulated RTC:
+the virtual clock plus whatever machine.RTC().datetime(...) set it to.
+Ticks and Clock.time() are not moved by setting the RTC, so they can serve
+as the reference ("true") time of fake servers.
+"""
+import time
+
+# The MicroPython unix port has no time.monotonic(); its ticks are enough there
+_monotonic = getattr(time, "monotonic", None) or (lambda: time.ticks_us() / 1000000)
+_sleep = time.sleep
+_wall_time = time.time
+
+
+class Clock:
+    def __init__(self, speed=1.0, start=None):
+        self.speed = speed
+        self.start = _wall_time() if start is None else start
+        self._mono0 = _monotonic()
+        self.offset = 0.0  # virtual seconds skipped, e.g. by deep sleep
+        self.rtc_offset = 0.0  # how far the RTC was set away from the virtual clock
+
+    def time(self):
+        return self.start + (_monotonic() - self._mono0) * self.speed + self.offset
+
+    def rtc_time(self):
+        return self.time() + self.rtc_offset
+
+    def set_rtc(self, seconds):
+        self.rtc_offset = seconds - self.time()
+
+    def elapsed(self):
+        return self.time() - self.start
+
+    def advance(self, seconds):
+        self.offset += seconds
+
+    def real_seconds(self, virtual_seconds):
+        return virtual_seconds / self.speed
+
+
+clock = Clock()
+
+
+def install(speed=1.0, start=None):
+    """Reset the shared clock and patch the time module. Returns the clock."""
+    clock.__init__(speed, start)
+
+    time.time = lambda: int(clock.rtc_time())
+    time.time_ns = lambda: int(clock.rtc_time() * 1e9)
+    time.ticks_ms = lambda: int(clock.time() * 1000)
+    time.ticks_us = lambda: int(clock.time() * 1000000)
+    time.ticks_cpu = time.ticks_us
+    time.ticks_add = lambda ticks, delta: ticks + delta
+    time.ticks_diff = lambda end, start: end - start
+    time.sleep = lambda seconds: _sleep(clock.real_seconds(seconds))
+    time.sleep_ms = lambda ms: _sleep(clock.real_seconds(ms / 1000))
+    time.sleep_us = lambda us: _sleep(clock.real_seconds(us / 1000000))
+    time.localtime = _localtime
+    return clock
+
+
+def _localtime(seconds=None):
+    import datetime
+    if seconds is None:
+        seconds = clock.rtc_time()
+    t = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).timetuple()
+    # MicroPython order: (year, month, mday, hour, minute, second, weekday, yearday)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
@@ -0,0 +1,117 @@
+"""Fake machine module: pins, I2C, reset and sleep on the virtual clock."""
+from clock import clock
+
+PWRON_RESET = 1
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+
+_reset_cause = PWRON_RESET
+_unique_id = b"\xe6\x61\x41\x04\x03\x2b\x5a\x2f"
+sleeps = []  # (kind, ms) for every lightsleep/deepsleep call
+
+
+class Reset(BaseException):
+    """Raised by reset() and deepsleep(); the simulator catches it and reboots the firmware."""
+
+    def __init__(self, deep=False):
+        super().__init__("deepsleep" if deep else "reset")
+        self.deep = deep
+
+
+def unique_id():
+    return _unique_id
+
+
+def reset():
+    global _reset_cause
+    _reset_cause = PWRON_RESET
+    raise Reset()
+
+
+def soft_reset():
+    reset()
+
+
+def reset_cause():
+    return _reset_cause
+
+
+def lightsleep(ms=None):
+    sleeps.append(("light", ms))
+    if ms:
+        clock.advance(ms / 1000)
+
+
+def deepsleep(ms=None):
+    global _reset_cause
+    sleeps.append(("deep", ms))
+    if ms:
+        clock.advance(ms / 1000)
+    _reset_cause = DEEPSLEEP_RESET
+    raise Reset(deep=True)
+
+
+def freq(hz=None):
+    return 125000000
+
+
+def idle():
+    pass
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=IN, pull=None, value=0):
+        self.id = id
+        self.mode = mode
+        self._value = value
+        self.toggles = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def toggle(self):
+        self._value ^= 1
+        self.toggles += 1
+
+
+class I2C:
+    def __init__(self, id, sda=None, scl=None, freq=400000):
+        self.id = id
+        self.sda = sda
+        self.scl = scl
+
+    def scan(self):
+        return [0x77]
+
+
+class RTC:
+    def datetime(self, value=None):
+        if value is None:
+            t = clock.rtc_time()
+            import time
+            y, mo, d, h, mi, s, wd, _ = time.localtime(t)
+            return (y, mo, d, wd, h, mi, s, 0)
+        import calendar
+        y, mo, d, _, h, mi, s, subseconds = value
+        clock.set_rtc(calendar.timegm((y, mo, d, h, mi, s, 0, 0, 0)) + subseconds / 1000000)
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+
+    def feed(self):
+        pass
@@ -0,0 +1,6 @@
+"""Fake mip: records installs instead of downloading."""
+installed = []
+
+
+def install(package, **kwargs):
+    installed.append(package)
@@ -0,0 +1,115 @@
+"""Fake network module: a station interface that associates after a delay on the virtual clock.
+
+Outages can be scheduled with add_outage(start, end) in virtual seconds since
+the clock started; during an outage the link drops and connect() does not
+succeed. With sockets_need_link set (run_sim.py does), MQTT connections
+opened through the fake uasyncio fail while the station has no link.
+"""
+from clock import clock
+
+STA_IF = 0
+AP_IF = 1
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = -3
+STAT_NO_AP_FOUND = -2
+STAT_CONNECT_FAIL = -1
+STAT_GOT_IP = 3
+
+FULL_CONNECT_SECONDS = 3.0  # association + DHCP
+FAST_CONNECT_SECONDS = 1.0  # known BSSID
+STATIC_IP_SAVING_SECONDS = 0.5  # DHCP skipped
+
+BSSID = b"\x12\x34\x56\x78\x9a\xbc"
+CHANNEL = 6
+
+_outages = []
+_radio = {}
+sockets_need_link = False
+
+
+def add_outage(start, end):
+    _outages.append((start, end))
+
+
+def in_outage():
+    elapsed = clock.elapsed()
+    for start, end in _outages:
+        if start <= elapsed < end:
+            return True
+    return False
+
+
+def link_up():
+    """True if the station interface is up, as the host's sockets should see it."""
+    if STA_IF not in _radio:
+        return False
+    return WLAN(STA_IF).isconnected()
+
+
+def reset():
+    """Forget link state, as a reboot of the board does."""
+    _radio.clear()
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self._state = _radio.setdefault(interface, {
+            "active": False, "up_at": None, "static": None, "ssid": None, "lost": False})
+        self.connects = 0
+
+    def active(self, value=None):
+        if value is None:
+            return self._state["active"]
+        self._state["active"] = bool(value)
+        if not value:
+            self._state["up_at"] = None
+
+    def connect(self, ssid, key=None, bssid=None):
+        self.connects += 1
+        delay = FAST_CONNECT_SECONDS if bssid == BSSID else FULL_CONNECT_SECONDS
+        if self._state["static"]:
+            delay -= STATIC_IP_SAVING_SECONDS
+        self._state["ssid"] = ssid
+        self._state["up_at"] = clock.time() + delay
+        self._state["lost"] = False
+
+    def disconnect(self):
+        self._state["up_at"] = None
+
+    def isconnected(self):
+        up_at = self._state["up_at"]
+        if up_at is None or not self._state["active"]:
+            return False
+        if in_outage():
+            # Links that drop stay down until connect() is called again after the outage
+            self._state["lost"] = True
+            return False
+        return not self._state["lost"] and clock.time() >= up_at
+
+    def status(self, param=None):
+        if param == "rssi":
+            return -60
+        if self.isconnected():
+            return STAT_GOT_IP
+        if self._state["up_at"] is not None and not in_outage():
+            return STAT_CONNECTING
+        return STAT_IDLE
+
+    def ifconfig(self, config=None):
+        if config is None:
+            return self._state["static"] or ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+        self._state["static"] = None if config == "dhcp" else tuple(config)
+
+    def config(self, param=None, **kwargs):
+        if param == "bssid":
+            return BSSID
+        if param == "channel":
+            return CHANNEL
+        if param == "mac":
+            return b"\x28\xcd\xc1\x00\x00\x01"
+        raise ValueError("unknown config param")
+
+    def scan(self):
+        return [(b"sim", BSSID, CHANNEL, -60, 3, False)]
@@ -0,0 +1,246 @@
+"""Run the firmware (src/main.py) on the host against fake hardware at accelerated time.
+
+The modules in sim/ stand in for the MicroPython ones (machine, network,
+uasyncio, bme680i, ...). They share a virtual clock that runs `--speed`
+times faster than real time, sensor readings come from a synthetic day or a
+recorded trace, MQTT goes to tools/fake_broker.py and NTP to
+tools/fake_ntp.py on localhost.
+machine.reset() and machine.deepsleep() reboot the firmware: RAM state is
+dropped, files in the working directory (the simulated flash) are kept.
+
+Usage:
+    python sim/run_sim.py [--hours 24] [--speed 1000] [--trace trace.csv]
+        [--set MQTT_BATCH_SIZE=10 --set PAYLOAD_FORMAT='"struct"']
+        [--wifi-outage 3600:5400] [--broker-outage 7200:7300] [--verbose]
+        [--ntp-offset 30] [--ntp-drift-ppm 100]
+
+Outages are START:END in virtual seconds after boot. Configuration values
+given with --set are Python literals and override the defaults below.
+--ntp-offset and --ntp-drift-ppm make NTP time run ahead of (and faster
+than) the simulated RTC.
+"""
+import argparse
+import ast
+import asyncio
+import builtins
+import json
+import os
+import sys
+import tempfile
+import time
+import types
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(SIM_DIR)
+SRC_DIR = os.path.join(ROOT, "src")
+
+for path in (os.path.join(ROOT, "tools"), SRC_DIR, SIM_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import clock as sim_clock  # noqa: E402
+import bme680i  # noqa: E402
+import machine  # noqa: E402
+import network  # noqa: E402
+from fake_broker import FakeBroker  # noqa: E402
+from fake_ntp import FakeNtpServer  # noqa: E402
+
+DEFAULT_CONFIG = {
+    "WIFI_SSID": "sim",
+    "WIFI_PASSWORD": "sim",
+    "MQTT_USER": "",
+    "MQTT_PASSWORD": "",
+    "SENSOR_NAME": "bme688",
+    "CONSOLE_LOG_LEVEL": 3,  # errors only; --verbose shows everything
+    "NTP_HOST": "127.0.0.1",
+}
+
+
+def count_readings(topic, payload, sensor_name=DEFAULT_CONFIG["SENSOR_NAME"]):
+    """Number of sensor readings carried by one published message; 0 for metrics, profile and other topics."""
+    kind = topic.split("/", 1)[-1]  # topics are <client_id>/<sensor_name>[/suffix]
+    if kind == sensor_name:
+        return 1
+    if kind == sensor_name + "/bin":
+        return payload[1] if len(payload) > 1 else 0
+    if kind == sensor_name + "/batch":
+        return len(json.loads(payload)["samples"])
+    return 0
+
+
+def make_config(overrides, port, ntp_port=123):
+    """Build the config module the firmware imports, with MQTT and NTP pointed at localhost."""
+    config = types.ModuleType("config")
+    for key, value in DEFAULT_CONFIG.items():
+        setattr(config, key, value)
+    config.MQTT_BROKER = "127.0.0.1"
+    config.MQTT_PORT = port
+    config.NTP_PORT = ntp_port
+    for key, value in overrides.items():
+        setattr(config, key, value)
+    return config
+
+
+def _unload_firmware():
+    """Drop the firmware modules so the next import starts from a fresh RAM state."""
+    for name, module in list(sys.modules.items()):
+        path = getattr(module, "__file__", None) or ""
+        if name == "config" or os.path.dirname(os.path.abspath(path)) == SRC_DIR:
+            del sys.modules[name]
+
+
+def load_firmware(overrides, port, ntp_port=123):
+    """Import src/main.py from scratch against the fake modules and return it."""
+    builtins.const = lambda value: value
+    _unload_firmware()
+    sys.modules["config"] = make_config(overrides, port, ntp_port)
+    import main
+    return main
+
+
+async def _stop_firmware_tasks(broker, keep):
+    """Cancel what the firmware left running and close its broker connections, as a reboot does."""
+    broker.drop_clients()
+    tasks = [t for t in asyncio.all_tasks()
+             if t not in keep and not t.done() and t.get_coro().__qualname__ != "FakeBroker._handle"]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _drive_outages(broker, clock, outages):
+    """Drop and refuse broker connections during broker outages, and drop them when the fake WLAN loses its link.
+
+    New connections while the link is down are refused by the fake uasyncio
+    (network.sockets_need_link), so Wi-Fi has to be reconnected before MQTT
+    can be.
+    """
+    down = False
+    linked = False
+    while True:
+        elapsed = clock.elapsed()
+        active = any(start <= elapsed < end for start, end in outages)
+        if active and not down:
+            broker.accepting = False
+            broker.drop_clients()
+        elif not active and down:
+            broker.accepting = True
+        down = active
+        up = network.link_up()
+        if linked and not up:
+            broker.drop_clients()
+        linked = up
+        await asyncio.sleep(clock.real_seconds(1))
+
+
+async def run(duration, speed=1000, overrides=None, trace=None, wifi_outages=(), broker_outages=(), verbose=False,
+              ntp_offset=0.0, ntp_drift_ppm=0):
+    """Run the firmware for `duration` virtual seconds and return a summary dict."""
+    overrides = dict(overrides or {})
+    if verbose:
+        overrides.setdefault("CONSOLE_LOG_LEVEL", 0)
+    if trace:
+        bme680i.use_trace(trace)
+    else:
+        bme680i.use_synthetic()
+    broker = await FakeBroker(port=0).start()
+    clock = sim_clock.install(speed)
+    ntp = await FakeNtpServer(port=0, offset=ntp_offset, drift_ppm=ntp_drift_ppm, now=clock.time).start()
+    network.reset()
+    network._outages[:] = list(wifi_outages)
+    network.sockets_need_link = True
+    machine._reset_cause = machine.PWRON_RESET
+    keep = {asyncio.current_task()}
+    keep.add(asyncio.create_task(_drive_outages(broker, clock, list(broker_outages))))
+
+    reboots = 0
+    deep_sleeps = 0
+    started = time.monotonic()
+    try:
+        while clock.elapsed() < duration:
+            try:
+                firmware = asyncio.ensure_future(load_firmware(overrides, broker.port, ntp.port).main())
+                await asyncio.wait_for(firmware, clock.real_seconds(duration - clock.elapsed()))
+                break  # main() returned
+            except machine.Reset as reset:
+                reboots += 1
+                deep_sleeps += reset.deep
+                if not reset.deep:
+                    network.reset()
+            except asyncio.TimeoutError:
+                break
+            finally:
+                await _stop_firmware_tasks(broker, keep)
+    finally:
+        await broker.stop()
+        ntp.stop()
+        network.sockets_need_link = False
+        _unload_firmware()
+
+    real = time.monotonic() - started
+    virtual = clock.elapsed()
+    sensor_name = overrides.get("SENSOR_NAME", DEFAULT_CONFIG["SENSOR_NAME"])
+    readings = sum(count_readings(topic, payload, sensor_name) for topic, payload, _ in broker.messages)
+    return {
+        "virtual_seconds": round(virtual, 1),
+        "real_seconds": round(real, 3),
+        "speedup": round(virtual / real, 1) if real else None,
+        "messages": len(broker.messages),
+        "readings": readings,
+        "payload_bytes": sum(len(payload) for _, payload, _ in broker.messages),
+        "broker_connects": broker.connects,
+        "pings": broker.pings,
+        "ntp_requests": ntp.requests,
+        "duplicates": broker.duplicates,
+        "reboots": reboots,
+        "deep_sleeps": deep_sleeps,
+        "messages_per_real_second": round(len(broker.messages) / real, 1) if real else None,
+    }
+
+
+def _parse_window(text):
+    start, end = text.split(":")
+    return float(start), float(end)
+
+
+def _parse_setting(text):
+    key, value = text.split("=", 1)
+    try:
+        return key, ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=24, help="virtual run time")
+    parser.add_argument("--speed", type=float, default=1000, help="virtual seconds per real second")
+    parser.add_argument("--trace", help="CSV with timestamp, temperature, pressure, humidity, gas columns")
+    parser.add_argument("--set", action="append", default=[], type=_parse_setting, metavar="KEY=VALUE",
+                        help="override a config.py setting")
+    parser.add_argument("--wifi-outage", action="append", default=[], type=_parse_window, metavar="START:END")
+    parser.add_argument("--broker-outage", action="append", default=[], type=_parse_window, metavar="START:END")
+    parser.add_argument("--verbose", action="store_true", help="show the firmware's console log")
+    parser.add_argument("--ntp-offset", type=float, default=0.0, help="seconds NTP time is ahead of the RTC at boot")
+    parser.add_argument("--ntp-drift-ppm", type=float, default=0, help="how much faster NTP time runs than the RTC")
+    parser.add_argument("--workdir", help="directory used as the device's flash (default: a temporary one)")
+    args = parser.parse_args(argv)
+
+    trace = os.path.abspath(args.trace) if args.trace else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="sim-flash-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    # Packages are "installed" already; skip the first-boot mip step
+    with open("installed_once.flag", "w") as f:
+        f.write("installed\n")
+
+    result = asyncio.run(run(args.hours * 3600, args.speed, dict(args.set), trace,
+                             args.wifi_outage, args.broker_outage, args.verbose, args.ntp_offset, args.ntp_drift_ppm))
+    result["flash_dir"] = workdir
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""uasyncio on top of the host asyncio, with sleeps and timeouts on the virtual clock."""
+import asyncio as _asyncio
+from asyncio import *  # noqa: F401,F403
+from asyncio import TimeoutError, Event, Lock, create_task, gather, run, current_task  # noqa: F401
+
+import network
+from clock import clock
+
+
+async def open_connection(host, port, **kwargs):
+    if network.sockets_need_link and not network.link_up():
+        raise OSError(113, "EHOSTUNREACH")
+    return await _asyncio.open_connection(host, port, **kwargs)
+
+
+async def sleep(seconds):
+    await _asyncio.sleep(clock.real_seconds(seconds) if seconds else 0)
+
+
+async def sleep_ms(ms):
+    await sleep(ms / 1000)
+
+
+async def wait_for(aw, timeout):
+    return await _asyncio.wait_for(aw, None if timeout is None else clock.real_seconds(timeout))
+
+
+async def wait_for_ms(aw, timeout):
+    return await wait_for(aw, timeout / 1000)
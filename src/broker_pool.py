@@ -0,0 +1,119 @@
+import time
+try:
+    import random
+except ImportError:
+    import urandom as random
+from metrics import registry
+
+# Assumed connect time of a broker that has not been reached yet; keeps untried brokers
+# behind a known fast one but ahead of one that is failing
+UNKNOWN_LATENCY_MS = 5000
+LATENCY_WEIGHT = 0.3  # weight of the newest connect time in the running average
+
+
+class Endpoint:
+    """One MQTT broker address and its connection history."""
+
+    def __init__(self, host, port, index):
+        self.host = host
+        self.port = port
+        self.index = index  # position in the configured list; breaks ties
+        self.latency_ms = None  # running average of successful connect times
+        self.failures = 0  # consecutive failed connects
+        self.next_attempt = 0  # time.time() before which the endpoint is not tried
+        self.connects = 0
+
+    def healthy(self):
+        return self.failures == 0
+
+    def score(self):
+        """Lower is better: recent failures first, then connect latency, then list order."""
+        latency = UNKNOWN_LATENCY_MS if self.latency_ms is None else self.latency_ms
+        return (self.failures, latency, self.index)
+
+    def __str__(self):
+        return f"{self.host}:{self.port}"
+
+
+def parse_endpoint(value, default_port=1883):
+    """Return (host, port) from "host", "host:port" or a (host, port) tuple."""
+    if isinstance(value, (tuple, list)):
+        return value[0], int(value[1]) if len(value) > 1 and value[1] else default_port
+    if ":" in value:
+        host, port = value.rsplit(":", 1)
+        return host, int(port)
+    return value, default_port
+
+
+class BrokerPool:
+    """Chooses which of several MQTT brokers to connect to.
+
+    Each endpoint keeps a running average of its connect time and a count of
+    consecutive failures. A failed connect puts the endpoint on an
+    exponential backoff (base_backoff * 2**(failures - 1) seconds, capped at
+    max_backoff, with up to half of it randomised so devices that lost the
+    same broker do not retry in step). choose() returns the best endpoint
+    that is not backing off: healthy ones before failing ones, faster ones
+    before slower ones. It sticks with the endpoint last connected to while
+    that one is healthy, unless another is faster by more than
+    sticky_margin (a fraction of the current one's connect time).
+    """
+
+    def __init__(self, endpoints, base_backoff=2, max_backoff=60, sticky_margin=0.5):
+        """
+        Args:
+            endpoints (list): (host, port) tuples, most preferred first
+            base_backoff (float): seconds to wait after the first failure
+            max_backoff (float): upper bound of the backoff in seconds
+            sticky_margin (float): how much faster another healthy broker must be to switch to it
+        """
+        self.endpoints = [Endpoint(host, port, i) for i, (host, port) in enumerate(endpoints)]
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.sticky_margin = sticky_margin
+        self.current = None  # endpoint of the last successful connect
+        self._failovers = registry.counter("broker_failovers")
+        self._connect_failures = registry.counter("broker_connect_failures")
+
+    def choose(self, now=None):
+        """Return the endpoint to try next, or None while every endpoint is backing off."""
+        now = time.time() if now is None else now
+        best = None
+        for endpoint in self.endpoints:
+            if endpoint.next_attempt <= now and (best is None or endpoint.score() < best.score()):
+                best = endpoint
+        current = self.current
+        if (best is not None and current is not None and current is not best and current.healthy()
+                and current.next_attempt <= now and current.latency_ms is not None and best.latency_ms is not None
+                and best.latency_ms >= current.latency_ms * (1 - self.sticky_margin)):
+            return current
+        return best
+
+    def wait_time(self, now=None):
+        """Seconds until some endpoint may be tried again, 0 if one can be tried now."""
+        now = time.time() if now is None else now
+        return max(0, min(endpoint.next_attempt for endpoint in self.endpoints) - now)
+
+    def record_success(self, endpoint, connect_ms):
+        if endpoint.latency_ms is None:
+            endpoint.latency_ms = connect_ms
+        else:
+            endpoint.latency_ms += LATENCY_WEIGHT * (connect_ms - endpoint.latency_ms)
+        endpoint.failures = 0
+        endpoint.next_attempt = 0
+        endpoint.connects += 1
+        if self.current is not None and self.current is not endpoint:
+            self._failovers.inc()
+        self.current = endpoint
+        registry.gauge("broker").set(endpoint.index)
+
+    def record_failure(self, endpoint, now=None):
+        """Count a failed connect and return the backoff in seconds before the endpoint is tried again."""
+        now = time.time() if now is None else now
+        endpoint.failures += 1
+        self._connect_failures.inc()
+        backoff = min(self.max_backoff, self.base_backoff * 2 ** (endpoint.failures - 1))
+        # Equal jitter: keep half of the backoff, randomise the other half
+        backoff = backoff / 2 + backoff / 2 * random.getrandbits(16) / 65536
+        endpoint.next_attempt = now + backoff
+        return backoff
@@ -0,0 +1,113 @@
+import math
+from array import array
+
+# Defaults per channel: temperature (C), pressure (hPa), humidity (%), gas (ohm)
+DEFAULT_ABS_DEADBAND = (0.2, 0.5, 1.0, 5000.0)
+DEFAULT_REL_DEADBAND = (0.0, 0.0, 0.0, 0.05)
+DEFAULT_SIGMA = 3.0
+DEFAULT_HEARTBEAT = 300
+
+
+class RunningStats:
+    """Welford mean/variance for several channels at once.
+
+    Same update rule as RunningStats in examples/ex_std_dev.py, with one array
+    slot per channel instead of one object per signal.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.n = 0
+        self.mean = array('f', (0.0 for _ in range(channels)))
+        self.M2 = array('f', (0.0 for _ in range(channels)))
+
+    def update(self, values):
+        self.n += 1
+        n = self.n
+        mean = self.mean
+        M2 = self.M2
+        for c in range(self.channels):
+            x = values[c]
+            delta = x - mean[c]
+            mean[c] += delta / n
+            M2[c] += delta * (x - mean[c])
+
+    def variance(self, channel):
+        if self.n < 2:
+            return float('nan')
+        return self.M2[channel] / (self.n - 1)
+
+    def standard_deviation(self, channel):
+        return math.sqrt(self.variance(channel))
+
+
+class ChangeDetector:
+    """Decide which readings are worth publishing (report by exception).
+
+    A reading is reported when it is the first one, when `heartbeat` seconds
+    have passed since the last report, or when any channel moved away from its
+    last reported value by more than the largest of:
+        abs_deadband[c]
+        rel_deadband[c] * |last reported value|
+        sigma * standard deviation of the channel's sample-to-sample noise
+    The noise statistics are learnt from every reading, so the sigma band
+    widens on noisy channels and tightens on quiet ones. sigma=0 disables it.
+    """
+
+    FIRST = "first"
+    HEARTBEAT = "heartbeat"
+    CHANGE = "change"
+
+    def __init__(self, channels=4, abs_deadband=DEFAULT_ABS_DEADBAND, rel_deadband=DEFAULT_REL_DEADBAND,
+                 sigma=DEFAULT_SIGMA, heartbeat=DEFAULT_HEARTBEAT):
+        self.channels = channels
+        self.abs_deadband = array('f', abs_deadband)
+        self.rel_deadband = array('f', rel_deadband)
+        self.sigma = sigma
+        self.heartbeat = heartbeat
+        self.noise = RunningStats(channels)
+        self.reported = array('f', (0.0 for _ in range(channels)))
+        self._previous = array('f', (0.0 for _ in range(channels)))
+        self._delta = array('f', (0.0 for _ in range(channels)))
+        self.last_report_time = None
+        self.samples = 0
+        self.reports = 0
+        self.reason = None  # why the last reported reading was reported
+
+    def update(self, values, timestamp):
+        """Feed one reading. Returns True if it should be published; it then becomes the reference."""
+        channels = self.channels
+        if self.samples:
+            for c in range(channels):
+                self._delta[c] = values[c] - self._previous[c]
+            self.noise.update(self._delta)
+        for c in range(channels):
+            self._previous[c] = values[c]
+        self.samples += 1
+
+        if self.last_report_time is None:
+            reason = self.FIRST
+        elif timestamp - self.last_report_time >= self.heartbeat:
+            reason = self.HEARTBEAT
+        else:
+            reason = self.CHANGE if self._changed(values) else None
+
+        if reason is None:
+            return False
+        for c in range(channels):
+            self.reported[c] = values[c]
+        self.last_report_time = timestamp
+        self.reports += 1
+        self.reason = reason
+        return True
+
+    def _changed(self, values):
+        use_sigma = self.sigma and self.noise.n >= 2
+        for c in range(self.channels):
+            reference = self.reported[c]
+            threshold = max(self.abs_deadband[c], self.rel_deadband[c] * abs(reference))
+            if use_sigma:
+                threshold = max(threshold, self.sigma * self.noise.standard_deviation(c))
+            if abs(values[c] - reference) > threshold:
+                return True
+        return False
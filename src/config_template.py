@@ -6,4 +6,86 @@ MQTT_USER =""
 MQTT_PASSWORD = ""
 MQTT_TOPIC = ""
 
-SENSOR_NAME = ""
\ No newline at end of file
+SENSOR_NAME = ""
+
+# Store-and-forward buffer for readings while the broker is unreachable
+SAMPLE_BUFFER_CAPACITY = 32  # readings kept in RAM
+SAMPLE_SPILL_PATH = "samples.bin"  # flash file used when RAM is full
+SAMPLE_SPILL_MAX_RECORDS = 1440  # one day of readings at 60s
+
+# Batched publishing: send up to MQTT_BATCH_SIZE readings per message to <topic>/batch
+MQTT_BATCH_SIZE = 1  # 1 publishes every reading on its own
+MQTT_BATCH_MAX_LATENCY = 600  # seconds a reading may wait for its batch to fill
+
+# Payload format: "json" on <topic>, or "struct" for compact binary on <topic>/bin
+# (decode on the host with tools/decode_payload.py; at most 255 readings per batch)
+PAYLOAD_FORMAT = "json"
+
+MQTT_QOS = 1  # 1 waits for the broker to acknowledge each publish, 0 fires and forgets
+MQTT_CLEAN_SESSION = False  # False keeps a persistent session; unacknowledged messages are resent after a reconnect
+MQTT_MAX_INFLIGHT = 8  # QoS 1 messages awaiting a PUBACK at once; a backlog is drained this many at a time, 1 waits for each
+
+# Broker failover: brokers as "host", "host:port" or (host, port), most preferred first.
+# Empty uses MQTT_BROKER. A broker that fails to connect is retried after a jittered
+# exponential backoff (MQTT_BACKOFF_BASE doubling up to MQTT_BACKOFF_MAX seconds).
+MQTT_BROKERS = []
+MQTT_BACKOFF_BASE = 2
+MQTT_BACKOFF_MAX = 60
+
+# Broker addresses are cached here so reconnects skip DNS and work while DNS is down
+DNS_CACHE_PATH = "dns_cache.json"  # None keeps the cache in RAM only
+DNS_CACHE_TTL = 3600  # seconds before an address is looked up again (in the background)
+
+# Time sync: an async SNTP client syncs at boot and every NTP_SYNC_INTERVAL seconds. Offsets
+# above NTP_STEP_THRESHOLD seconds set the RTC; smaller ones are slewed into the timestamps
+# at up to NTP_MAX_SLEW_PPM, and the RTC drift measured between syncs is compensated.
+NTP_HOST = "pool.ntp.org"
+NTP_PORT = 123
+NTP_SYNC_INTERVAL = 3600
+NTP_STEP_THRESHOLD = 2
+NTP_MAX_SLEW_PPM = 500
+
+# Log levels: 0=DEBUG, 1=INFO, 2=WARNING, 3=ERROR. Records below LOG_LEVEL are never formatted.
+LOG_LEVEL = 1
+CONSOLE_LOG_LEVEL = 0  # console threshold (on top of LOG_LEVEL)
+FILE_LOG_LEVEL = 0  # log file threshold (on top of LOG_LEVEL)
+# "binary" packs records compactly; decode with tools/decode_log.py. Message text is
+# interned in <log>.str (up to 2 KB) with numbers packed as ints: about 4.5x more of
+# the usual lines fit the log files, counting the table. One-off text gains less
+LOG_FILE_FORMAT = "text"
+
+# Fast Wi-Fi reconnect: the last good access point and IP configuration are cached here
+WIFI_CACHE_PATH = "wifi_cache.json"
+WIFI_STATIC_IP = None  # e.g. ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+WIFI_REUSE_LEASE = False  # skip DHCP by reusing the cached lease; only if the router reserves it
+
+# Run mode: "continuous" (always on) or "duty_cycle" (sleep between readings)
+RUN_MODE = "continuous"
+DUTY_CYCLE_DEEP_SLEEP = True  # False uses lightsleep and keeps RAM
+DUTY_CYCLE_CONNECT_TIMEOUT = 15  # seconds allowed for Wi-Fi per wake-up
+
+# Report by exception: sample every SAMPLE_PERIOD seconds, publish only significant changes
+REPORT_BY_EXCEPTION = False
+SAMPLE_PERIOD = 10
+# Per channel (temperature, pressure, humidity, gas); a change must exceed the largest band
+DEADBAND_ABS = (0.2, 0.5, 1.0, 5000.0)
+DEADBAND_REL = (0.0, 0.0, 0.0, 0.05)  # fraction of the last published value
+DEADBAND_SIGMA = 3.0  # multiples of the channel's sample-to-sample noise, 0 disables
+HEARTBEAT_INTERVAL = 300  # publish at least this often (seconds)
+
+# Runtime metrics (counters, gauges, latency histograms) published to <client_id>/metrics
+METRICS_INTERVAL = 300  # seconds between snapshots, 0 disables
+
+# Event-loop profiler: scheduling jitter and the blocking regions behind loop stalls.
+# Reports go to <client_id>/profile with each metrics snapshot, or call profiler.print_report() from the REPL.
+PROFILER_ENABLED = False
+PROFILER_INTERVAL_MS = 50  # how often the loop lag is sampled
+PROFILER_REPORT_SIZE = 5  # regions per report
+
+# Heap: STEADY_STATE writes JSON payloads from a template into a reused buffer ("json_fixed",
+# fixed decimals) instead of json.dumps. Below MEMORY_LOW_WATERMARK free bytes, debug logging,
+# metrics and profiling are shed until free heap is back above MEMORY_HIGH_WATERMARK.
+STEADY_STATE = False
+MEMORY_LOW_WATERMARK = 16384
+MEMORY_HIGH_WATERMARK = 24576
+GC_COLLECT_INTERVAL = 10  # seconds between gc.collect() calls at idle points
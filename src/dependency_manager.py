@@ -2,11 +2,12 @@ import mip
 import socket
 import time
 import sys
+from dns_cache import cache as dns_cache
 
 def has_internet(host="1.1.1.1", port=80, timeout=3):
     """Quick connectivity check by opening a socket to a public DNS/HTTP host."""
     try:
-        addr = socket.getaddrinfo(host, port)[0][-1]
+        addr = socket.getaddrinfo(dns_cache.lookup(host), port)[0][-1]
         s = socket.socket()
         s.settimeout(timeout)
         s.connect(addr)
@@ -0,0 +1,192 @@
+import json
+import socket
+import time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from logger import log, logf, LOG_LEVEL_DEBUG
+from metrics import registry
+from profiler import profiler
+
+# Seconds before a failed lookup of a host with a cached address is tried again;
+# doubles with every further failure, up to the TTL
+RETRY_INTERVAL = 60
+
+_hits = registry.counter("dns_hits")
+_misses = registry.counter("dns_misses")
+_stale = registry.counter("dns_stale")
+_errors = registry.counter("dns_errors")
+_refreshes = registry.counter("dns_refreshes")
+
+
+def is_address(host):
+    """True for a dotted IPv4 address, which needs no lookup."""
+    return host.replace(".", "").isdigit() and host.count(".") == 3
+
+
+class DnsCache:
+    """Host name to IPv4 address cache with a TTL, kept on flash across reboots.
+
+    socket.getaddrinfo() blocks, costs a round trip to the DNS server and
+    fails whenever that server is unreachable, even though broker addresses
+    rarely change. Lookups go through the cache instead:
+
+    - fresh entry (resolved less than ttl seconds ago): returned, counted as a hit
+    - stale entry: lookup_async() returns it at once, counted as stale, and
+      resolves the host again in a task of its own. lookup() resolves it
+      again first and only falls back to the stale address if that fails.
+    - no entry: resolved now, counted as a miss
+
+    socket.getaddrinfo() has no non-blocking form, so every resolve holds
+    the event loop for a DNS round trip (up to the resolver timeout while
+    DNS is down), also when lookup_async() does it in its own task: that
+    only lets the caller connect first. Failures are therefore rate
+    limited: after one, the host is not resolved again for RETRY_INTERVAL
+    seconds, doubling with each further failure up to ttl, and the cached
+    address is used meanwhile.
+
+    Addresses of persistent entries are written to flash only when they
+    change. Entries loaded at boot count as stale, so the first connect
+    after a reboot needs no DNS round trip and the address is checked in
+    the background. Pass persist=False for pool names such as pool.ntp.org
+    whose address is meant to rotate: they are cached in RAM only and a new
+    address is not logged.
+    """
+
+    def __init__(self, path="dns_cache.json", ttl=3600, getaddrinfo=None):
+        """
+        Args:
+            path (str or None): flash file holding the cached addresses, None keeps them in RAM only
+            ttl (int): seconds an address is used before it is resolved again
+            getaddrinfo (callable or None): resolver with the signature of socket.getaddrinfo
+        """
+        self.path = path
+        self.ttl = ttl
+        self.getaddrinfo = getaddrinfo or socket.getaddrinfo
+        self._entries = None  # host -> [address, expires, failed refreshes, persist]; loaded on first use
+        self._refreshing = set()
+
+    def lookup(self, host, persist=True):
+        """Return the IPv4 address of host as a string. Raises OSError if it cannot be resolved.
+
+        Args:
+            host (str): host name or dotted address
+            persist (bool): False keeps the address of a newly resolved host out of the flash file
+        """
+        entry = self._entry(host)
+        if entry is None:
+            return host if is_address(host) else self._resolve(host, persist)
+        if time.time() < entry[1]:
+            _hits.inc()
+            return entry[0]
+        if not self._refresh(host):
+            _stale.inc()
+        return entry[0]
+
+    async def lookup_async(self, host, persist=True):
+        """lookup(), but a stale address is refreshed in a task of its own instead of before returning."""
+        entry = self._entry(host)
+        if entry is None or time.time() < entry[1]:
+            return self.lookup(host, persist)
+        _stale.inc()
+        if host not in self._refreshing:
+            self._refreshing.add(host)
+            asyncio.create_task(self._refresh_later(host))
+        return entry[0]
+
+    def expire(self, host):
+        """Mark host's address stale, e.g. after connecting to it failed, so it is checked on next use.
+
+        Has no effect while a failed lookup of host is backing off.
+        """
+        entry = self._entry(host)
+        if entry is not None and not entry[2]:
+            entry[1] = 0
+
+    def _entry(self, host):
+        if self._entries is None:
+            self._entries = self._load()
+        return self._entries.get(host)
+
+    def _resolve(self, host, persist):
+        """Resolve host now and cache the result."""
+        _misses.inc()
+        try:
+            address = self._getaddrinfo(host)
+        except OSError:
+            _errors.inc()
+            raise
+        self._entries[host] = [None, 0, 0, persist]
+        self._store(host, address)
+        return address
+
+    def _refresh(self, host):
+        """Resolve a cached host again. Returns False, keeping the old address, if that fails."""
+        entry = self._entries.get(host)
+        try:
+            address = self._getaddrinfo(host)
+        except OSError as e:
+            _errors.inc()
+            logf("DNS lookup of %s failed (%s); using cached %s", host, e, entry and entry[0], level=LOG_LEVEL_DEBUG)
+            if entry is not None:
+                entry[1] = time.time() + min(self.ttl, RETRY_INTERVAL << min(entry[2], 16))
+                entry[2] += 1
+            return False
+        _refreshes.inc()
+        self._store(host, address)
+        return True
+
+    async def _refresh_later(self, host):
+        try:
+            await asyncio.sleep(0)  # let the caller connect first
+            self._refresh(host)
+        finally:
+            self._refreshing.discard(host)
+
+    def _getaddrinfo(self, host):
+        # getaddrinfo blocks the loop for the whole DNS round trip
+        with profiler.region("dns_lookup"):
+            info = self.getaddrinfo(host, 0)
+        if not info:
+            raise OSError(f"No address for {host}")
+        address = info[0][-1]
+        if isinstance(address, tuple):
+            return address[0]
+        # Ports returning a packed sockaddr (family, port, 4 address bytes)
+        return ".".join(str(b) for b in address[4:8])
+
+    def _store(self, host, address):
+        entry = self._entries[host]
+        changed = entry[0] != address
+        if changed:
+            if entry[0] is not None and entry[3]:
+                log(f"DNS address of {host} changed from {entry[0]} to {address}")
+            entry[0] = address
+        entry[1] = time.time() + self.ttl
+        entry[2] = 0
+        if changed and entry[3]:
+            self._save()
+
+    def _load(self):
+        if not self.path:
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {host: [address, 0, 0, True] for host, address in saved.items()}
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({host: entry[0] for host, entry in self._entries.items() if entry[3]}, f)
+        except OSError as e:
+            log(f"Could not write DNS cache {self.path}: {e}")
+
+
+# Cache shared by the MQTT client and the connectivity check; main applies DNS_CACHE_* from config
+cache = DnsCache()
@@ -0,0 +1,169 @@
+import json
+import struct
+
+# Binary payload layout (little endian):
+#   header: version (uint8), reading count (uint8)
+#   then per reading: temperature, pressure, humidity, gas (float32), timestamp (uint32)
+STRUCT_VERSION = 1
+STRUCT_HEADER_FORMAT = "<BB"
+STRUCT_RECORD_FORMAT = "<ffffI"
+STRUCT_HEADER_SIZE = struct.calcsize(STRUCT_HEADER_FORMAT)
+STRUCT_RECORD_SIZE = struct.calcsize(STRUCT_RECORD_FORMAT)
+STRUCT_MAX_READINGS = 255
+
+FIELDS = ("temperature", "pressure", "humidity", "gas", "timestamp")
+
+
+class JsonEncoder:
+    """Human-readable payloads, one JSON object per reading."""
+
+    name = "json"
+    topic_suffix = ""
+    batch_topic_suffix = "/batch"
+
+    def encode(self, temperature, pressure, humidity, gas, timestamp):
+        return json.dumps({
+            "temperature": temperature,
+            "pressure": pressure,
+            "humidity": humidity,
+            "gas": gas,
+            "timestamp": timestamp
+        })
+
+    def encode_batch(self, batch):
+        return json.dumps({"fields": FIELDS, "samples": batch})
+
+
+class FixedJsonEncoder(JsonEncoder):
+    """Same JSON object as JsonEncoder, written into a reused buffer without json.dumps.
+
+    Numbers are printed with fixed decimals (FIXED_DECIMALS) by integer
+    arithmetic straight into a preallocated bytearray, and the literal parts
+    of the object come from a template. encode() returns a memoryview of that
+    buffer, valid until the next call. Batches still go through json.dumps.
+
+    NaN, infinite and out-of-range values (magnitude MAX_VALUE or more) are
+    written as null, so one bad reading cannot keep the rest from being sent.
+    """
+
+    name = "json_fixed"
+    FIXED_DECIMALS = (2, 2, 2, 0, 0)  # per field in FIELDS
+    MAX_VALUE = 1e11  # whole parts stay within the 12 digits of _digits
+    _POWERS = (1, 10, 100, 1000, 10000)
+
+    def __init__(self):
+        self._template = tuple(
+            (b'{"' if i == 0 else b', "') + field.encode() + b'": ' for i, field in enumerate(FIELDS))
+        self._buffer = bytearray(192)
+        self._view = memoryview(self._buffer)
+        self._digits = bytearray(12)
+
+    def encode(self, temperature, pressure, humidity, gas, timestamp):
+        view = self._view
+        pos = 0
+        i = 0
+        for value in (temperature, pressure, humidity, gas, timestamp):
+            piece = self._template[i]
+            view[pos:pos + len(piece)] = piece
+            pos = self._write_fixed(pos + len(piece), value, self.FIXED_DECIMALS[i])
+            i += 1
+        view[pos] = 0x7D  # }
+        return view[:pos + 1]
+
+    def _write_fixed(self, pos, value, decimals):
+        buffer = self._buffer
+        if not -self.MAX_VALUE < value < self.MAX_VALUE:  # also true for NaN
+            buffer[pos:pos + 4] = b"null"
+            return pos + 4
+        power = self._POWERS[decimals]
+        scaled = int(value * power + (0.5 if value >= 0 else -0.5)) if decimals or isinstance(value, float) else value
+        if scaled < 0:
+            buffer[pos] = 0x2D  # -
+            pos += 1
+            scaled = -scaled
+        whole = scaled // power
+        pos = self._write_int(pos, whole, 1)
+        if decimals:
+            buffer[pos] = 0x2E  # .
+            pos = self._write_int(pos + 1, scaled - whole * power, decimals)
+        return pos
+
+    def _write_int(self, pos, value, min_digits):
+        # Digits come out least significant first; collect them, then copy in order
+        digits = self._digits
+        n = 0
+        while value or n < min_digits:
+            digits[n] = 0x30 + value % 10
+            value //= 10
+            n += 1
+        buffer = self._buffer
+        while n:
+            n -= 1
+            buffer[pos] = digits[n]
+            pos += 1
+        return pos
+
+
+class StructEncoder:
+    """Fixed-layout binary payloads, see STRUCT_* above.
+
+    Single readings are packed into a preallocated buffer, so encode() does
+    not allocate; the returned bytearray is reused by the next call.
+    """
+
+    name = "struct"
+    topic_suffix = "/bin"
+    batch_topic_suffix = "/bin"
+
+    def __init__(self):
+        self._single = bytearray(STRUCT_HEADER_SIZE + STRUCT_RECORD_SIZE)
+        struct.pack_into(STRUCT_HEADER_FORMAT, self._single, 0, STRUCT_VERSION, 1)
+
+    def encode(self, temperature, pressure, humidity, gas, timestamp):
+        struct.pack_into(STRUCT_RECORD_FORMAT, self._single, STRUCT_HEADER_SIZE,
+                         temperature, pressure, humidity, gas, int(timestamp))
+        return self._single
+
+    def encode_batch(self, batch):
+        if len(batch) > STRUCT_MAX_READINGS:
+            raise ValueError(f"At most {STRUCT_MAX_READINGS} readings fit in one binary payload")
+        payload = bytearray(STRUCT_HEADER_SIZE + STRUCT_RECORD_SIZE * len(batch))
+        struct.pack_into(STRUCT_HEADER_FORMAT, payload, 0, STRUCT_VERSION, len(batch))
+        offset = STRUCT_HEADER_SIZE
+        for temperature, pressure, humidity, gas, timestamp in batch:
+            struct.pack_into(STRUCT_RECORD_FORMAT, payload, offset,
+                             temperature, pressure, humidity, gas, int(timestamp))
+            offset += STRUCT_RECORD_SIZE
+        return payload
+
+
+ENCODERS = {
+    JsonEncoder.name: JsonEncoder,
+    FixedJsonEncoder.name: FixedJsonEncoder,
+    StructEncoder.name: StructEncoder,
+}
+
+
+def get_encoder(name="json"):
+    """Return an encoder instance for a PAYLOAD_FORMAT name ("json", "json_fixed" or "struct")."""
+    try:
+        return ENCODERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown payload format: {name}")
+
+
+def decode_struct(payload):
+    """Decode a binary payload into a list of reading dicts. Intended for host-side use."""
+    version, count = struct.unpack_from(STRUCT_HEADER_FORMAT, payload, 0)
+    if version != STRUCT_VERSION:
+        raise ValueError(f"Unsupported payload version: {version}")
+    expected = STRUCT_HEADER_SIZE + STRUCT_RECORD_SIZE * count
+    if len(payload) != expected:
+        raise ValueError(f"Payload is {len(payload)} bytes, expected {expected} for {count} readings")
+
+    readings = []
+    offset = STRUCT_HEADER_SIZE
+    for _ in range(count):
+        readings.append(dict(zip(FIELDS, struct.unpack_from(STRUCT_RECORD_FORMAT, payload, offset))))
+        offset += STRUCT_RECORD_SIZE
+    return readings
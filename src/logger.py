@@ -1,5 +1,8 @@
 import time
 import os
+import struct
+from metrics import registry
+from profiler import profiler
 
 # Define log levels
 LOG_LEVEL_DEBUG = 0
@@ -7,12 +10,103 @@ LOG_LEVEL_INFO = 1
 LOG_LEVEL_WARNING = 2
 LOG_LEVEL_ERROR = 3
 
+# Records below LOG_LEVEL are dropped before any formatting. The console and
+# file sinks can be raised further with their own thresholds; see set_level().
+LOG_LEVEL = LOG_LEVEL_INFO
+CONSOLE_LOG_LEVEL = LOG_LEVEL_DEBUG
+FILE_LOG_LEVEL = LOG_LEVEL_DEBUG
+
 LOG_FILE_MAX_SIZE = 1024  # 1KB for example, adjust as needed
 LOG_FILE_BACKUP_COUNT = 2  # Number of backup files to keep
 
+# File output is buffered in RAM and written in blocks to save flash wear and
+# latency. A buffer is flushed when it holds LOG_BUFFER_SIZE bytes, when
+# LOG_FLUSH_INTERVAL seconds passed since the last flush, or on an ERROR record.
+# Lines that could not be written are kept for the next flush, up to
+# LOG_BUFFER_MAX_SIZE bytes; beyond that the oldest are dropped.
+LOG_BUFFER_SIZE = 512
+LOG_BUFFER_MAX_SIZE = 2048
+LOG_FLUSH_INTERVAL = 30
+
+_buffers = {}  # file path -> pending records (bytes, UTF-8 for text lines)
+_buffered_bytes = {}  # file path -> size of pending records in bytes
+_file_sizes = {}  # file path -> size on flash, so we don't stat on every write
+_last_flush = time.time()
+_write_failed = set()  # paths whose last flush failed: retried on the interval or an ERROR record, not on every line
+
+LOG_FILE_FORMAT = "text"  # or "binary", see set_file_format()
+BINARY_HEADER_FORMAT = "<BIHB"  # level, timestamp, message id, argument count
+# The string table is never rotated, since every rotated log needs it. It
+# comes on top of the log files' flash budget, up to this many bytes: past
+# that, new log() message texts are stored inline instead of interned.
+LOG_STRING_TABLE_MAX_SIZE = 2048
+_string_tables = {}  # file path -> {format string: message id}
+_string_table_sizes = {}  # file path -> size of <file_path>.str in bytes
+
+# Records emitted per level, indexed by level
+_record_counters = tuple(registry.counter(name) for name in ("log_debug", "log_info", "log_warning", "log_error"))
+
+def set_level(level=None, console=None, file=None):
+    """Change the global minimum level and/or the console and file sink levels."""
+    global LOG_LEVEL, CONSOLE_LOG_LEVEL, FILE_LOG_LEVEL
+    if level is not None:
+        LOG_LEVEL = level
+    if console is not None:
+        CONSOLE_LOG_LEVEL = console
+    if file is not None:
+        FILE_LOG_LEVEL = file
+
+def is_enabled(level, file_path=None):
+    """Return True if a record at level would reach at least one sink."""
+    if level < LOG_LEVEL:
+        return False
+    return level >= CONSOLE_LOG_LEVEL or (file_path is not None and level >= FILE_LOG_LEVEL)
+
+def set_file_format(file_format):
+    """Select "text" (default) or "binary" records for log files.
+
+    Binary records are: level (uint8), timestamp (uint32), message id (uint16),
+    argument count (uint8), then per argument a type tag and its value
+    ('b' uint8, 'h' int16, 'i' int32, 'f' float32, 's' uint8 length + UTF-8).
+    Message ids index a string table of format strings kept next to the log in
+    <file_path>.str.
+    Decode on the host with tools/decode_log.py.
+
+    Preformatted log() messages are interned too, with their decimal numbers
+    split out as int arguments, so "Retrying in 5s..." and "Retrying in 10s..."
+    share one entry. Text that varies by other means (exception messages,
+    addresses) still gets an entry per distinct text, and once the table
+    reaches LOG_STRING_TABLE_MAX_SIZE bytes such messages are stored inline
+    (up to 255 bytes), so the gain over text records depends on how
+    repetitive they are. benchmarks/bench_logger.py measures it with the
+    table counted.
+    """
+    global LOG_FILE_FORMAT
+    if file_format not in ("text", "binary"):
+        raise ValueError(f"Unknown log file format: {file_format}")
+    LOG_FILE_FORMAT = file_format
+
+def logf(fmt, *args, level=LOG_LEVEL_INFO, file_path=None):
+    """Lazy variant of log(): fmt % args is only built if the record is enabled.
+
+    In binary file mode fmt is stored once in the string table and only the
+    arguments are written per record.
+
+    Example:
+        logf("Waiting for connection... status=%s", status, level=LOG_LEVEL_DEBUG)
+    """
+    if is_enabled(level, file_path):
+        _emit(level, fmt, args, file_path)
+
 # Function to log messages
 def log(message, level=LOG_LEVEL_INFO, file_path=None):
+    if is_enabled(level, file_path):
+        _emit(level, message, None, file_path)
+
+def _emit(level, fmt, args, file_path):
     timestamp = time.time()
+    if LOG_LEVEL_DEBUG <= level <= LOG_LEVEL_ERROR:
+        _record_counters[level].inc()
     if level == LOG_LEVEL_DEBUG:
         prefix = "[DEBUG]"
     elif level == LOG_LEVEL_WARNING:
@@ -21,40 +115,201 @@ def log(message, level=LOG_LEVEL_INFO, file_path=None):
         prefix = "[ERROR]"
     else:
         prefix = "[INFO]"
-    
-    log_line = f"{prefix} [{timestamp}]: {message}"
-    print(log_line)
-    
-    if file_path:
-        # Rotate log file if it's too large
+
+    to_file = file_path and level >= FILE_LOG_LEVEL
+    binary = to_file and LOG_FILE_FORMAT == "binary"
+    if level >= CONSOLE_LOG_LEVEL or (to_file and not binary):
+        message = fmt % args if args else fmt
+        log_line = f"{prefix} [{timestamp}]: {message}"
+        if level >= CONSOLE_LOG_LEVEL:
+            print(log_line)
+
+    if to_file:
+        if binary:
+            if args is None:
+                # Preformatted message from log(): intern the text around its numbers,
+                # or store it as a string argument once the table is full
+                fmt, args = _split_numbers(fmt)
+                msg_id = _intern(fmt, file_path, LOG_STRING_TABLE_MAX_SIZE)
+                if msg_id is None:
+                    msg_id, args = _intern("%s", file_path), (fmt % args if args else fmt,)
+                record = _pack_record(level, timestamp, msg_id, args)
+            else:
+                record = _pack_record(level, timestamp, _intern(fmt, file_path), args)
+        else:
+            # Encoded now so sizes count bytes, not characters (messages may hold e.g. "—")
+            record = (log_line + "\n").encode()
+
+        lines = _buffers.get(file_path)
+        if lines is None:
+            lines = _buffers[file_path] = []
+            _buffered_bytes[file_path] = 0
+        lines.append(record)
+        _buffered_bytes[file_path] += len(record)
+        failed = file_path in _write_failed
+        if failed:
+            _trim(file_path)
+
+        if (level >= LOG_LEVEL_ERROR or (_buffered_bytes[file_path] >= LOG_BUFFER_SIZE and not failed)
+                or timestamp - _last_flush >= LOG_FLUSH_INTERVAL):
+            flush()
+
+def _split_numbers(message):
+    """Return (fmt, args) with the decimal numbers of message replaced by %d.
+
+    Only numbers that print back identically (no leading zeros) and fit an
+    int32 are split out, at most 255 (the record's argument count is a byte).
+    Without any, message is returned as is with no args.
+    """
+    parts = []
+    args = []
+    start = 0  # start of the literal text not yet in parts
+    i = 0
+    end = len(message)
+    while i < end:
+        if "0" <= message[i] <= "9" and len(args) < 255:
+            j = i + 1
+            while j < end and "0" <= message[j] <= "9":
+                j += 1
+            if (message[i] != "0" or j - i == 1) and j - i <= 10 and int(message[i:j]) <= 0x7FFFFFFF:
+                parts.append(message[start:i].replace("%", "%%"))
+                parts.append("%d")
+                args.append(int(message[i:j]))
+                start = j
+            i = j
+        else:
+            i += 1
+    if not args:
+        return message, ()
+    parts.append(message[start:].replace("%", "%%"))
+    return "".join(parts), tuple(args)
+
+def _intern(fmt, file_path, limit=None):
+    """Return the string table id of fmt, appending it to <file_path>.str if new.
+
+    Args:
+        fmt: The format string.
+        file_path: The log file the table belongs to.
+        limit: If given, return None instead of growing the table file past
+            this many bytes.
+    """
+    table = _string_tables.get(file_path)
+    if table is None:
+        table = _string_tables[file_path] = {}
+        size = 0
         try:
-            file_size = os.stat(file_path)[6]
-            if file_size > LOG_FILE_MAX_SIZE:
-                # Delete the oldest backup if it exists
-                oldest_backup = f"{file_path}.{LOG_FILE_BACKUP_COUNT}"
-                try:
-                    os.remove(oldest_backup)
-                except OSError:
-                    pass
-
-                # Shift the backup files
-                for i in range(LOG_FILE_BACKUP_COUNT - 1, 0, -1):
-                    source = f"{file_path}.{i}"
-                    destination = f"{file_path}.{i + 1}"
-                    try:
-                        os.rename(source, destination)
-                    except OSError:
-                        pass
-
-                # Rename the current log file to the first backup
-                try:
-                    os.rename(file_path, file_path + ".1")
-                except OSError:
-                    pass
+            with open(file_path + ".str", 'r') as f:
+                for line in f:
+                    table[line[:-1].replace("\\n", "\n")] = len(table)
+                    size += len(line.encode())
+        except OSError:
+            pass
+        _string_table_sizes[file_path] = size
 
+    msg_id = table.get(fmt)
+    if msg_id is None:
+        line = (fmt.replace("\n", "\\n") + "\n").encode()
+        if limit is not None and _string_table_sizes[file_path] + len(line) > limit:
+            return None
+        msg_id = len(table)
+        try:
+            with open(file_path + ".str", 'ab') as f:
+                f.write(line)
+            table[fmt] = msg_id
+            _string_table_sizes[file_path] += len(line)
+        except OSError:
+            pass
+    return msg_id
+
+def _pack_record(level, timestamp, msg_id, args):
+    record = bytearray(struct.pack(BINARY_HEADER_FORMAT, level, int(timestamp) & 0xFFFFFFFF, msg_id, len(args)))
+    for arg in args:
+        if isinstance(arg, int) and 0 <= arg <= 0xFF:
+            record += b"b" + bytes((arg,))
+        elif isinstance(arg, int) and -0x8000 <= arg <= 0x7FFF:
+            record += b"h" + struct.pack("<h", arg)
+        elif isinstance(arg, int) and -0x80000000 <= arg <= 0x7FFFFFFF:
+            record += b"i" + struct.pack("<i", arg)
+        elif isinstance(arg, float):
+            record += b"f" + struct.pack("<f", arg)
+        else:
+            text = str(arg).encode()[:255]
+            record += b"s" + bytes((len(text),)) + text
+    return record
+
+def flush(file_path=None):
+    """Write buffered log lines to flash, for one file or all of them."""
+    global _last_flush
+    _last_flush = time.time()
+    for path in ([file_path] if file_path else list(_buffers)):
+        lines = _buffers.get(path)
+        if not lines:
+            continue
+        data = b"".join(lines)
+        try:
+            with profiler.region("log_flush"):
+                _rotate_if_needed(path)
+                with open(path, 'ab') as file:
+                    file.write(data)
+        except OSError as e:
+            print(f"[ERROR] [{_last_flush}]: Could not write log file {path}: {e}")
+            _file_sizes.pop(path, None)
+            _write_failed.add(path)
+            # Keep the lines for the next flush, within bounds in case the flash stays unwritable
+            _trim(path)
+            continue
+        _write_failed.discard(path)
+        lines.clear()
+        _buffered_bytes[path] = 0
+        _file_sizes[path] += len(data)
+
+def _trim(file_path):
+    """Drop the oldest pending records beyond LOG_BUFFER_MAX_SIZE."""
+    lines = _buffers[file_path]
+    while len(lines) > 1 and _buffered_bytes[file_path] > LOG_BUFFER_MAX_SIZE:
+        _buffered_bytes[file_path] -= len(lines.pop(0))
+
+async def flush_task(interval=LOG_FLUSH_INTERVAL):
+    """Flush buffered log lines every interval seconds."""
+    try:
+        import uasyncio as asyncio
+    except ImportError:
+        import asyncio
+    while True:
+        await asyncio.sleep(interval)
+        flush()
+
+def _rotate_if_needed(file_path):
+    file_size = _file_sizes.get(file_path)
+    if file_size is None:
+        try:
+            file_size = os.stat(file_path)[6]
         except OSError:
             # File doesn't exist yet
+            file_size = 0
+        _file_sizes[file_path] = file_size
+
+    # Rotate log file if it's too large
+    if file_size > LOG_FILE_MAX_SIZE:
+        # Delete the oldest backup if it exists
+        oldest_backup = f"{file_path}.{LOG_FILE_BACKUP_COUNT}"
+        try:
+            os.remove(oldest_backup)
+        except OSError:
             pass
 
-        with open(file_path, 'a') as file:
-            file.write(log_line + '\n')
+        # Shift the backup files
+        for i in range(LOG_FILE_BACKUP_COUNT - 1, 0, -1):
+            source = f"{file_path}.{i}"
+            destination = f"{file_path}.{i + 1}"
+            try:
+                os.rename(source, destination)
+            except OSError:
+                pass
+
+        # Rename the current log file to the first backup
+        try:
+            os.rename(file_path, file_path + ".1")
+        except OSError:
+            pass
+        _file_sizes[file_path] = 0
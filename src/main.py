@@ -1,15 +1,20 @@
 import time
+BOOT_TICKS = time.ticks_ms()  # reference for time-to-first-publish
 import uasyncio as asyncio
 import ubinascii
 import machine
 from machine import Pin, I2C
 import config
-from utilities import sync_time
 import wifi
-import json
-from logger import log
-import uos
-from dependency_manager import check_missing_packages, install_packages
+from encoders import get_encoder
+from logger import log, logf, flush, flush_task, set_level, set_file_format, LOG_LEVEL_DEBUG, LOG_LEVEL_WARNING, LOG_LEVEL_ERROR
+from sample_buffer import SampleBuffer
+import dns_cache
+from time_sync import TimeSync
+from metrics import registry
+from profiler import profiler
+from memory_guard import MemoryGuard
+from array import array
 
 
 # Default MQTT server to connect to
@@ -18,11 +23,22 @@ CLIENT_ID = ubinascii.hexlify(machine.unique_id()).decode('utf-8')
 MQTT_TOPIC = CLIENT_ID + '/' + config.SENSOR_NAME
 
 LOG_FILE_PATH = "log.log"
+set_level(getattr(config, 'LOG_LEVEL', None), getattr(config, 'CONSOLE_LOG_LEVEL', None), getattr(config, 'FILE_LOG_LEVEL', None))
+set_file_format(getattr(config, 'LOG_FILE_FORMAT', "text"))
+
+def get_mqtt_brokers():
+    """Brokers to use, most preferred first: MQTT_BROKERS if set, else MQTT_BROKER and MQTT_PORT."""
+    from broker_pool import parse_endpoint
+    default_port = getattr(config, 'MQTT_PORT', 0) or 1883
+    brokers = getattr(config, 'MQTT_BROKERS', None) or [config.MQTT_BROKER]
+    return [parse_endpoint(broker, default_port) for broker in brokers]
 
 def get_mqtt_broker_parameters():
     MQTT_ARGS = {
-    'client_id': ubinascii.hexlify(machine.unique_id()).decode('utf-8'),
-    'server': config.MQTT_BROKER
+    'client_id': CLIENT_ID,  # stable across reboots, so the broker can keep the session
+    'server': config.MQTT_BROKER,  # replaced by the broker pool's choice before each connect
+    'clean_session': MQTT_CLEAN_SESSION,
+    'max_inflight': MQTT_MAX_INFLIGHT,
     }
 
     if hasattr(config, 'MQTT_PORT') and config.MQTT_PORT:
@@ -36,9 +52,109 @@ def get_mqtt_broker_parameters():
 
     return MQTT_ARGS
 
+def create_mqtt_client(**options):
+    """An MQTTClient for the configured broker; options override get_mqtt_broker_parameters()."""
+    # Imported only once publishing starts, so it does not delay the first reading
+    from mqtt_async import MQTTClient
+    params = get_mqtt_broker_parameters()
+    params.update(options)
+    return MQTTClient(**params)
+
 DATA_SEND_PERIOD = 60
 
-wlan = wifi.WiFi()
+# Report by exception: sample every SAMPLE_PERIOD seconds but only publish readings that
+# moved past a deadband, plus a heartbeat every HEARTBEAT_INTERVAL seconds.
+REPORT_BY_EXCEPTION = getattr(config, 'REPORT_BY_EXCEPTION', False)
+SAMPLE_PERIOD = getattr(config, 'SAMPLE_PERIOD', 10) if REPORT_BY_EXCEPTION else DATA_SEND_PERIOD
+
+# Readings are buffered here while the broker is unreachable
+SAMPLE_BUFFER_CAPACITY = getattr(config, 'SAMPLE_BUFFER_CAPACITY', 32)
+SAMPLE_SPILL_PATH = getattr(config, 'SAMPLE_SPILL_PATH', "samples.bin")
+SAMPLE_SPILL_MAX_RECORDS = getattr(config, 'SAMPLE_SPILL_MAX_RECORDS', 1440)
+
+# Batching: publish up to MQTT_BATCH_SIZE readings as one message once that many are
+# pending or the oldest has waited MQTT_BATCH_MAX_LATENCY seconds. 1 disables batching.
+MQTT_BATCH_SIZE = getattr(config, 'MQTT_BATCH_SIZE', 1)
+MQTT_BATCH_MAX_LATENCY = getattr(config, 'MQTT_BATCH_MAX_LATENCY', 600)
+
+# Steady state: the main loop reads the sensor into a reused array and JSON payloads are
+# written into a reused buffer from a template ("json_fixed") instead of json.dumps.
+STEADY_STATE = getattr(config, 'STEADY_STATE', False)
+
+# Payload encoding: "json" (default) or "struct" (compact binary on <topic>/bin)
+PAYLOAD_FORMAT = getattr(config, 'PAYLOAD_FORMAT', "json")
+if STEADY_STATE and PAYLOAD_FORMAT == "json":
+    PAYLOAD_FORMAT = "json_fixed"
+PAYLOAD_ENCODER = get_encoder(PAYLOAD_FORMAT)
+MQTT_DATA_TOPIC = MQTT_TOPIC + PAYLOAD_ENCODER.topic_suffix
+MQTT_BATCH_TOPIC = MQTT_TOPIC + PAYLOAD_ENCODER.batch_topic_suffix
+
+# 0: fire and forget, 1: wait for the broker's PUBACK before releasing a reading
+MQTT_QOS = getattr(config, 'MQTT_QOS', 1)
+# Persistent session: unacknowledged QoS 1 messages are resent (DUP) after a reconnect,
+# at most MQTT_MAX_INFLIGHT of them awaiting a PUBACK at a time
+MQTT_CLEAN_SESSION = getattr(config, 'MQTT_CLEAN_SESSION', False)
+MQTT_MAX_INFLIGHT = getattr(config, 'MQTT_MAX_INFLIGHT', 8)
+
+# Broker host names are resolved through a TTL cache kept on flash; a stale address is
+# used while it is looked up again in the background, and when DNS is down
+dns_cache.cache.path = getattr(config, 'DNS_CACHE_PATH', "dns_cache.json")
+dns_cache.cache.ttl = getattr(config, 'DNS_CACHE_TTL', 3600)
+
+# NTP: synced at boot and every NTP_SYNC_INTERVAL seconds by a background task. Offsets
+# up to NTP_STEP_THRESHOLD seconds are slewed into the timestamps instead of setting the RTC.
+time_sync = TimeSync(
+    host=getattr(config, 'NTP_HOST', "pool.ntp.org"),
+    port=getattr(config, 'NTP_PORT', 123),
+    interval=getattr(config, 'NTP_SYNC_INTERVAL', 3600),
+    step_threshold=getattr(config, 'NTP_STEP_THRESHOLD', 2),
+    max_slew_ppm=getattr(config, 'NTP_MAX_SLEW_PPM', 500),
+)
+
+# Failover between the brokers in MQTT_BROKERS: a broker that fails to connect is retried
+# after a jittered exponential backoff; the fastest healthy one is preferred.
+# Created by the first get_broker_pool(), when publishing starts.
+broker_pool = None
+
+def get_broker_pool():
+    global broker_pool
+    if broker_pool is None:
+        from broker_pool import BrokerPool
+        broker_pool = BrokerPool(
+            get_mqtt_brokers(),
+            base_backoff=getattr(config, 'MQTT_BACKOFF_BASE', 2),
+            max_backoff=getattr(config, 'MQTT_BACKOFF_MAX', 60),
+        )
+    return broker_pool
+
+# "continuous" keeps Wi-Fi and the CPU up; "duty_cycle" sleeps between readings
+RUN_MODE = getattr(config, 'RUN_MODE', "continuous")
+DUTY_CYCLE_DEEP_SLEEP = getattr(config, 'DUTY_CYCLE_DEEP_SLEEP', True)
+DUTY_CYCLE_CONNECT_TIMEOUT = getattr(config, 'DUTY_CYCLE_CONNECT_TIMEOUT', 15)
+
+# Runtime metrics snapshot published to <client_id>/metrics every METRICS_INTERVAL seconds; 0 disables
+METRICS_INTERVAL = getattr(config, 'METRICS_INTERVAL', 300)
+MQTT_METRICS_TOPIC = CLIENT_ID + '/metrics'
+
+# Event-loop profiler: measures scheduling jitter and blames stalls on named blocking
+# regions. Its top-N report goes to <client_id>/profile with every metrics snapshot.
+PROFILER_ENABLED = getattr(config, 'PROFILER_ENABLED', False)
+PROFILER_REPORT_SIZE = getattr(config, 'PROFILER_REPORT_SIZE', 5)
+MQTT_PROFILE_TOPIC = CLIENT_ID + '/profile'
+profiler.interval_ms = getattr(config, 'PROFILER_INTERVAL_MS', 50)
+
+# Heap: collect at idle points, shed logging/metrics/profiling below the low watermark
+memory_guard = MemoryGuard(
+    low_watermark=getattr(config, 'MEMORY_LOW_WATERMARK', 16384),
+    high_watermark=getattr(config, 'MEMORY_HIGH_WATERMARK', 24576),
+    collect_interval=getattr(config, 'GC_COLLECT_INTERVAL', 10),
+)
+
+wlan = wifi.WiFi(
+    cache_path=getattr(config, 'WIFI_CACHE_PATH', "wifi_cache.json"),
+    static_ip=getattr(config, 'WIFI_STATIC_IP', None),
+    reuse_lease=getattr(config, 'WIFI_REUSE_LEASE', False),
+)
 
 async def task_flash_led():
     led = Pin('LED', Pin.OUT)
@@ -52,136 +168,401 @@ async def task_flash_led():
             await asyncio.sleep_ms(BLINK_DELAY_MS_FAST)
 
 async def get_sensor_data(sensor):
-    return {
-        "temperature": sensor.temperature,
-        "pressure": sensor.pressure,
-        "humidity": sensor.humidity,
-        "gas": sensor.gas
-    }
+    # The driver talks I2C synchronously, so the read blocks the loop
+    with profiler.region("sensor_read"):
+        return {
+            "temperature": sensor.temperature,
+            "pressure": sensor.pressure,
+            "humidity": sensor.humidity,
+            "gas": sensor.gas
+        }
 
-# Main function to run the asyncio event loop
-async def task_main():
+def read_sensor_into(sensor, reading):
+    """Read the sensor into reading (array('f') of 4: temperature, pressure, humidity, gas)."""
+    with profiler.region("sensor_read"):
+        reading[0] = sensor.temperature
+        reading[1] = sensor.pressure
+        reading[2] = sensor.humidity
+        reading[3] = sensor.gas
+    return reading
+
+async def reboot(buffer=None):
+    """Move buffered readings to flash, flush the log and reset the board."""
+    if buffer is not None and not buffer.persist():
+        log("Could not persist buffered readings; they will be lost in the reboot", level=LOG_LEVEL_ERROR, file_path=LOG_FILE_PATH)
+    flush()
+    # give logger a moment
+    await asyncio.sleep(1)
+    machine.reset()
+
+async def reconnect_wifi(buffer):
+    """Bring the Wi-Fi link back if it is down; reboot if that fails."""
+    if wlan.is_connected():
+        return
+    log("No internet connection. Trying to connect again!")
+    if not await wlan.connect_async(config.WIFI_SSID, config.WIFI_PASSWORD):
+        logf("Reconnection attempt failed — rebooting device to retry.", level=LOG_LEVEL_ERROR, file_path=LOG_FILE_PATH)
+        await reboot(buffer)
+
+async def setup_sensor(buffer=None):
     log("Setting up I2C and BME Sensor")
     i2c = I2C(0, sda=Pin(4), scl=Pin(5))
-    # import hardware and MQTT modules locally so missing packages don't crash module import
+    # import hardware modules locally so missing packages don't crash module import
     try:
         from bme680i import BME680_I2C
-        from umqtt.simple import MQTTClient
     except Exception as e:
         log(f"Required modules not available: {e}. Ensure packages are installed and reboot.")
-        # give logger a moment, then reboot to try provisioning path again
-        await asyncio.sleep(1)
-        machine.reset()
+        # reboot to try provisioning path again
+        await reboot(buffer)
+
+    return BME680_I2C(i2c)
+
+def create_change_detector():
+    if not REPORT_BY_EXCEPTION:
+        return None
+    from change_detector import ChangeDetector, DEFAULT_ABS_DEADBAND, DEFAULT_REL_DEADBAND, DEFAULT_SIGMA, DEFAULT_HEARTBEAT
+    return ChangeDetector(
+        abs_deadband=getattr(config, 'DEADBAND_ABS', DEFAULT_ABS_DEADBAND),
+        rel_deadband=getattr(config, 'DEADBAND_REL', DEFAULT_REL_DEADBAND),
+        sigma=getattr(config, 'DEADBAND_SIGMA', DEFAULT_SIGMA),
+        heartbeat=getattr(config, 'HEARTBEAT_INTERVAL', DEFAULT_HEARTBEAT),
+    )
+
+def create_buffer():
+    buffer = SampleBuffer(SAMPLE_BUFFER_CAPACITY, SAMPLE_SPILL_PATH, SAMPLE_SPILL_MAX_RECORDS)
+    if len(buffer):
+        log(f"{len(buffer)} buffered readings found in {SAMPLE_SPILL_PATH}")
+    return buffer
+
+async def connect_mqtt(mqtt_client):
+    """Connect mqtt_client to the broker the pool prefers. Returns False if it failed or all brokers are backing off."""
+    pool = get_broker_pool()
+    endpoint = pool.choose()
+    if endpoint is None:
+        return False
+    mqtt_client.server = endpoint.host
+    mqtt_client.port = endpoint.port
+    log(f"Connecting to the mqtt broker {endpoint}")
+    started = time.ticks_ms()
+    try:
+        await mqtt_client.connect()  # resends whatever the session still holds
+    except Exception as e:
+        registry.counter("mqtt_connect_errors").inc()
+        backoff = pool.record_failure(endpoint)
+        logf("Error connecting to MQTT broker %s: %s (next attempt in %ds)", endpoint, e, backoff, level=LOG_LEVEL_WARNING, file_path=LOG_FILE_PATH)
+        return False
+    pool.record_success(endpoint, time.ticks_diff(time.ticks_ms(), started))
+    registry.counter("mqtt_connects").inc()
+    return True
+
+async def send_buffered(mqtt_client, buffer, limit=None):
+    """Publish buffered readings, batched if MQTT_BATCH_SIZE > 1. Returns the number sent."""
+    if MQTT_QOS and MQTT_MAX_INFLIGHT > 1 and min(len(buffer), limit or len(buffer)) > MQTT_BATCH_SIZE:
+        # A backlog of more than one message: don't wait a round trip per message
+        return await send_pipelined(mqtt_client, buffer, limit)
+    if MQTT_BATCH_SIZE > 1:
+        sent = await buffer.drain_batches(
+            lambda batch: mqtt_client.publish(MQTT_BATCH_TOPIC, PAYLOAD_ENCODER.encode_batch(batch), qos=MQTT_QOS),
+            MQTT_BATCH_SIZE, limit=limit)
+        logf("Sent %d reading(s) to %s", sent, MQTT_BATCH_TOPIC, level=LOG_LEVEL_DEBUG)
+    else:
+        sent = await buffer.drain(
+            lambda *reading: mqtt_client.publish(MQTT_DATA_TOPIC, PAYLOAD_ENCODER.encode(*reading), qos=MQTT_QOS),
+            limit=limit)
+        logf("Sent %d reading(s) to %s", sent, MQTT_DATA_TOPIC, level=LOG_LEVEL_DEBUG)
+    return sent
+
+async def send_pipelined(mqtt_client, buffer, limit=None):
+    """Publish buffered readings at QoS 1 with up to MQTT_MAX_INFLIGHT PUBACKs outstanding.
 
-    bme = BME680_I2C(i2c)
+    Readings are released as soon as they and every older one are
+    acknowledged, so a failure part way only leaves the unacknowledged tail
+    buffered. Returns the number of readings sent.
+    """
+    size = MQTT_BATCH_SIZE
+    if size > 1:
+        topic = MQTT_BATCH_TOPIC
+        encode = PAYLOAD_ENCODER.encode_batch
+    else:
+        topic = MQTT_DATA_TOPIC
+        encode = lambda reading: PAYLOAD_ENCODER.encode(*reading)
+    sent = 0
+    while len(buffer) and (limit is None or sent < limit):
+        # A few windows' worth of readings per round keeps the peeked copies small
+        count = MQTT_MAX_INFLIGHT * 4 * size
+        readings = buffer.peek(count if limit is None else min(count, limit - sent))
+        if not readings:
+            break
+        released = [0]  # readings of this round already released
+
+        def acked(n):
+            upto = min(released[0] + n * size, len(readings))
+            buffer.release(upto - released[0])
+            released[0] = upto
+
+        messages = (encode(readings[i:i + size] if size > 1 else readings[i]) for i in range(0, len(readings), size))
+        await mqtt_client.publish_pipelined(topic, messages, acked=acked)
+        sent += released[0]
+    logf("Sent %d reading(s) to %s", sent, topic, level=LOG_LEVEL_DEBUG)
+    return sent
+
+async def publish_metrics(mqtt_client, buffer):
+    """Sample the gauges that are not updated in place and publish a metrics snapshot."""
+    registry.gauge("rssi").set(wlan.rssi())
+    registry.gauge("buffered").set(len(buffer))
+    registry.gauge("time_sync_age").set(time_sync.sync_age())
+    registry.gauge("time_offset_ms").set(time_sync.offset_ms())
+    await mqtt_client.publish(MQTT_METRICS_TOPIC, registry.snapshot_json(time.time()))
+    if profiler.enabled:
+        import json
+        await mqtt_client.publish(MQTT_PROFILE_TOPIC, json.dumps(profiler.report_dict(PROFILER_REPORT_SIZE)))
+
+# Main function to run the asyncio event loop
+async def task_main(buffer, provisioned):
+    """Sample from the start; publish once `provisioned` (Wi-Fi, time, packages) is set."""
+    bme = await setup_sensor(buffer)
     
+    # One client for the whole run: its session (unacknowledged messages) survives reconnects.
+    # Created once provisioning is done.
     mqtt_client = None
+    mqtt_was_connected = False
+    detector = create_change_detector()
+    reading = array('f', (0.0, 0.0, 0.0, 0.0))
+
+    readings = registry.counter("readings")
+    published = registry.counter("published")
+    publish_errors = registry.counter("publish_errors")
+    publish_ms = registry.histogram("publish_ms", (10, 50, 100, 250, 500, 1000, 5000))
+    drain_rate = registry.gauge("drain_rate")  # readings per second of the last backlog drain
+    loop_lag_ms = registry.histogram("loop_lag_ms", (5, 10, 20, 50, 100, 500, 1000))
 
     # Time settings
     start_time = time.time()
     previous_time = 0
-    period = 0
+    pending_since = start_time
+    first_publish = True
+    metrics_time = start_time
 
     log(f"Starting loop at {start_time}")
 
     while True:
         current_time = time.time()
-        
-        if not mqtt_client:
-            log(f"Connecting to the mqtt broker {MQTT_BROKER}")
+        if current_time < previous_time:
+            # The clock was set back by the time sync; restart the schedules from now
+            previous_time = current_time - SAMPLE_PERIOD
+            pending_since = metrics_time = current_time
+
+        # Sample regardless of broker state; the buffer holds readings until they are sent
+        if current_time - previous_time >= SAMPLE_PERIOD:
             try:
-                mqtt_client = MQTTClient(**get_mqtt_broker_parameters(), keepalive=120)
-                mqtt_client.connect()
+                read_sensor_into(bme, reading)
+                previous_time = current_time
+                readings.inc()
+                if detector is None or detector.update(reading, current_time):
+                    if not len(buffer):
+                        pending_since = current_time
+                    with profiler.region("buffer_push"):  # may spill to flash
+                        buffer.push(reading[0], reading[1], reading[2], reading[3], time_sync.now())
+                    logf("Buffered reading (%d pending, reason: %s)", len(buffer), detector and detector.reason, level=LOG_LEVEL_DEBUG)
             except Exception as e:
-                log(f"Error connecting to MQTT: {e}", file_path=LOG_FILE_PATH)
-                mqtt_client = None # Reset client on connection error
-                await asyncio.sleep(5) # Wait before retrying
+                logf("Error occurred while reading sensor: %s", e, level=LOG_LEVEL_ERROR, file_path=LOG_FILE_PATH)
+
+        if not provisioned.is_set():
+            # Wi-Fi, time sync and package checks are still running; keep sampling
+            await asyncio.sleep(1)
+            continue
+
+        if mqtt_client is None:
+            mqtt_client = create_mqtt_client(keepalive=120)
+
+        if not wlan.is_connected():
+            # The Wi-Fi monitor saw the link drop. TCP may not notice for a keepalive
+            # period, and no broker is reachable until the link is back.
+            if mqtt_client.is_connected():
+                await mqtt_client.disconnect()
+            await reconnect_wifi(buffer)
+
+        if not mqtt_client.is_connected():
+            if mqtt_was_connected:
+                mqtt_was_connected = False
+                logf("MQTT connection dropped", level=LOG_LEVEL_WARNING, file_path=LOG_FILE_PATH)
+            if not await connect_mqtt(mqtt_client):
+                # The next broker is tried on the next pass; the pool's backoff paces the retries
+                await asyncio.sleep(1)
                 continue
+            mqtt_was_connected = True
 
-        if current_time - previous_time >= DATA_SEND_PERIOD: 
+        pending = len(buffer)
+        if MQTT_BATCH_SIZE > 1 and current_time - pending_since < MQTT_BATCH_MAX_LATENCY:
+            # Only send whole batches until the oldest reading has waited long enough
+            pending -= pending % MQTT_BATCH_SIZE
+
+        if pending:
             try:
-                bme_data = await get_sensor_data(bme)        
-                bme_data["timestamp"] = time.time()
-                log(f"{current_time - previous_time} seconds passed. Sending data to {MQTT_TOPIC}")
-                mqtt_client.publish(MQTT_TOPIC, json.dumps(bme_data))
-                log(f"Data sent!")
-                previous_time = current_time
+                started = time.ticks_ms()
+                sent = await send_buffered(mqtt_client, buffer, limit=pending)
+                elapsed_ms = time.ticks_diff(time.ticks_ms(), started)
+                publish_ms.observe(elapsed_ms)
+                published.inc(sent)
+                if sent > 1:
+                    drain_rate.set(sent * 1000 // max(1, elapsed_ms))
+                    logf("Drained %d readings in %dms (%d/s)", sent, elapsed_ms, drain_rate.value, level=LOG_LEVEL_DEBUG)
+                # The batch latency counts from the oldest reading still waiting
+                pending_since = buffer.peek(1)[0][4] if len(buffer) else current_time
+                if first_publish and sent:
+                    first_publish = False
+                    log(f"First publish {time.ticks_diff(time.ticks_ms(), BOOT_TICKS)}ms after start "
+                        f"(Wi-Fi {wlan.last_connect_path} path, {wlan.last_connect_ms}ms, "
+                        f"heap free {memory_guard.mem_free() if memory_guard.mem_free else None})")
             except OSError as e:
-                # Handle connection error
-                log(f"Error occurred while sending data: {e}", file_path=LOG_FILE_PATH)
-                if mqtt_client:
-                    try:
-                        mqtt_client.disconnect()
-                    except Exception as ex:
-                        log(f"Error disconnecting MQTT client: {ex}", file_path=LOG_FILE_PATH)
-                mqtt_client = None # Reset client to trigger reconnection
-                
-                if not wlan.is_connected():
-                    log("No internet connection. Trying to connect again!")
-                    reconnected = await wlan.connect_async(config.WIFI_SSID, config.WIFI_PASSWORD)
-                    if not reconnected:
-                        log("Reconnection attempt failed — rebooting device to retry.", file_path=LOG_FILE_PATH)
-                        await asyncio.sleep(1)
-                        machine.reset()
+                # Handle connection error; unsent readings stay in the buffer
+                publish_errors.inc()
+                logf("Error occurred while sending data: %s", e, level=LOG_LEVEL_ERROR, file_path=LOG_FILE_PATH)
+                # Drop the connection but keep the client; the next connect() resumes its session
+                try:
+                    await mqtt_client.disconnect()
+                except Exception as ex:
+                    logf("Error disconnecting MQTT client: %s", ex, level=LOG_LEVEL_WARNING, file_path=LOG_FILE_PATH)
 
             except Exception as e:
-                log(f"Other error occurred while sending data: {e}", file_path=LOG_FILE_PATH)
+                publish_errors.inc()
+                logf("Other error occurred while sending data: %s", e, level=LOG_LEVEL_ERROR, file_path=LOG_FILE_PATH)
+
+        if METRICS_INTERVAL and mqtt_client.is_connected() and not memory_guard.shedding and current_time - metrics_time >= METRICS_INTERVAL:
+            metrics_time = current_time
+            try:
+                await publish_metrics(mqtt_client, buffer)
+            except Exception as e:
+                logf("Error publishing metrics: %s", e, level=LOG_LEVEL_WARNING, file_path=LOG_FILE_PATH)
+
+        memory_guard.idle()
 
+        # How late the loop wakes up shows how long other tasks held the CPU
+        sleep_started = time.ticks_ms()
         await asyncio.sleep(1)
+        loop_lag_ms.observe(max(0, time.ticks_diff(time.ticks_ms(), sleep_started) - 1000))
+
+async def duty_cycle_main():
+    """Low-power mode: wake every DATA_SEND_PERIOD, read, publish or buffer, sleep."""
+    from power import Sleeper, DutyCycle
+
+    sleeper = Sleeper()
+    if not sleeper.woke_from_deepsleep():
+        # Cold boot: provision like the continuous mode does
+        if await wlan.connect_async(config.WIFI_SSID, config.WIFI_PASSWORD):
+            await time_sync.sync()
+            ensure_packages()
+
+    bme = await setup_sensor()
+    buffer = create_buffer()
+
+    async def connect():
+        if not await wlan.connect_async_with_options(config.WIFI_SSID, config.WIFI_PASSWORD,
+                                                     timeout=DUTY_CYCLE_CONNECT_TIMEOUT, retries=1):
+            return False
+        if time.localtime()[0] < 2024:
+            # The RTC does not survive deep sleep on every port
+            await time_sync.sync()
+        return True
+
+    async def read():
+        return await get_sensor_data(bme)
+
+    async def publish():
+        # Nothing in RAM survives deep sleep, so there is no session to resume
+        mqtt_client = create_mqtt_client(clean_session=True, keepalive=0)
+        for _ in get_broker_pool().endpoints:
+            if await connect_mqtt(mqtt_client):
+                break
+        else:
+            raise OSError("No MQTT broker reachable")
+        try:
+            await send_buffered(mqtt_client, buffer)
+        finally:
+            await mqtt_client.disconnect()
+
+    cycle = DutyCycle(sleeper, buffer, DATA_SEND_PERIOD, read, connect, publish, wlan.deactivate,
+                      deep=DUTY_CYCLE_DEEP_SLEEP, awake_timeout=DUTY_CYCLE_CONNECT_TIMEOUT + 5,
+                      now=time_sync.now)
+    await cycle.run()
+
+def ensure_packages():
+    """Install missing packages, but only on the first boot."""
+    MARKER_PATH = "installed_once.flag"
+    try:
+        import uos
+        try:
+            uos.stat(MARKER_PATH)
+            log("Install marker present; skipping package installation.")
+            return
+        except OSError:
+            pass
+
+        # Imported only now: mip and socket are only needed on the first boot
+        from dependency_manager import check_missing_packages, install_packages
+        log("First boot detected: checking for missing packages")
+        missing = check_missing_packages()
+        if missing:
+            log(f"Missing packages detected: {missing}")
+            results = install_packages(packages=missing)
+            for pkg, status in results.items():
+                if status is True:
+                    log(f"Installed {pkg}")
+                else:
+                    log(f"Failed to install {pkg}: {status}")
+        else:
+            log("All required packages are already installed.")
+
+        # write marker so we don't attempt again
+        try:
+            with open(MARKER_PATH, "w") as mf:
+                mf.write("installed\n")
+        except Exception as e:
+            log(f"Failed to write install marker: {e}")
+    except Exception as e:
+        log(f"Error while checking/installing packages: {e}")
 
 async def main():
     log("Starting program.")
 
+    if RUN_MODE == "duty_cycle":
+        await duty_cycle_main()
+        return
+
     tasks = []
     tasks.append(asyncio.create_task(task_flash_led()))
+    tasks.append(asyncio.create_task(flush_task()))
+    if PROFILER_ENABLED:
+        profiler.enabled = True
+        tasks.append(asyncio.create_task(profiler.run()))
+
+    # Start sampling right away; readings wait in the buffer until provisioning is done
+    buffer = create_buffer()
+    provisioned = asyncio.Event()
+    tasks.append(asyncio.create_task(task_main(buffer, provisioned)))
 
     # Try to connect and reboot if we fail to obtain a connection.
     connected = await wlan.connect_async(config.WIFI_SSID, config.WIFI_PASSWORD)
     if not connected:
-        log("Wi-Fi connect attempt failed — rebooting device to retry.")
-        # small delay to flush logs
-        await asyncio.sleep(1)
-        machine.reset()
+        log("Wi-Fi connect attempt failed — rebooting device to retry.", level=LOG_LEVEL_ERROR, file_path=LOG_FILE_PATH)
+        await reboot(buffer)
 
-    sync_time()
+    def shift_buffered(correction_ms):
+        # Readings taken before the first sync carry the unsynced clock; move them by the same step
+        step = (correction_ms + 500) // 1000
+        if step:
+            shifted = buffer.shift_timestamps(step)
+            log(f"Clock corrected by {step}s; adjusted {shifted} of {len(buffer)} buffered reading(s)")
 
-    # After syncing time, ensure required packages are installed only on first boot.
-    try:
-        if check_missing_packages is not None and install_packages is not None:
-            MARKER_PATH = "installed_once.flag"
-            first_boot = False
-            try:
-                uos.stat(MARKER_PATH)
-                first_boot = False
-            except Exception:
-                first_boot = True
-
-            if first_boot:
-                log("First boot detected: checking for missing packages")
-                missing = check_missing_packages()
-                if missing:
-                    log(f"Missing packages detected: {missing}")
-                    results = install_packages(packages=missing)
-                    for pkg, status in results.items():
-                        if status is True:
-                            log(f"Installed {pkg}")
-                        else:
-                            log(f"Failed to install {pkg}: {status}")
-                else:
-                    log("All required packages are already installed.")
+    # One attempt before publishing starts; the task keeps retrying and re-syncing
+    time_sync.on_first_sync = shift_buffered
+    await time_sync.sync()
+    tasks.append(asyncio.create_task(time_sync.run()))
 
-                # write marker so we don't attempt again
-                try:
-                    with open(MARKER_PATH, "w") as mf:
-                        mf.write("installed\n")
-                except Exception as e:
-                    log(f"Failed to write install marker: {e}")
-            else:
-                log("Install marker present; skipping package installation.")
-    except Exception as e:
-        log(f"Error while checking/installing packages: {e}")
-    
-    tasks.append(asyncio.create_task(task_main()))
+    # After syncing time, ensure required packages are installed only on first boot.
+    with profiler.region("ensure_packages"):
+        ensure_packages()
+    provisioned.set()
 
     await asyncio.gather(*tasks)    
 
@@ -0,0 +1,76 @@
+import gc
+import time
+from logger import log, set_level, LOG_LEVEL_WARNING
+import logger
+from metrics import registry
+from profiler import profiler
+
+
+class MemoryGuard:
+    """Keeps the heap collected at quiet moments and sheds optional work when it runs low.
+
+    Call idle() from a point where the main loop is about to sleep. It runs
+    gc.collect() every collect_interval seconds, so collections happen there
+    instead of in the middle of a publish. When free heap drops below
+    low_watermark bytes the guard starts shedding: log records below WARNING
+    are dropped (errors must therefore be logged at WARNING or above to stay
+    visible), the profiler stops and `shedding` tells the caller to skip
+    metrics. Normal operation resumes once free heap is back above
+    high_watermark.
+
+    Ports without gc.mem_free() (CPython) never shed unless mem_free is given.
+    """
+
+    def __init__(self, low_watermark=16384, high_watermark=24576, collect_interval=10, mem_free=None):
+        """
+        Args:
+            low_watermark (int): start shedding below this many free bytes
+            high_watermark (int): stop shedding above this many free bytes
+            collect_interval (int): seconds between idle-time collections, 0 only collects when shedding
+            mem_free (callable or None): returns free heap bytes; defaults to gc.mem_free
+        """
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.collect_interval = collect_interval
+        self.mem_free = mem_free or getattr(gc, 'mem_free', None)
+        self.shedding = False
+        self._last_collect = time.time()
+        self._saved_log_level = None
+        self._saved_profiler = False
+        self._collects = registry.counter("gc_collects")
+        self._sheds = registry.counter("memory_sheds")
+        self._free = registry.gauge("mem_free")
+
+    def idle(self):
+        """Collect if due and update the shedding state. Returns the free heap, or None if unknown."""
+        now = time.time()
+        if self.shedding or (self.collect_interval and now - self._last_collect >= self.collect_interval):
+            gc.collect()
+            self._collects.inc()
+            self._last_collect = now
+
+        if self.mem_free is None:
+            return None
+        free = self.mem_free()
+        self._free.set(free)
+        if not self.shedding and free < self.low_watermark:
+            self._start_shedding(free)
+        elif self.shedding and free > self.high_watermark:
+            self._stop_shedding(free)
+        return free
+
+    def _start_shedding(self, free):
+        self.shedding = True
+        self._sheds.inc()
+        log(f"Low memory ({free} bytes free): dropping debug logging, metrics and profiling", LOG_LEVEL_WARNING)
+        self._saved_log_level = logger.LOG_LEVEL
+        if logger.LOG_LEVEL < LOG_LEVEL_WARNING:
+            set_level(LOG_LEVEL_WARNING)
+        self._saved_profiler = profiler.enabled
+        profiler.enabled = False
+
+    def _stop_shedding(self, free):
+        self.shedding = False
+        set_level(self._saved_log_level)
+        profiler.enabled = self._saved_profiler
+        log(f"Memory recovered ({free} bytes free): resuming normal operation", LOG_LEVEL_WARNING)
@@ -0,0 +1,107 @@
+import json
+from array import array
+
+# Default histogram bucket upper bounds, in milliseconds
+DEFAULT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class Counter:
+    """Monotonic count, e.g. reconnects."""
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Gauge:
+    """Last observed value, e.g. free heap."""
+
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    """Counts of observations per fixed bucket, plus their sum and maximum.
+
+    Bucket counts live in a preallocated array, so observe() does not
+    allocate as long as it is fed small ints (e.g. milliseconds). Counts are
+    cumulative since boot; subscribers diff consecutive snapshots.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = array('I', (0 for _ in range(len(self.buckets) + 1)))  # last slot: above every bound
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        buckets = self.buckets
+        i = 0
+        n = len(buckets)
+        while i < n and value > buckets[i]:
+            i += 1
+        self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+
+class Registry:
+    """Named metrics, created on first use and looked up once by the code that updates them."""
+
+    def __init__(self):
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def counter(self, name):
+        metric = self.counters.get(name)
+        if metric is None:
+            metric = self.counters[name] = Counter()
+        return metric
+
+    def gauge(self, name):
+        metric = self.gauges.get(name)
+        if metric is None:
+            metric = self.gauges[name] = Gauge()
+        return metric
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS_MS):
+        metric = self.histograms.get(name)
+        if metric is None:
+            metric = self.histograms[name] = Histogram(buckets)
+        return metric
+
+    def snapshot(self, timestamp=None):
+        """Return every metric as a compact dict.
+
+        Layout:
+            {"t": timestamp,
+             "c": {counter: value},
+             "g": {gauge: value},
+             "h": {histogram: [count, sum, max, [bucket bounds], [bucket counts]]}}
+        The last bucket count is for observations above the highest bound.
+        """
+        snapshot = {
+            "c": {name: metric.value for name, metric in self.counters.items()},
+            "g": {name: metric.value for name, metric in self.gauges.items()},
+            "h": {name: [metric.count, metric.sum, metric.max, list(metric.buckets), list(metric.counts)]
+                  for name, metric in self.histograms.items()},
+        }
+        if timestamp is not None:
+            snapshot["t"] = timestamp
+        return snapshot
+
+    def snapshot_json(self, timestamp=None):
+        return json.dumps(self.snapshot(timestamp))
+
+
+# Registry shared by the firmware modules
+registry = Registry()
@@ -0,0 +1,479 @@
+import time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from logger import log
+from metrics import registry
+from dns_cache import cache as dns_cache
+
+# MQTT 3.1.1 control packet types (first byte, flags cleared)
+CONNECT = 0x10
+CONNACK = 0x20
+PUBLISH = 0x30
+PUBACK = 0x40
+PINGREQ = 0xC0
+PINGRESP = 0xD0
+DISCONNECT = 0xE0
+
+DUP = 0x08  # PUBLISH flag marking a retransmission
+
+PINGREQ_PACKET = b"\xc0\x00"
+DISCONNECT_PACKET = b"\xe0\x00"
+
+
+class MQTTException(OSError):
+    pass
+
+
+def _encode_length(n):
+    """Encode an MQTT remaining length as a variable length integer."""
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return out
+
+
+def _encode_string(s):
+    if isinstance(s, str):
+        s = s.encode()
+    return bytes((len(s) >> 8, len(s) & 0xFF)) + s
+
+
+class MQTTClient:
+    """Minimal MQTT 3.1.1 publisher built on asyncio streams.
+
+    Unlike umqtt.simple, every network operation awaits with a timeout, so a
+    slow broker or stalled TCP connection never blocks other tasks. A
+    background task reads PUBACK/PINGRESP packets and another sends keepalive
+    pings. Runs on uasyncio and on CPython asyncio.
+
+    QoS 1 messages stay in the session until their PUBACK arrives, at most
+    max_inflight at a time. With clean_session=False the session outlives the
+    connection: call connect() again on the same object after a drop and the
+    unacknowledged messages are sent again with the DUP flag before anything
+    new. Delivery stays at-least-once: every connection that drops before
+    the PUBACK adds one copy at the broker.
+
+    A publish that failed with the connection can simply be repeated with
+    the same topic and payload. The repeat takes over the packet id of the
+    copy kept in the session and waits for its PUBACK; if that PUBACK came
+    in before the repeat, the repeat returns at once instead of sending the
+    message again. The last max_inflight such acknowledgements are kept for
+    this, so a new message identical to one of them (same topic and payload)
+    is not sent; timestamped payloads never are.
+    """
+
+    def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=60,
+                 connect_timeout=10, publish_timeout=10, clean_session=True, max_inflight=8):
+        """
+        Args:
+            client_id (str): MQTT client identifier
+            server (str): broker host name or address
+            port (int): broker port, 0 for the default 1883
+            user (str or None): user name
+            password (str or None): password, only sent together with user
+            keepalive (int): keepalive interval in seconds, 0 disables pings
+            connect_timeout (float): seconds to wait for TCP connect and CONNACK
+            publish_timeout (float): seconds to wait for a send or a PUBACK
+            clean_session (bool): False keeps unacknowledged QoS 1 messages across reconnects
+            max_inflight (int): QoS 1 messages that may await a PUBACK at once
+        """
+        self.client_id = client_id
+        self.server = server
+        self.port = port or 1883
+        self.user = user
+        self.password = password
+        self.keepalive = keepalive
+        self.connect_timeout = connect_timeout
+        self.publish_timeout = publish_timeout
+        self.clean_session = clean_session
+        self.max_inflight = max_inflight
+
+        self.connected = False
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._ping_task = None
+        self._write_lock = asyncio.Lock()
+        self._pid = 0
+        # packet id -> [pid, topic, packet, Event set on PUBACK or connection loss,
+        #               payload offset in packet, True once the publishing call gave up]
+        self._inflight = {}
+        self._orphans_acked = []  # entries acknowledged after their publishing call gave up, oldest first
+        self._window = asyncio.Event()  # set whenever an in-flight slot may have freed up
+        self.session_present = False
+        # Keepalive times are in ticks_ms: time.time() is the RTC, which the time sync may step
+        self._last_tx = time.ticks_ms()
+        self._ping_sent = None
+        self._topics = {}  # topic -> encoded topic; the firmware publishes to a handful of topics
+        self._retransmits = registry.counter("mqtt_retransmits")
+
+    async def connect(self):
+        """Open the connection and wait for CONNACK. Raises MQTTException on failure."""
+        if self.connected:
+            return
+        try:
+            # A cached address saves the DNS round trip and survives DNS outages
+            address = await dns_cache.lookup_async(self.server)
+            self._reader, self._writer = await asyncio.wait_for(
+                asyncio.open_connection(address, self.port), self.connect_timeout)
+            await self._send(self._connect_packet(), self.connect_timeout)
+            header, body = await asyncio.wait_for(self._read_packet(), self.connect_timeout)
+        except asyncio.TimeoutError:
+            self._shutdown()
+            dns_cache.expire(self.server)  # the broker may have moved; check its address next time
+            raise MQTTException(f"Timed out connecting to {self.server}:{self.port}")
+        except Exception:
+            self._shutdown()
+            dns_cache.expire(self.server)
+            raise
+
+        if header & 0xF0 != CONNACK or len(body) != 2:
+            self._shutdown()
+            raise MQTTException(f"Unexpected reply to CONNECT: {header:#x}")
+        if body[1] != 0:
+            self._shutdown()
+            raise MQTTException(f"Connection refused by broker, return code {body[1]}")
+
+        self.connected = True
+        self.session_present = bool(body[0] & 0x01)
+        self._ping_sent = None
+        self._read_task = asyncio.create_task(self._read_loop())
+        if self.keepalive:
+            self._ping_task = asyncio.create_task(self._keepalive_loop())
+        if self.clean_session:
+            self._inflight.clear()
+            self._orphans_acked.clear()
+        elif self._inflight:
+            # Fresh events before anything can wait on them; the old ones were set by the drop
+            for entry in self._inflight.values():
+                entry[3] = asyncio.Event()
+            await self._retransmit()
+
+    async def _retransmit(self):
+        """Send the messages still awaiting a PUBACK again, oldest first, flagged as duplicates."""
+        if not self.session_present:
+            log("MQTT broker did not keep the session; resending unacknowledged messages as new")
+        log(f"MQTT resending {len(self._inflight)} unacknowledged message(s)")
+        for pid in sorted(self._inflight, key=lambda pid: (pid - self._pid - 1) % 0xFFFF):
+            entry = self._inflight.get(pid)
+            if entry is None:
+                continue  # acknowledged while an earlier one was being sent
+            entry[2][0] |= DUP
+            try:
+                await self._send(entry[2], self.publish_timeout)
+            except asyncio.TimeoutError:
+                self._shutdown()
+                raise MQTTException("Timed out resending unacknowledged messages")
+            except Exception:
+                self._shutdown()
+                raise
+            self._retransmits.inc()
+
+    async def publish(self, topic, msg, retain=False, qos=0):
+        """Publish msg (str or bytes-like) to topic.
+
+        With qos=1 this waits for a free in-flight slot and then for the
+        matching PUBACK. Raises MQTTException (an OSError) on timeouts or
+        connection loss; with clean_session=False the message then stays in
+        the session and is resent on the next connect().
+        """
+        if not self.connected:
+            raise MQTTException("Not connected")
+        if not qos:
+            try:
+                await self._send(self._publish_packet(topic, msg, 0, retain, 0), self.publish_timeout)
+            except asyncio.TimeoutError:
+                raise MQTTException(f"Timed out publishing to {topic}")
+            return
+
+        entry = None
+        try:
+            entry = await self._start_publish(topic, msg, retain)
+            await self._wait_acked(entry)
+        except asyncio.TimeoutError:
+            raise MQTTException(f"Timed out publishing to {topic}")
+        finally:
+            if entry is not None:
+                self._forget(entry)
+
+    async def publish_pipelined(self, topic, messages, retain=False, acked=None):
+        """Publish every payload from the iterable messages to topic at QoS 1 without waiting for each PUBACK.
+
+        Up to max_inflight messages are outstanding at once and PUBACKs are
+        matched by packet id in whatever order they arrive, so one round trip
+        is shared by a whole window instead of paid per message. Payloads are
+        copied into their packets as they are taken from messages, so a
+        generator may reuse one buffer.
+
+        Args:
+            topic (str): topic for every message
+            messages (iterable): str or bytes-like payloads
+            retain (bool): retain flag for every message
+            acked (callable or None): acked(n) is called whenever the next n
+                messages, in order, have all been acknowledged
+        Returns:
+            int: number of messages acknowledged. On a timeout or connection
+            loss MQTTException is raised as by publish(); the messages
+            acknowledged before it have already been passed to acked. With
+            clean_session=False, messages acknowledged behind an unacknowledged
+            one are not sent again when the caller repeats them.
+        """
+        if not self.connected:
+            raise MQTTException("Not connected")
+        pending = []  # sent and not yet reported to acked, oldest first
+        done = 0
+        try:
+            for msg in messages:
+                pending.append(await self._start_publish(topic, msg, retain))
+                done += self._pop_acked(pending, acked)
+            while pending:
+                await self._wait_acked(pending[0])
+                done += self._pop_acked(pending, acked)
+        except asyncio.TimeoutError:
+            raise MQTTException(f"Timed out publishing to {topic}")
+        finally:
+            for entry in pending:
+                if self._inflight.get(entry[0]) is entry:
+                    self._forget(entry)
+                elif not self.clean_session:
+                    # Acknowledged behind one that was not, so the caller still holds it;
+                    # a repeat of the publish must not send it again
+                    self._remember_acked(entry)
+        return done
+
+    async def _start_publish(self, topic, msg, retain):
+        """Send a QoS 1 message once a slot is free; return its in-flight entry."""
+        if not self.clean_session:
+            entry = self._claim(topic, msg)
+            if entry is not None:
+                return entry  # a copy from an earlier call is being resent or was already acknowledged
+        await self._wait_window()
+        pid = self._next_pid()
+        packet = self._publish_packet(topic, msg, 1, retain, pid)
+        size = len(msg.encode()) if isinstance(msg, str) else len(msg)
+        entry = self._inflight[pid] = [pid, topic, packet, asyncio.Event(), len(packet) - size, False]
+        try:
+            await self._send(entry[2], self.publish_timeout)
+        except Exception:
+            self._forget(entry)
+            raise
+        return entry
+
+    async def _wait_acked(self, entry):
+        await asyncio.wait_for(entry[3].wait(), self.publish_timeout)
+        if self._inflight.get(entry[0]) is entry:
+            raise MQTTException("Connection lost before PUBACK")
+
+    def _pop_acked(self, pending, acked):
+        """Drop the acknowledged entries at the front of pending and report them. Returns how many."""
+        n = 0
+        inflight = self._inflight
+        while n < len(pending) and inflight.get(pending[n][0]) is not pending[n]:
+            n += 1
+        if n:
+            del pending[:n]
+            if acked is not None:
+                acked(n)
+        return n
+
+    def _forget(self, entry):
+        """Give up on an unacknowledged message unless the session keeps it for a resend."""
+        if self._inflight.get(entry[0]) is not entry:
+            return
+        if self.clean_session:
+            del self._inflight[entry[0]]
+            self._window.set()
+        else:
+            entry[5] = True  # a repeat of the publish may claim it
+
+    def _remember_acked(self, entry):
+        """Keep an acknowledged entry nobody waits for, so a repeated publish of it is not sent again."""
+        self._orphans_acked.append(entry)
+        if len(self._orphans_acked) > self.max_inflight:
+            del self._orphans_acked[0]
+
+    def inflight(self):
+        """Number of QoS 1 messages awaiting a PUBACK, including ones kept for a resend."""
+        return len(self._inflight)
+
+    async def _wait_window(self):
+        while len(self._inflight) >= self.max_inflight:
+            if not self.connected:
+                raise MQTTException("Not connected")
+            self._window.clear()
+            await asyncio.wait_for(self._window.wait(), self.publish_timeout)
+
+    def _claim(self, topic, msg):
+        """Return the given-up entry carrying exactly this topic and payload, in flight or acknowledged."""
+        if not self._orphans_acked and not self._inflight:
+            return None
+        if isinstance(msg, str):
+            msg = msg.encode()
+        elif not isinstance(msg, bytes):
+            msg = bytes(msg)
+        for i, entry in enumerate(self._orphans_acked):
+            if self._carries(entry, topic, msg):
+                del self._orphans_acked[i]
+                return entry
+        for entry in self._inflight.values():
+            if entry[5] and self._carries(entry, topic, msg):
+                entry[5] = False
+                return entry
+        return None
+
+    @staticmethod
+    def _carries(entry, topic, msg):
+        packet = entry[2]
+        start = entry[4]
+        return entry[1] == topic and len(packet) - start == len(msg) and packet[start:] == msg
+
+    async def disconnect(self):
+        if self.connected:
+            try:
+                await self._send(DISCONNECT_PACKET, self.publish_timeout)
+            except Exception:
+                pass
+        self._shutdown()
+
+    def is_connected(self):
+        return self.connected
+
+    def _next_pid(self):
+        # Ids of messages kept for a resend stay taken
+        self._pid = self._pid % 0xFFFF + 1
+        while self._pid in self._inflight:
+            self._pid = self._pid % 0xFFFF + 1
+        return self._pid
+
+    def _connect_packet(self):
+        flags = 0x02 if self.clean_session else 0
+        payload = _encode_string(self.client_id)
+        if self.user:
+            flags |= 0x80
+            payload += _encode_string(self.user)
+            if self.password:
+                flags |= 0x40
+                payload += _encode_string(self.password)
+        variable = _encode_string("MQTT") + bytes((4, flags, self.keepalive >> 8, self.keepalive & 0xFF))
+        return bytes((CONNECT,)) + _encode_length(len(variable) + len(payload)) + variable + payload
+
+    def _publish_packet(self, topic, msg, qos, retain, pid):
+        if isinstance(msg, str):
+            msg = msg.encode()
+        encoded = self._topics.get(topic)
+        if encoded is None:
+            if len(self._topics) >= 8:
+                self._topics.clear()
+            encoded = self._topics[topic] = _encode_string(topic)
+        length = len(encoded) + len(msg) + (2 if qos else 0)
+
+        # Fill one exactly sized buffer instead of growing a bytearray piece by piece
+        header_size = 2
+        n = length >> 7
+        while n:
+            header_size += 1
+            n >>= 7
+        packet = bytearray(header_size + length)
+        packet[0] = PUBLISH | qos << 1 | retain
+        pos = 1
+        n = length
+        while True:
+            byte = n & 0x7F
+            n >>= 7
+            packet[pos] = byte | 0x80 if n else byte
+            pos += 1
+            if not n:
+                break
+        packet[pos:pos + len(encoded)] = encoded
+        pos += len(encoded)
+        if qos:
+            packet[pos] = pid >> 8
+            packet[pos + 1] = pid & 0xFF
+            pos += 2
+        packet[pos:] = msg
+        return packet
+
+    async def _send(self, packet, timeout):
+        async with self._write_lock:
+            if self._writer is None:
+                raise MQTTException("Not connected")
+            self._writer.write(packet)
+            await asyncio.wait_for(self._writer.drain(), timeout)
+            self._last_tx = time.ticks_ms()
+
+    async def _read_packet(self):
+        header = (await self._reader.readexactly(1))[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = (await self._reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                break
+            shift += 7
+        body = await self._reader.readexactly(length) if length else b""
+        return header, body
+
+    async def _read_loop(self):
+        try:
+            while True:
+                header, body = await self._read_packet()
+                kind = header & 0xF0
+                if kind == PUBACK:
+                    entry = self._inflight.pop(body[0] << 8 | body[1], None)
+                    if entry:
+                        if entry[5]:
+                            self._remember_acked(entry)
+                        entry[3].set()
+                        self._window.set()
+                elif kind == PINGRESP:
+                    self._ping_sent = None
+                # Incoming PUBLISH and other packets are not used by this client
+        except Exception as e:
+            log(f"MQTT connection lost: {e!r}")
+        self._read_task = None
+        self._shutdown()
+
+    async def _keepalive_loop(self):
+        while self.connected:
+            await asyncio.sleep(max(1, self.keepalive // 4))
+            now = time.ticks_ms()
+            if self._ping_sent is not None:
+                if time.ticks_diff(now, self._ping_sent) >= self.keepalive * 1000:
+                    log("MQTT keepalive timed out")
+                    self._ping_task = None
+                    self._shutdown()
+                    return
+            elif time.ticks_diff(now, self._last_tx) >= self.keepalive * 500:
+                self._ping_sent = now
+                try:
+                    await self._send(PINGREQ_PACKET, self.publish_timeout)
+                except Exception as e:
+                    log(f"MQTT ping failed: {e!r}")
+
+    def _shutdown(self):
+        """Drop the connection, stop background tasks and wake up pending publishes."""
+        self.connected = False
+        for task in (self._read_task, self._ping_task):
+            if task is not None:
+                task.cancel()
+        self._read_task = None
+        self._ping_task = None
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        self._reader = None
+        self._writer = None
+        # Entries stay in _inflight, which tells the waiting publish it failed
+        for entry in self._inflight.values():
+            entry[3].set()
+        self._window.set()
@@ -0,0 +1,114 @@
+import time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from logger import log, logf, flush, LOG_LEVEL_DEBUG
+
+
+class Sleeper:
+    """Sleep/wake primitives of the board.
+
+    DutyCycle only talks to the hardware through this class, so a fake with
+    the same methods lets the duty-cycle control flow run off-device.
+    """
+
+    def __init__(self, machine=None):
+        if machine is None:
+            import machine
+        self.machine = machine
+
+    def lightsleep(self, ms):
+        self.machine.lightsleep(ms)
+
+    def deepsleep(self, ms):
+        # Does not return on the device; RAM is lost and main.py runs again on wake
+        self.machine.deepsleep(ms)
+
+    def woke_from_deepsleep(self):
+        cause = getattr(self.machine, 'DEEPSLEEP_RESET', None)
+        return cause is not None and self.machine.reset_cause() == cause
+
+
+class DutyCycle:
+    """Wake, sample, publish, sleep until the next period.
+
+    The work of one cycle is done by coroutine functions passed in by the
+    caller:
+        connect(): bring the network up, return True when online
+        read(): return the reading as a dict (see main.get_sensor_data)
+        publish(): send everything pending in the buffer, raise OSError on failure
+        disconnect(): power the radio down (plain function)
+
+    With deep=True the buffer is written to flash before sleeping, since RAM
+    does not survive deep sleep.
+    """
+
+    def __init__(self, sleeper, buffer, period, read, connect, publish, disconnect, deep=True, awake_timeout=30,
+                 now=None):
+        """
+        Args:
+            sleeper (Sleeper): sleep/wake primitives
+            buffer (SampleBuffer): holds readings until they are published
+            period (int): seconds from the start of one cycle to the start of the next
+            deep (bool): use deep sleep instead of light sleep
+            awake_timeout (int): seconds allowed for connect() before giving up this cycle
+            now (callable or None): timestamp of a reading in seconds, time.time by default
+        """
+        self.sleeper = sleeper
+        self.buffer = buffer
+        self.period_ms = period * 1000
+        self.read = read
+        self.connect = connect
+        self.publish = publish
+        self.disconnect = disconnect
+        self.deep = deep
+        self.awake_timeout = awake_timeout
+        self.now = now or time.time
+        self.cycles = 0
+        self.failed_publishes = 0
+
+    async def run_once(self):
+        """Run one wake cycle and return the number of milliseconds to sleep."""
+        started = time.ticks_ms()
+        self.cycles += 1
+
+        online = False
+        try:
+            online = await asyncio.wait_for(self.connect(), self.awake_timeout)
+        except asyncio.TimeoutError:
+            log(f"Network not up within {self.awake_timeout}s; buffering this reading")
+        except Exception as e:
+            log(f"Error while connecting: {e}")
+
+        try:
+            data = await self.read()
+            self.buffer.push(data["temperature"], data["pressure"], data["humidity"], data["gas"], self.now())
+        except Exception as e:
+            log(f"Error occurred while reading sensor: {e}")
+
+        if online:
+            try:
+                await self.publish()
+            except Exception as e:
+                self.failed_publishes += 1
+                log(f"Error occurred while sending data: {e}")
+
+        if self.deep and self.buffer.count and not self.buffer.persist():
+            log("Could not persist buffered readings; they will be lost in deep sleep")
+        self.disconnect()
+
+        awake_ms = time.ticks_diff(time.ticks_ms(), started)
+        logf("Cycle %d awake for %dms, %d reading(s) pending", self.cycles, awake_ms, len(self.buffer), level=LOG_LEVEL_DEBUG)
+        return max(0, self.period_ms - awake_ms)
+
+    def sleep(self, ms):
+        flush()
+        if self.deep:
+            self.sleeper.deepsleep(ms)
+        else:
+            self.sleeper.lightsleep(ms)
+
+    async def run(self):
+        while True:
+            self.sleep(await self.run_once())
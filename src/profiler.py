@@ -0,0 +1,130 @@
+import time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from metrics import registry
+
+# A wakeup later than this (microseconds) counts as a stall and is blamed on a region
+STALL_THRESHOLD_US = 20000
+
+
+class Region:
+    """Timing of one named blocking section. Not re-entrant: don't nest a region in itself."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+        self.stalls = 0  # loop stalls this region was the longest section in
+        self._started = None
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            self._started = time.ticks_us()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._started is not None:
+            self.profiler._record(self, time.ticks_diff(time.ticks_us(), self._started))
+            self._started = None
+        return False
+
+
+class Profiler:
+    """Measures event-loop scheduling jitter and attributes stalls to named code regions.
+
+    run() is a task that sleeps interval_ms at a time and records how late it
+    wakes up. Blocking code is wrapped in a region:
+
+        with profiler.region("sync_time"):
+            sync_time()
+
+    or, for plain (non-async) functions, decorated with @profiler.profiled("name").
+    Time spent awaiting is not blocking, so regions only make sense around
+    synchronous code. When a wakeup is late by more than STALL_THRESHOLD_US,
+    the stall is blamed on the longest region that ran since the previous
+    wakeup. report() returns the top regions by total blocking time.
+    """
+
+    def __init__(self, interval_ms=50, enabled=True):
+        self.interval_ms = interval_ms
+        self.enabled = enabled
+        self.regions = {}
+        self.jitter_us = registry.histogram("loop_jitter_us", (1000, 5000, 10000, 20000, 50000, 100000, 500000))
+        self.stalls = 0
+        self.max_lag_us = 0
+        self._longest = None  # longest region since the last wakeup
+        self._longest_us = 0
+        self._unattributed = Region(self, None)  # stalls with no region running
+
+    def region(self, name):
+        """Return the region object for name, created on first use."""
+        region = self.regions.get(name)
+        if region is None:
+            region = self.regions[name] = Region(self, name)
+        return region
+
+    def profiled(self, name):
+        """Decorator timing every call of a synchronous function as region name."""
+        region = self.region(name)
+
+        def decorator(fn):
+            def wrapper(*args, **kwargs):
+                with region:
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _record(self, region, elapsed_us):
+        region.count += 1
+        region.total_us += elapsed_us
+        if elapsed_us > region.max_us:
+            region.max_us = elapsed_us
+        if elapsed_us > self._longest_us:
+            self._longest = region
+            self._longest_us = elapsed_us
+
+    async def run(self):
+        interval_us = self.interval_ms * 1000
+        while True:
+            self._longest = None
+            self._longest_us = 0
+            started = time.ticks_us()
+            await asyncio.sleep_ms(self.interval_ms)
+            lag = max(0, time.ticks_diff(time.ticks_us(), started) - interval_us)
+            if not self.enabled:
+                continue
+            self.jitter_us.observe(lag)
+            if lag > self.max_lag_us:
+                self.max_lag_us = lag
+            if lag > STALL_THRESHOLD_US:
+                self.stalls += 1
+                (self._longest or self._unattributed).stalls += 1
+
+    def report(self, n=5):
+        """Return up to n (name, count, total_us, max_us, stalls) tuples, most blocking time first."""
+        rows = [(r.name, r.count, r.total_us, r.max_us, r.stalls) for r in self.regions.values()]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:n]
+
+    def report_dict(self, n=5):
+        """report() plus the loop statistics, shaped for publishing as JSON."""
+        return {
+            "stalls": self.stalls,
+            "unattributed": self._unattributed.stalls,
+            "max_lag_us": self.max_lag_us,
+            "regions": [list(row) for row in self.report(n)],
+        }
+
+    def print_report(self, n=5):
+        print(f"loop stalls: {self.stalls} ({self._unattributed.stalls} outside any region), max lag: {self.max_lag_us}us")
+        print(f"{'region':<20} {'count':>6} {'total us':>10} {'max us':>9} {'stalls':>6}")
+        for name, count, total_us, max_us, stalls in self.report(n):
+            print(f"{name:<20} {count:>6} {total_us:>10} {max_us:>9} {stalls:>6}")
+
+
+# Profiler shared by the firmware modules; main starts its run() task if PROFILER_ENABLED
+profiler = Profiler(enabled=False)
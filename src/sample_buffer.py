@@ -0,0 +1,362 @@
+import os
+import struct
+from array import array
+from logger import log
+
+# One reading on flash: temperature, pressure, humidity, gas, timestamp
+RECORD_FORMAT = "<ffffI"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+TIMESTAMP_OFFSET = RECORD_SIZE - 4  # the trailing uint32 of a record
+CHANNELS = 4
+
+
+class SampleBuffer:
+    """Bounded store-and-forward buffer for sensor readings.
+
+    Readings live in a preallocated RAM ring. When the ring is full it is
+    spilled in one write to an append-only flash file (if configured), so
+    nothing is lost while the broker is unreachable. Once the spill file
+    holds spill_max_records readings, the oldest ones on flash are given up
+    and counted as dropped, so the newest stretch of the series survives
+    without gaps. The file is compacted (rewritten without the readings
+    already sent or dropped) before an append would take it past
+    spill_max_records, which bounds its size on flash.
+
+    Draining replays the spill file first, then the RAM ring, oldest first.
+    Delivery is at-least-once: readings are only released after the publish
+    callback returns. How many spilled readings were released is kept in
+    <spill_path>.pos (one small write per release), so they are not sent
+    again after a reset.
+    """
+
+    def __init__(self, capacity=32, spill_path=None, spill_max_records=1440):
+        """
+        Args:
+            capacity (int): number of readings held in RAM
+            spill_path (str or None): flash file used when the RAM ring is full
+            spill_max_records (int): maximum number of readings kept in the spill file
+        """
+        self.capacity = capacity
+        self.spill_path = spill_path
+        self.spill_max_records = spill_max_records
+        self.values = array('f', (0.0 for _ in range(capacity * CHANNELS)))
+        self.timestamps = array('I', (0 for _ in range(capacity)))
+        self.head = 0  # index of the oldest reading in RAM
+        self.count = 0  # readings currently in RAM
+        self.dropped = 0
+        self._record = bytearray(RECORD_SIZE)
+        self._spill_buffer = None  # capacity * RECORD_SIZE bytes, allocated on the first spill
+        self._spill_offset = 0  # records at the start of the spill file already sent
+        self._spill_torn = False  # the spill file ends in a partial record; compacted before the next append
+        self.spilled = self._spill_file_records()
+        if self.spilled:
+            self._spill_offset = self._load_offset()
+        self._boot_records = self.spilled  # records at the start of the spill file written before this boot
+
+    def __len__(self):
+        return self.spilled - self._spill_offset + self.count
+
+    def push(self, temperature, pressure, humidity, gas, timestamp):
+        """Store one reading without allocating."""
+        # A failed spill may still have moved part of the ring to flash
+        if self.count == self.capacity and not self._spill() and self.count == self.capacity:
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            self.dropped += 1
+
+        index = (self.head + self.count) % self.capacity
+        base = index * CHANNELS
+        values = self.values
+        values[base] = temperature
+        values[base + 1] = pressure
+        values[base + 2] = humidity
+        values[base + 3] = gas
+        self.timestamps[index] = int(timestamp)
+        self.count += 1
+
+    async def drain(self, publish, limit=None):
+        """Hand stored readings, oldest first, to await publish(temperature, pressure, humidity, gas, timestamp).
+
+        A reading is only released once publish returns. If publish raises, the
+        exception propagates and that reading stays buffered for the next drain.
+
+        Args:
+            publish (coroutine function): awaited once per reading
+            limit (int or None): maximum number of readings to hand over
+        Returns:
+            int: number of readings handed over
+        """
+        sent = 0
+        if self.spilled:
+            sent = await self._drain_spill(publish, limit)
+            if self._spill_offset < self.spilled:
+                return sent
+
+        values = self.values
+        timestamps = self.timestamps
+        while self.count and (limit is None or sent < limit):
+            index = self.head
+            base = index * CHANNELS
+            await publish(values[base], values[base + 1], values[base + 2], values[base + 3], timestamps[index])
+            self.head = (index + 1) % self.capacity
+            self.count -= 1
+            sent += 1
+        return sent
+
+    def peek(self, n):
+        """Return up to n of the oldest readings as tuples without releasing them."""
+        batch = []
+        if self._spill_offset < self.spilled:
+            record = self._record
+            try:
+                with open(self.spill_path, 'rb') as f:
+                    f.seek(self._spill_offset * RECORD_SIZE)
+                    while len(batch) < n and self._spill_offset + len(batch) < self.spilled:
+                        if f.readinto(record) != RECORD_SIZE:
+                            self.spilled = self._spill_offset + len(batch)
+                            break
+                        batch.append(struct.unpack(RECORD_FORMAT, record))
+            except OSError:
+                self.spilled = self._spill_offset
+
+        values = self.values
+        i = 0
+        while len(batch) < n and i < self.count:
+            index = (self.head + i) % self.capacity
+            base = index * CHANNELS
+            batch.append((values[base], values[base + 1], values[base + 2], values[base + 3], self.timestamps[index]))
+            i += 1
+        return batch
+
+    def release(self, n):
+        """Forget the n oldest readings once they have been delivered."""
+        from_spill = min(n, self.spilled - self._spill_offset)
+        if from_spill > 0:
+            self._spill_offset += from_spill
+            n -= from_spill
+            if self._spill_offset >= self.spilled:
+                self._remove_spill()
+            else:
+                self._save_offset()
+
+        n = min(n, self.count)
+        self.head = (self.head + n) % self.capacity
+        self.count -= n
+
+    def shift_timestamps(self, seconds):
+        """Add seconds to the timestamps of the readings taken since boot, e.g. after the clock was set.
+
+        Readings of this boot already spilled are shifted by compacting the
+        spill file. Readings spilled before the boot keep their timestamps,
+        as the step of this boot's clock says nothing about theirs.
+
+        Returns:
+            int: number of readings shifted; spilled ones are left as they
+            were if the spill file could not be rewritten
+        """
+        timestamps = self.timestamps
+        for i in range(self.count):
+            index = (self.head + i) % self.capacity
+            timestamps[index] = max(0, timestamps[index] + seconds)
+
+        first = max(self._boot_records, self._spill_offset)
+        spilled = self.spilled - first
+        if spilled > 0 and not self._compact(first, seconds):
+            spilled = 0
+        return self.count + max(0, spilled)
+
+    async def drain_batches(self, publish_batch, batch_size, limit=None):
+        """Hand stored readings to await publish_batch(batch) in lists of up to batch_size tuples.
+
+        Same delivery rules as drain(): a batch is only released once
+        publish_batch returns.
+
+        Returns:
+            int: number of readings handed over
+        """
+        sent = 0
+        while len(self) and (limit is None or sent < limit):
+            batch = self.peek(batch_size if limit is None else min(batch_size, limit - sent))
+            if not batch:
+                break
+            await publish_batch(batch)
+            self.release(len(batch))
+            sent += len(batch)
+        return sent
+
+    def persist(self):
+        """Write the readings held in RAM to the spill file, e.g. before deep sleep. Returns True on success."""
+        return not self.count or self._spill()
+
+    def _spill_file_size(self):
+        try:
+            return os.stat(self.spill_path)[6]
+        except OSError:
+            return 0
+
+    def _spill_file_records(self):
+        if not self.spill_path:
+            return 0
+        size = self._spill_file_size()
+        self._spill_torn = size % RECORD_SIZE != 0
+        return size // RECORD_SIZE
+
+    def _load_offset(self):
+        try:
+            with open(self.spill_path + ".pos", 'r') as f:
+                offset = int(f.read())
+        except (OSError, ValueError):
+            return 0  # unknown: replay from the start rather than skip readings
+        return max(0, min(offset, self.spilled))
+
+    def _save_offset(self):
+        try:
+            with open(self.spill_path + ".pos", 'w') as f:
+                f.write(str(self._spill_offset))
+        except OSError as e:
+            log(f"Could not save the spill position to {self.spill_path}.pos: {e}")
+
+    def _compact(self, shift_from=None, seconds=0):
+        """Rewrite the spill file with only the readings not yet released. Returns True on success.
+
+        If shift_from is given, seconds is added on the way to the timestamps
+        of the readings from that record of the old file on. The copy goes to a temporary file that replaces the spill file by
+        rename, so a reset part way leaves one of the two intact. A partial
+        record at the end is left behind.
+        """
+        data = self._scratch()
+        live = self.spilled - self._spill_offset
+        temp_path = self.spill_path + ".tmp"
+        # Until the rename, position 0 only causes duplicates, never skipped readings
+        saved_offset = self._spill_offset
+        self._spill_offset = 0
+        self._save_offset()
+        try:
+            with open(self.spill_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                src.seek(saved_offset * RECORD_SIZE)
+                record = saved_offset  # record number in the old file of data[0]
+                left = live * RECORD_SIZE
+                while left:
+                    n = src.readinto(memoryview(data)[:min(left, len(data))])
+                    if not n:
+                        break
+                    if shift_from is not None:
+                        for i in range(max(0, shift_from - record), n // RECORD_SIZE):
+                            at = i * RECORD_SIZE + TIMESTAMP_OFFSET
+                            struct.pack_into("<I", data, at, max(0, struct.unpack_from("<I", data, at)[0] + seconds))
+                    dst.write(memoryview(data)[:n])
+                    record += n // RECORD_SIZE
+                    left -= n
+            os.rename(temp_path, self.spill_path)
+        except OSError as e:
+            log(f"Could not compact {self.spill_path}: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            self._spill_offset = saved_offset
+            self._save_offset()
+            return False
+        self.spilled = self._spill_file_records()
+        self._boot_records = max(0, self._boot_records - saved_offset)
+        return True
+
+    def _scratch(self):
+        """The spill write buffer, also used to copy the file when compacting."""
+        if self._spill_buffer is None:
+            self._spill_buffer = bytearray(self.capacity * RECORD_SIZE)
+        return self._spill_buffer
+
+    def _spill(self):
+        """Move the whole RAM ring to the spill file. Returns True on success.
+
+        The ring is packed into one buffer and written with a single write.
+        If that fails part way, the readings that reached flash in full are
+        released from RAM, so none is stored twice.
+        """
+        if not self.spill_path or self.count > self.spill_max_records:
+            return False
+
+        live = self.spilled - self._spill_offset
+        excess = live + self.count - self.spill_max_records
+        if excess > 0:
+            # Full: give up the oldest readings on flash rather than the newest in RAM
+            self._spill_offset += excess
+            self.dropped += excess
+        if self._spill_torn or self.spilled + self.count > self.spill_max_records:
+            if self._spill_offset >= self.spilled:
+                self._remove_spill()
+            elif not self._compact():
+                if excess > 0:
+                    self._spill_offset -= excess
+                    self.dropped -= excess
+                return False
+
+        data = self._scratch()
+        values = self.values
+        timestamps = self.timestamps
+        for i in range(self.count):
+            index = (self.head + i) % self.capacity
+            base = index * CHANNELS
+            struct.pack_into(RECORD_FORMAT, data, i * RECORD_SIZE, values[base], values[base + 1],
+                             values[base + 2], values[base + 3], timestamps[index])
+        try:
+            with open(self.spill_path, 'ab') as f:
+                f.write(memoryview(data)[:self.count * RECORD_SIZE])
+        except OSError as e:
+            log(f"Could not spill readings to {self.spill_path}: {e}")
+            # MicroPython files cannot be truncated: count what landed, and compact away a
+            # partial record before the next append, which it would misalign
+            size = self._spill_file_size()
+            landed = max(0, min(self.count, size // RECORD_SIZE - self.spilled))
+            self._spill_torn = size % RECORD_SIZE != 0
+            self.spilled += landed
+            self.head = (self.head + landed) % self.capacity
+            self.count -= landed
+            return False
+
+        self.spilled += self.count
+        self.head = 0
+        self.count = 0
+        return True
+
+    async def _drain_spill(self, publish, limit):
+        sent = 0
+        record = self._record
+        try:
+            f = open(self.spill_path, 'rb')
+        except OSError:
+            # Spill file vanished; forget about it rather than failing the drain
+            self.spilled = 0
+            self._spill_offset = 0
+            self._boot_records = 0
+            return 0
+
+        with f:
+            f.seek(self._spill_offset * RECORD_SIZE)
+            while self._spill_offset < self.spilled and (limit is None or sent < limit):
+                if f.readinto(record) != RECORD_SIZE:
+                    # Truncated tail (e.g. power loss mid-write); nothing more to read
+                    self.spilled = self._spill_offset
+                    break
+                temperature, pressure, humidity, gas, timestamp = struct.unpack(RECORD_FORMAT, record)
+                await publish(temperature, pressure, humidity, gas, timestamp)
+                self._spill_offset += 1
+                sent += 1
+                if self._spill_offset < self.spilled:
+                    self._save_offset()
+
+        if self._spill_offset >= self.spilled:
+            self._remove_spill()
+        return sent
+
+    def _remove_spill(self):
+        for path in (self.spill_path, self.spill_path + ".pos"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.spilled = 0
+        self._spill_offset = 0
+        self._boot_records = 0
+        self._spill_torn = False
@@ -0,0 +1,239 @@
+import socket
+import struct
+import time
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+from logger import log, logf, LOG_LEVEL_DEBUG
+from metrics import registry
+from dns_cache import cache as dns_cache
+
+# Seconds from the NTP epoch (1900) to the time.time() epoch of this port (2000 or 1970)
+NTP_DELTA = 3155673600 if time.gmtime(0)[0] == 2000 else 2208988800
+POLL_MS = 5  # how often a pending reply is checked for; bounds the added receive delay
+RETRY_BASE = 15  # seconds before the first retry after a failed sync, doubling up to interval
+MIN_DRIFT_INTERVAL_MS = 600000  # syncs closer together than this don't update the drift estimate
+DRIFT_WEIGHT = 0.5  # weight of the newest measurement in the drift estimate
+
+_syncs = registry.counter("ntp_syncs")
+_failures = registry.counter("ntp_failures")
+_steps = registry.counter("clock_steps")
+_offset_ms = registry.gauge("time_offset_ms")
+_drift_ppm = registry.gauge("clock_drift_ppm")
+_delay_ms = registry.gauge("ntp_delay_ms")
+
+
+if hasattr(time, "time_ns"):
+    def local_ms():
+        """RTC time in integer milliseconds; ints keep full precision where floats are 32-bit."""
+        return time.time_ns() // 1000000
+else:
+    def local_ms():
+        return time.time() * 1000
+
+
+def _to_ntp(ms, buffer, offset):
+    seconds = ms // 1000
+    struct.pack_into("!II", buffer, offset, seconds + NTP_DELTA, ((ms - seconds * 1000) << 32) // 1000)
+
+
+def _from_ntp(data, offset):
+    seconds, fraction = struct.unpack_from("!II", data, offset)
+    return (seconds - NTP_DELTA) * 1000 + ((fraction * 1000) >> 32)
+
+
+class TimeSync:
+    """SNTP client that keeps timestamps on NTP time without blocking the event loop.
+
+    sync() queries the server over a non-blocking UDP socket (several
+    samples, the one with the shortest round trip wins) and measures the
+    offset between NTP time and the RTC. An offset beyond step_threshold
+    seconds, or the first sync, sets the RTC. Smaller offsets are never
+    stepped: now() adds a correction to the RTC that moves towards the
+    measured offset at no more than max_slew_ppm, so timestamps stay
+    monotonic. Between syncs the correction follows the RTC drift estimated
+    from consecutive syncs. run() re-syncs every interval seconds.
+
+    offset_ms() and sync_age() tell how far timestamps are from the RTC and
+    how old the last sync is; they are also published as metrics.
+    """
+
+    def __init__(self, host="pool.ntp.org", port=123, interval=3600, timeout=2, samples=3,
+                 step_threshold=2, max_slew_ppm=500):
+        """
+        Args:
+            host (str): NTP server
+            port (int): NTP server port
+            interval (int): seconds between syncs in run()
+            timeout (float): seconds to wait for each reply
+            samples (int): requests per sync
+            step_threshold (float): offsets larger than this many seconds set the RTC
+            max_slew_ppm (int): fastest rate at which the correction of now() may change
+        """
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.timeout = timeout
+        self.samples = samples
+        self.step_threshold = step_threshold
+        self.max_slew = max_slew_ppm / 1000000
+        self.drift = None  # estimated offset change per RTC millisecond (RTC slow: positive)
+        self.last_correction_ms = 0  # how far now() jumped at the last sync (0 when only slewed)
+        self.on_first_sync = None  # called with last_correction_ms after the first successful sync
+        self._synced_at = None  # local_ms() of the last sync
+        self._measured = 0  # offset measured at the last sync, relative to the RTC as it is now
+        self._applied = 0.0  # correction now() currently adds
+        self._applied_at = None
+        self._stepped_ms = 0  # total RTC steps, to compare offsets across steps
+        self._last_total = None  # offset to the never-stepped RTC at the last drift measurement
+        self._last_total_at = None
+
+    def synced(self):
+        return self._synced_at is not None
+
+    def sync_age(self):
+        """Seconds since the last successful sync, None before the first."""
+        if self._synced_at is None:
+            return None
+        return (local_ms() - self._synced_at) // 1000
+
+    def offset_ms(self):
+        """Correction now() adds to the RTC, in milliseconds."""
+        return int(self._correction(local_ms()))
+
+    def now_ms(self):
+        """NTP time in integer milliseconds."""
+        local = local_ms()
+        return local + int(self._correction(local))
+
+    def now(self):
+        """NTP time in whole seconds, for timestamps."""
+        return self.now_ms() // 1000
+
+    def _correction(self, local):
+        if self._synced_at is None:
+            return 0
+        target = self._measured + (self.drift or 0) * (local - self._synced_at)
+        if self._applied_at is not None:
+            if local <= self._applied_at:
+                return self._applied
+            limit = (local - self._applied_at) * self.max_slew
+            self._applied += max(-limit, min(limit, target - self._applied))
+        else:
+            self._applied = target
+        self._applied_at = local
+        return self._applied
+
+    async def sync(self):
+        """Measure the offset to the server and apply it. Returns True on success."""
+        best = None
+        try:
+            # Pool addresses rotate by design: cache in RAM, keep them out of the flash file
+            address = socket.getaddrinfo(await dns_cache.lookup_async(self.host, persist=False), self.port)[0][-1]
+            for _ in range(self.samples):
+                sample = await self._query(address)
+                if sample is not None and (best is None or sample[1] < best[1]):
+                    best = sample
+        except OSError as e:
+            logf("NTP sync with %s failed: %s", self.host, e, level=LOG_LEVEL_DEBUG)
+        if best is None:
+            _failures.inc()
+            return False
+
+        offset, delay, local = best
+        first = not self.synced()
+        if first or abs(offset) > self.step_threshold * 1000:
+            self.last_correction_ms = offset - int(self._correction(local))
+            self._step(offset)
+        else:
+            self.last_correction_ms = 0
+            self._update_drift(offset, local)
+            self._measured = offset
+            self._synced_at = local
+        _syncs.inc()
+        _offset_ms.set(self.offset_ms())
+        _delay_ms.set(delay)
+        if self.drift is not None:
+            _drift_ppm.set(int(self.drift * 1000000))
+        logf("NTP sync: offset %dms, delay %dms, drift %s ppm", offset, delay,
+             None if self.drift is None else int(self.drift * 1000000), level=LOG_LEVEL_DEBUG)
+        if first and self.on_first_sync is not None:
+            self.on_first_sync(self.last_correction_ms)
+        return True
+
+    async def run(self):
+        """Task: sync every interval seconds, retrying sooner after failures."""
+        delay = self.interval if self.synced() else 0
+        failures = 0
+        while True:
+            await asyncio.sleep(delay)
+            if await self.sync():
+                failures = 0
+                delay = self.interval
+            else:
+                failures += 1
+                delay = min(self.interval, RETRY_BASE * 2 ** (failures - 1))
+
+    async def _query(self, address):
+        """One request. Returns (offset_ms, round_trip_ms, local_ms at receipt) or None on timeout."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            request = bytearray(48)
+            request[0] = 0x23  # version 4, client mode
+            sent = local_ms()
+            _to_ntp(sent, request, 40)  # echoed back as the originate timestamp
+            sock.sendto(request, address)
+            waited = 0
+            while True:
+                try:
+                    reply = sock.recv(48)
+                except OSError:
+                    if waited >= self.timeout * 1000:
+                        return None
+                    await asyncio.sleep_ms(POLL_MS)
+                    waited += POLL_MS
+                    continue
+                received = local_ms()
+                # Ignore late replies to earlier requests and "kiss of death" (stratum 0) packets
+                if len(reply) >= 48 and request[40:48] == reply[24:32] and reply[1] and reply[0] & 0x07 == 4:
+                    break
+        finally:
+            sock.close()
+        server_received = _from_ntp(reply, 32)
+        server_sent = _from_ntp(reply, 40)
+        offset = ((server_received - sent) + (server_sent - received)) // 2
+        delay = (received - sent) - (server_sent - server_received)
+        return offset, delay, received
+
+    def _update_drift(self, offset, local):
+        total = offset + self._stepped_ms
+        if self._last_total is not None:
+            elapsed = local - self._last_total_at
+            if elapsed < MIN_DRIFT_INTERVAL_MS:
+                return
+            rate = (total - self._last_total) / elapsed
+            self.drift = rate if self.drift is None else self.drift + DRIFT_WEIGHT * (rate - self.drift)
+        self._last_total = total
+        self._last_total_at = local
+
+    def _step(self, offset):
+        """Set the RTC to NTP time; the part below a second is left to the correction."""
+        import machine
+        before = local_ms()
+        tm = time.gmtime((before + offset) // 1000)
+        machine.RTC().datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
+        after = local_ms()
+        step = after - before
+        self._stepped_ms += step
+        residual = offset - step
+        if self._last_total is None:
+            self._last_total = residual + self._stepped_ms
+            self._last_total_at = after
+        self._measured = residual
+        self._applied = residual
+        self._synced_at = after
+        self._applied_at = after
+        _steps.inc()
+        log(f"Clock set by {step}ms from NTP")
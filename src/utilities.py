@@ -1,16 +1,15 @@
-import network
 import time
-from logger import log
+from logger import log, logf, LOG_LEVEL_DEBUG
 
 def connect_wifi(ssid, password):
+    import network  # imported here so the calculators below work without a network stack
     log(f"Connecting to {ssid}")
     wlan = network.WLAN(network.STA_IF) # create station interface
     wlan.active(True)       # activate the interface
-    wlan.scan()
     if not wlan.isconnected(): # check if the station is connected to an AP
         wlan.connect(ssid, password) # connect to an AP
         while not wlan.isconnected():
-            log(f"Waiting for connection to {ssid}")
+            logf("Waiting for connection to %s", ssid, level=LOG_LEVEL_DEBUG)
             time.sleep(1)
     log(f"Wi-Fi connected: {wlan.ifconfig()}")
     return wlan
@@ -41,6 +40,7 @@ class DerivativeAndJerkCalculator:
         return derivative, jerk
     
 def sync_time():
+    import network
     import ntptime
     if network.WLAN(network.STA_IF).isconnected():
         try:
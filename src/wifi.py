@@ -1,11 +1,51 @@
 import network
 import uasyncio as asyncio
 import time
-from logger import log
+import json
+import os
+import ubinascii
+from logger import log, logf, LOG_LEVEL_DEBUG
+from metrics import registry
+
+# Link state polling: fast right after connect() so a new link is seen quickly,
+# slow otherwise to keep wakeups low.
+FAST_POLL_MS = 100
+FAST_POLL_WINDOW_MS = 30000
+SLOW_POLL_MS = 2000
+
+# Seconds the fast path (cached BSSID / IP) gets before falling back to a full connect
+FAST_CONNECT_TIMEOUT = 5
+# Consecutive fast path failures after which the cache is dropped; one miss may be transient
+FAST_CONNECT_MAX_FAILURES = 3
+
+_connects = registry.counter("wifi_connects")
+_connect_failures = registry.counter("wifi_connect_failures")
+_link_losses = registry.counter("wifi_link_losses")
+_connect_ms = registry.histogram("wifi_connect_ms", (500, 1000, 2000, 5000, 10000, 20000))
 
 class WiFi:
-    def __init__(self):
+    def __init__(self, cache_path=None, static_ip=None, reuse_lease=False):
+        """
+        Args:
+            cache_path (str or None): flash file remembering the last good BSSID and IP
+                configuration. Enables the fast reconnect path when set.
+            static_ip (tuple or None): (ip, netmask, gateway, dns) to use instead of DHCP
+            reuse_lease (bool): on the fast path, apply the cached DHCP lease as a static
+                configuration and skip DHCP. Only safe if the router keeps the lease reserved.
+        """
         self.wlan = network.WLAN(network.STA_IF)
+        self.cache_path = cache_path
+        self.static_ip = static_ip
+        self.reuse_lease = reuse_lease
+        self.last_connect_path = None  # "fast" or "full"
+        self._connected = False
+        self._monitor_task = None
+        self._state_changed = None  # replaced after every transition, see _monitor()
+        self._wake = None
+        self._fast_poll_until = 0
+        self._connect_started = None
+        self.polls = 0  # link state polls, for measuring wakeups
+        self.last_connect_ms = None  # time from connect() to link up
 
     def connect(self, ssid, password, timeout=20, retries=3, backoff_factor=2):
         """Connect synchronously with timeout and retries.
@@ -45,7 +85,7 @@ class WiFi:
                         log(f"Wi-Fi connected: {self.wlan.ifconfig()}")
                         return True
                     # log occasional status
-                    log(f"Waiting for connection... status={self.wlan.status()}")
+                    logf("Waiting for connection... status=%s", self.wlan.status(), level=LOG_LEVEL_DEBUG)
                     time.sleep(1)
 
                 log(f"Attempt {attempt} timed out after {timeout}s")
@@ -77,32 +117,41 @@ class WiFi:
     async def connect_async_with_options(self, ssid, password, timeout=20, retries=3, backoff_factor=2):
         log(f"Connecting to {ssid} (async)")
         self.wlan.active(True)
+        self.start_monitor()
         await asyncio.sleep(0)  # allow event loop to run
 
+        if not self.wlan.isconnected() and await self._connect_fast(ssid, password):
+            self._count_connect()
+            return True
+
+        if self.static_ip:
+            self._set_ifconfig(self.static_ip)
+
         attempt = 0
         wait = 1
         while attempt < retries:
             attempt += 1
             try:
-                if self.is_connected():
+                if self.wlan.isconnected():
                     log("Already connected")
                     return True
 
                 log(f"Async attempt {attempt}/{retries}: connecting to {ssid}")
+                self._connect_started = time.ticks_ms()
                 try:
                     self.wlan.connect(ssid, password)
                 except Exception as e:
                     log(f"connect() raised: {e}")
 
-                start = time.time()
-                while time.time() - start < timeout:
-                    if self.wlan.isconnected():
-                        log(f"Wi-Fi connected: {self.wlan.ifconfig()}")
-                        return True
-                    log(f"Waiting for connection... status={self.wlan.status()}")
-                    await asyncio.sleep(1)
+                self._poll_fast()
+                if await self.wait_connected(timeout):
+                    self.last_connect_path = "full"
+                    log(f"Wi-Fi connected in {self.last_connect_ms}ms (full path): {self.wlan.ifconfig()}")
+                    self._save_cache(ssid)
+                    self._count_connect()
+                    return True
 
-                log(f"Async attempt {attempt} timed out after {timeout}s")
+                log(f"Async attempt {attempt} timed out after {timeout}s, status={self.wlan.status()}")
             except Exception as e:
                 log(f"Error occurred while connecting asynchronously: {e}")
 
@@ -118,11 +167,206 @@ class WiFi:
                 wait = min(wait * backoff_factor, 60)
 
         log("Failed to connect after async retries")
+        _connect_failures.inc()
+        return False
+
+    def _count_connect(self):
+        _connects.inc()
+        if self.last_connect_ms is not None:
+            _connect_ms.observe(self.last_connect_ms)
+
+    async def _connect_fast(self, ssid, password):
+        """Try the cached BSSID (and cached or static IP configuration). Returns True on success."""
+        cache = self._load_cache(ssid)
+        if cache is None and not self.static_ip:
+            return False
+
+        bssid = None
+        if cache is not None:
+            bssid = ubinascii.unhexlify(cache["bssid"]) if cache.get("bssid") else None
+        ifconfig = self.static_ip
+        if not ifconfig and self.reuse_lease and cache is not None:
+            ifconfig = cache.get("ifconfig")
+        if not bssid and not ifconfig:
+            # Nothing to skip: this would be a full connect with a shorter timeout
+            return False
+        if ifconfig:
+            self._set_ifconfig(ifconfig)
+
+        log(f"Fast connect to {ssid} (bssid={cache and cache.get('bssid')})")
+        self._connect_started = time.ticks_ms()
+        try:
+            if bssid:
+                self.wlan.connect(ssid, password, bssid=bssid)
+            else:
+                self.wlan.connect(ssid, password)
+        except Exception as e:
+            log(f"connect() raised: {e}")
+
+        self._poll_fast()
+        if await self.wait_connected(FAST_CONNECT_TIMEOUT):
+            self.last_connect_path = "fast"
+            log(f"Wi-Fi connected in {self.last_connect_ms}ms (fast path): {self.wlan.ifconfig()}")
+            if cache is not None and cache.get("failures"):
+                cache["failures"] = 0
+                self._write_cache(cache)
+            return True
+
+        log("Fast connect failed; falling back to a full connect")
+        try:
+            self.wlan.disconnect()
+        except Exception:
+            pass
+        if ifconfig and not self.static_ip:
+            self._set_ifconfig('dhcp')
+        if cache is not None:
+            cache["failures"] = cache.get("failures", 0) + 1
+            if cache["failures"] >= FAST_CONNECT_MAX_FAILURES:
+                log(f"Fast connect failed {cache['failures']} times in a row; dropping the Wi-Fi cache")
+                self._forget_cache()
+            else:
+                self._write_cache(cache)
         return False
 
+    def _set_ifconfig(self, ifconfig):
+        try:
+            self.wlan.ifconfig(ifconfig if ifconfig == 'dhcp' else tuple(ifconfig))
+        except Exception as e:
+            log(f"Could not apply IP configuration {ifconfig}: {e}")
+
+    def _load_cache(self, ssid):
+        if not self.cache_path:
+            return None
+        try:
+            with open(self.cache_path, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cache if cache.get("ssid") == ssid else None
+
+    def _save_cache(self, ssid):
+        """Remember the access point and IP configuration of the current connection."""
+        if not self.cache_path:
+            return
+        try:
+            bssid = self.wlan.config('bssid')
+        except Exception:
+            # Not every port reports it for a station (the Pico W does not); a scan would
+            # block for seconds, so only the IP configuration is cached then
+            bssid = None
+        bssid = ubinascii.hexlify(bssid).decode() if bssid else None
+
+        # Fast path failures stay counted across full connects to the same access point,
+        # so the cache is dropped after FAST_CONNECT_MAX_FAILURES misses in a row
+        old = self._load_cache(ssid)
+        failures = old.get("failures", 0) if old is not None and old.get("bssid") == bssid else 0
+        self._write_cache({
+            "ssid": ssid,
+            "bssid": bssid,
+            "ifconfig": list(self.wlan.ifconfig()),
+            "failures": failures,
+        })
+
+    def _write_cache(self, cache):
+        try:
+            with open(self.cache_path, 'w') as f:
+                json.dump(cache, f)
+        except OSError as e:
+            log(f"Could not write Wi-Fi cache {self.cache_path}: {e}")
+
+    def _forget_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            os.remove(self.cache_path)
+        except OSError:
+            pass
+
+    def start_monitor(self):
+        """Start the task that tracks link state; is_connected() then returns the cached state."""
+        if self._monitor_task is None:
+            self._state_changed = asyncio.Event()
+            self._wake = asyncio.Event()
+            self._connected = self.wlan.isconnected()
+            self._monitor_task = asyncio.create_task(self._monitor())
+
+    def stop_monitor(self):
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+            self._monitor_task = None
+
+    async def wait_connected(self, timeout=None):
+        """Wait until the link is up. Returns False if timeout (seconds) expires first."""
+        self.start_monitor()
+        deadline = None if timeout is None else time.ticks_add(time.ticks_ms(), int(timeout * 1000))
+        while not self._connected:
+            if deadline is None:
+                await self._state_changed.wait()
+                continue
+            remaining = time.ticks_diff(deadline, time.ticks_ms())
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._state_changed.wait(), remaining / 1000)
+            except asyncio.TimeoutError:
+                return self._connected
+        return True
+
+    async def wait_state_change(self):
+        """Wait for the next connect or disconnect and return the new state."""
+        self.start_monitor()
+        await self._state_changed.wait()
+        return self._connected
+
+    def _poll_fast(self):
+        self._fast_poll_until = time.ticks_add(time.ticks_ms(), FAST_POLL_WINDOW_MS)
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _monitor(self):
+        while True:
+            self.polls += 1
+            connected = self.wlan.isconnected()
+            if connected != self._connected:
+                self._connected = connected
+                if connected:
+                    if self._connect_started is not None:
+                        self.last_connect_ms = time.ticks_diff(time.ticks_ms(), self._connect_started)
+                        self._connect_started = None
+                    # No need to keep polling fast once the link is up
+                    self._fast_poll_until = time.ticks_ms()
+                else:
+                    log("Wi-Fi connection lost")
+                    _link_losses.inc()
+                    self._connect_started = time.ticks_ms()
+                    self._poll_fast()
+                # Wake everyone waiting on this transition, then arm a fresh event
+                event = self._state_changed
+                self._state_changed = asyncio.Event()
+                event.set()
+
+            fast = time.ticks_diff(self._fast_poll_until, time.ticks_ms()) > 0
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), (FAST_POLL_MS if fast else SLOW_POLL_MS) / 1000)
+            except asyncio.TimeoutError:
+                pass
+
     def is_connected(self):
+        if self._monitor_task is not None:
+            return self._connected
         return self.wlan.isconnected()
 
+    def deactivate(self):
+        """Disconnect and power the radio down, e.g. before sleeping."""
+        self.stop_monitor()
+        self._connected = False
+        self.disconnect()
+        try:
+            self.wlan.active(False)
+        except Exception as e:
+            log(f"Error occurred while deactivating: {e}")
+
     def disconnect(self):
         try:
             self.wlan.disconnect()
@@ -136,6 +380,13 @@ class WiFi:
             log(f"Error occurred while scanning: {e}")
             return []
 
+    def rssi(self):
+        """Signal strength of the current link in dBm, or None if unavailable."""
+        try:
+            return self.wlan.status('rssi')
+        except Exception:
+            return None
+
     def get_ip(self):
         try:
             return self.wlan.ifconfig()[0]
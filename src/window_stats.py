@@ -0,0 +1,306 @@
+import math
+from array import array
+
+
+class _IndexDeque:
+    """Fixed-capacity deque of sample sequence numbers, backed by an array."""
+
+    def __init__(self, capacity):
+        self.items = array('I', (0 for _ in range(capacity)))
+        self.capacity = capacity
+        self.head = 0
+        self.size = 0
+
+    def front(self):
+        return self.items[self.head]
+
+    def back(self):
+        return self.items[(self.head + self.size - 1) % self.capacity]
+
+    def push_back(self, item):
+        self.items[(self.head + self.size) % self.capacity] = item
+        self.size += 1
+
+    def pop_back(self):
+        self.size -= 1
+
+    def pop_front(self):
+        self.head = (self.head + 1) % self.capacity
+        self.size -= 1
+
+
+class WindowStats:
+    """Statistics over the last `capacity` samples of one signal, amortized O(1) per sample.
+
+    Samples live in a preallocated circular array. Mean and variance come from
+    running sums (taken relative to the first sample to limit float
+    cancellation, and recomputed exactly once per window to stop drift). That
+    recomputation is O(capacity), so the sample that completes a window costs
+    O(capacity) and the others O(1).
+    Min and max use monotonic deques. Derivative and jerk use the same
+    formulas as examples/WindowedSensorDataAnalyzer.py, for the latest
+    samples only.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.values = array('f', (0.0 for _ in range(capacity)))
+        self.count = 0  # samples fed so far; the newest has sequence number count - 1
+        self._shift = 0.0
+        self._sum = 0.0
+        self._sum_sq = 0.0
+        self._max = _IndexDeque(capacity)
+        self._min = _IndexDeque(capacity)
+        self._last_value = None
+        self._last_timestamp = None
+        self._last_delta = None  # value change over the newest interval
+        self._last_dt = None
+        self._derivative = None
+        self._jerk = None
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def feed(self, value, timestamp):
+        capacity = self.capacity
+        seq = self.count
+        slot = seq % capacity
+        values = self.values
+
+        if seq == 0:
+            self._shift = value
+        if seq >= capacity:
+            old = values[slot] - self._shift
+            self._sum -= old
+            self._sum_sq -= old * old
+        values[slot] = value
+        shifted = values[slot] - self._shift  # read back so sums match the stored float
+        self._sum += shifted
+        self._sum_sq += shifted * shifted
+        self.count = seq + 1
+
+        if slot == capacity - 1:
+            self._resum()
+
+        self._update_extremes(seq, values[slot])
+        self._update_rates(value, timestamp)
+
+    def mean(self):
+        n = len(self)
+        if not n:
+            return None
+        return self._shift + self._sum / n
+
+    def variance(self):
+        """Population variance of the window, like WindowedSensorDataAnalyzer.std_deviation()."""
+        n = len(self)
+        if n < 2:
+            return None
+        mean = self._sum / n
+        return max(0.0, self._sum_sq / n - mean * mean)
+
+    def std_deviation(self):
+        variance = self.variance()
+        return None if variance is None else math.sqrt(variance)
+
+    def min(self):
+        return self.values[self._min.front() % self.capacity] if self.count else None
+
+    def max(self):
+        return self.values[self._max.front() % self.capacity] if self.count else None
+
+    def derivative(self):
+        """Latest (v[n] - v[n-1]) / (t[n] - t[n-1]), or None with fewer than 2 samples."""
+        return self._derivative
+
+    def jerk(self):
+        """Latest (v[n] - 2v[n-1] + v[n-2]) / ((t[n] - t[n-1]) * (t[n-1] - t[n-2]))."""
+        return self._jerk
+
+    def _resum(self):
+        total = 0.0
+        total_sq = 0.0
+        shift = self._shift
+        for value in self.values:
+            shifted = value - shift
+            total += shifted
+            total_sq += shifted * shifted
+        self._sum = total
+        self._sum_sq = total_sq
+
+    def _update_extremes(self, seq, value):
+        capacity = self.capacity
+        values = self.values
+        oldest = seq - capacity + 1  # sequence numbers below this left the window
+
+        deque = self._max
+        if deque.size and deque.front() < oldest:
+            deque.pop_front()
+        while deque.size and values[deque.back() % capacity] <= value:
+            deque.pop_back()
+        deque.push_back(seq)
+
+        deque = self._min
+        if deque.size and deque.front() < oldest:
+            deque.pop_front()
+        while deque.size and values[deque.back() % capacity] >= value:
+            deque.pop_back()
+        deque.push_back(seq)
+
+    def _update_rates(self, value, timestamp):
+        if self._last_value is None or timestamp == self._last_timestamp:
+            # No interval to measure; rates restart from this sample
+            self._derivative = None
+            self._last_delta = None
+            self._jerk = None
+        else:
+            delta = value - self._last_value
+            dt = timestamp - self._last_timestamp
+            self._derivative = delta / dt
+            if self._last_delta is not None:
+                self._jerk = (delta - self._last_delta) / (dt * self._last_dt)
+            self._last_delta = delta
+            self._last_dt = dt
+        self._last_value = value
+        self._last_timestamp = timestamp
+
+
+class ChannelStats:
+    """Windowed statistics for several channels sampled together, amortized O(channels) per sample.
+
+    All channels share one flat array('f') window (one row per sample) and
+    one array per running quantity, so update() touches every channel in a
+    single pass without building dicts. As in WindowStats, the running sums
+    are recomputed over the whole window once per window. Results are written into buffers the
+    caller preallocates, e.g. array('f', [0.0] * channels).
+    """
+
+    def __init__(self, channels, capacity):
+        self.channels = channels
+        self.capacity = capacity
+        self.count = 0
+        self.window = self._zeros(channels * capacity)
+        self._shift = self._zeros(channels)
+        self._sum = self._zeros(channels)
+        self._sum_sq = self._zeros(channels)
+        self._last = self._zeros(channels)
+        self._last_delta = self._zeros(channels)
+        self._derivative = self._zeros(channels)
+        self._jerk = self._zeros(channels)
+        self._last_timestamp = None
+        self._last_dt = 0
+        self._intervals = 0  # consecutive valid intervals, 2 means jerk is available
+
+    @staticmethod
+    def _zeros(n):
+        return array('f', (0.0 for _ in range(n)))
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def update(self, values, timestamp):
+        """Add one sample; values is an indexable sequence with one entry per channel."""
+        channels = self.channels
+        seq = self.count
+        slot = seq % self.capacity
+        base = slot * channels
+        window = self.window
+        shift = self._shift
+        sums = self._sum
+        sums_sq = self._sum_sq
+        last = self._last
+        last_delta = self._last_delta
+        full = seq >= self.capacity
+
+        dt = 0
+        if self._last_timestamp is not None:
+            dt = timestamp - self._last_timestamp
+        rates = dt != 0
+        jerk = rates and self._intervals >= 1
+
+        for c in range(channels):
+            value = values[c]
+            if seq == 0:
+                shift[c] = value
+            if full:
+                old = window[base + c] - shift[c]
+                sums[c] -= old
+                sums_sq[c] -= old * old
+            window[base + c] = value
+            shifted = window[base + c] - shift[c]
+            sums[c] += shifted
+            sums_sq[c] += shifted * shifted
+
+            if rates:
+                delta = value - last[c]
+                self._derivative[c] = delta / dt
+                self._jerk[c] = (delta - last_delta[c]) / (dt * self._last_dt) if jerk else 0.0
+                last_delta[c] = delta
+            else:
+                # No interval to measure; rates restart from this sample
+                self._derivative[c] = 0.0
+                self._jerk[c] = 0.0
+            last[c] = value
+
+        self._intervals = min(self._intervals + 1, 2) if rates else 0
+        self._last_dt = dt
+        self._last_timestamp = timestamp
+        self.count = seq + 1
+        if slot == self.capacity - 1:
+            self._resum()
+
+    def mean_into(self, out):
+        """Write per-channel means into out. Returns out, or None if the window is empty."""
+        n = len(self)
+        if not n:
+            return None
+        for c in range(self.channels):
+            out[c] = self._shift[c] + self._sum[c] / n
+        return out
+
+    def variance_into(self, out):
+        """Write per-channel population variances into out. Returns out, or None with fewer than 2 samples."""
+        n = len(self)
+        if n < 2:
+            return None
+        for c in range(self.channels):
+            mean = self._sum[c] / n
+            out[c] = max(0.0, self._sum_sq[c] / n - mean * mean)
+        return out
+
+    def std_deviation_into(self, out):
+        if self.variance_into(out) is None:
+            return None
+        for c in range(self.channels):
+            out[c] = math.sqrt(out[c])
+        return out
+
+    def derivative_into(self, out):
+        """Write the latest per-channel derivatives into out. Returns out, or None if not available yet."""
+        if self._intervals < 1:
+            return None
+        for c in range(self.channels):
+            out[c] = self._derivative[c]
+        return out
+
+    def jerk_into(self, out):
+        """Write the latest per-channel jerks into out. Returns out, or None if not available yet."""
+        if self._intervals < 2:
+            return None
+        for c in range(self.channels):
+            out[c] = self._jerk[c]
+        return out
+
+    def _resum(self):
+        channels = self.channels
+        window = self.window
+        for c in range(channels):
+            shift = self._shift[c]
+            total = 0.0
+            total_sq = 0.0
+            for i in range(c, len(window), channels):
+                shifted = window[i] - shift
+                total += shifted
+                total_sq += shifted * shifted
+            self._sum[c] = total
+            self._sum_sq[c] = total_sq
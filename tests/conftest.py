@@ -0,0 +1,34 @@
+"""Host-side checks of the firmware in src/, run with pytest from the repository root.
+
+The fake device modules in sim/ stand in for the MicroPython ones and the
+servers in tools/ for the network; benchmarks/ provides the replay traces.
+Time runs on the sim/ virtual clock at real speed, advanced by hand where
+a check needs hours to pass.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in ("benchmarks", "tools", "src", "sim"):
+    path = os.path.join(ROOT, path)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import clock as sim_clock  # noqa: E402
+
+sim_clock.install(1)  # before the firmware modules are imported: they need the MicroPython time functions
+
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    """A fresh virtual clock, with a temporary directory as the flash."""
+    monkeypatch.chdir(tmp_path)
+    return sim_clock.install(1)
+
+
+@pytest.fixture
+def fast_clock(clock):
+    """The virtual clock at 200x, for checks that wait through connect timeouts."""
+    return sim_clock.install(200)
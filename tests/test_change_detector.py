@@ -0,0 +1,87 @@
+from change_detector import ChangeDetector
+from replay_deadband import synthetic_trace
+
+QUIET = [21.0, 1013.0, 45.0, 150000.0]
+
+
+def detector(**options):
+    options.setdefault("sigma", 0)
+    options.setdefault("heartbeat", 300)
+    return ChangeDetector(**options)
+
+
+def moved(channel, by, values=QUIET):
+    values = list(values)
+    values[channel] += by
+    return values
+
+
+def test_first_reading_is_reported():
+    d = detector()
+    assert d.update(QUIET, 0)
+    assert d.reason == ChangeDetector.FIRST
+    assert list(d.reported) == QUIET
+
+
+def test_readings_inside_the_deadband_are_held_back():
+    d = detector()
+    d.update(QUIET, 0)
+    assert not d.update(moved(0, 0.1), 10)  # temperature band 0.2
+    assert not d.update(moved(3, 4000), 20)  # gas: 5% of 150000 beats the 5000 absolute band
+    assert not d.update(moved(3, 7000), 30)
+    assert d.reports == 1
+
+
+def test_change_beyond_the_deadband_is_reported_and_becomes_the_reference():
+    d = detector()
+    d.update(QUIET, 0)
+    assert d.update(moved(0, 0.3), 10)
+    assert d.reason == ChangeDetector.CHANGE
+    assert not d.update(moved(0, 0.4), 20)  # 0.1 from the new reference
+    assert d.update(moved(3, 8000), 30)
+    assert d.reason == ChangeDetector.CHANGE
+
+
+def test_heartbeat_reports_a_stable_reading():
+    d = detector(heartbeat=60)
+    d.update(QUIET, 0)
+    assert not d.update(QUIET, 59)
+    assert d.update(QUIET, 60)
+    assert d.reason == ChangeDetector.HEARTBEAT
+    assert not d.update(QUIET, 100)
+    assert d.update(QUIET, 120)
+
+
+def test_sigma_band_widens_on_noisy_channels():
+    noisy = [moved(0, 0.5 if i % 2 else -0.5) for i in range(20)]
+    step = moved(0, 0.8)
+    plain = detector(heartbeat=10000)
+    learnt = detector(sigma=3.0, heartbeat=10000)
+    for d in (plain, learnt):
+        d.update(QUIET, 0)
+        for i, values in enumerate(noisy):
+            d.update(values, i + 1)
+            d.reported[0] = QUIET[0]  # keep the reference fixed to compare the bands
+    assert plain.update(step, 100)
+    assert not learnt.update(step, 100)  # 0.8 is within 3 sigma of +-0.5 steps
+
+
+def test_replayed_day_sends_a_fraction_and_every_event():
+    d = ChangeDetector()
+    samples = 0
+    last_report = None
+    longest_gap = 0
+    for timestamp, values in synthetic_trace():
+        samples += 1
+        reported = d.update(values, timestamp)
+        if timestamp % 21600 == 10800:
+            # The window-opening events of the synthetic day go out at once
+            assert reported and d.reason == ChangeDetector.CHANGE
+        if reported:
+            if last_report is not None:
+                longest_gap = max(longest_gap, timestamp - last_report)
+            last_report = timestamp
+
+    assert samples == 8640
+    assert d.reports < samples * 0.05  # 299 at the defaults
+    assert longest_gap <= d.heartbeat
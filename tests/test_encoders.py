@@ -0,0 +1,26 @@
+import json
+import math
+
+import pytest
+
+from encoders import FixedJsonEncoder, JsonEncoder
+
+
+def test_fixed_json_matches_json_within_its_decimals():
+    reading = (21.456, 1013.25, 45.5, 120345.0, 1700000000)
+    fixed = json.loads(bytes(FixedJsonEncoder().encode(*reading)))
+    plain = json.loads(JsonEncoder().encode(*reading))
+    assert fixed.keys() == plain.keys()
+    for field in fixed:
+        assert fixed[field] == pytest.approx(plain[field], abs=0.006)
+    assert fixed["temperature"] == 21.46
+
+
+@pytest.mark.parametrize("bad", [math.nan, math.inf, -math.inf, 1e12, -1e30])
+def test_unrepresentable_values_are_sent_as_null(bad):
+    encoder = FixedJsonEncoder()
+    payload = json.loads(bytes(encoder.encode(bad, 1013.25, -4.5, bad, 1700000000)))
+    assert payload == {"temperature": None, "pressure": 1013.25, "humidity": -4.5, "gas": None,
+                       "timestamp": 1700000000}
+    # The encoder is still usable afterwards
+    assert json.loads(bytes(encoder.encode(20.0, 1000.0, 40.0, 99999999999.0, 1)))["gas"] == 99999999999
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+
+import decode_log
+import logger
+
+
+@pytest.fixture
+def binary_log(clock, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_FILE_FORMAT", "binary")
+    monkeypatch.setattr(logger, "LOG_FILE_MAX_SIZE", 1 << 20)
+    for state in ("_buffers", "_buffered_bytes", "_file_sizes", "_string_tables", "_string_table_sizes"):
+        monkeypatch.setattr(logger, state, {})
+    monkeypatch.setattr(logger, "_write_failed", set())
+    logger.set_level(logger.LOG_LEVEL_INFO, console=logger.LOG_LEVEL_ERROR + 1, file=logger.LOG_LEVEL_INFO)
+    yield "test.log"
+    logger.set_level(logger.LOG_LEVEL_INFO, console=logger.LOG_LEVEL_DEBUG, file=logger.LOG_LEVEL_DEBUG)
+
+
+def decoded(path):
+    logger.flush()
+    with open(path, "rb") as f:
+        data = f.read()
+    return [message for _, _, message in decode_log.decode_records(data, decode_log.load_strings(path + ".str"))]
+
+
+def test_log_messages_round_trip_through_the_decoder(binary_log):
+    messages = [
+        "Retrying in 5s...",
+        "Retrying in 300s...",
+        "Battery at 100% after 007 tries",
+        "Wi-Fi connected: ('192.168.1.50', '255.255.255.0')",
+        "Offset -12 ms, counter 4294967296",
+        "No numbers, but a literal %d",
+    ]
+    for message in messages:
+        logger.log(message, file_path=binary_log)
+    logger.logf("Sensor read took %sms", 12.5, file_path=binary_log)
+    assert decoded(binary_log) == messages + ["Sensor read took 12.5ms"]
+
+
+def test_messages_differing_only_in_numbers_share_a_string_table_entry(binary_log):
+    for delay in (5, 10, 20, 40):
+        logger.log(f"Retrying in {delay}s...", file_path=binary_log)
+    assert decode_log.load_strings(binary_log + ".str") == ["Retrying in %ds..."]
+    logger.flush()
+    with open(binary_log, "rb") as f:
+        size = len(f.read())
+    assert size == 4 * (8 + 2)  # header plus one uint8 argument each
+
+
+def test_full_string_table_stores_new_messages_inline(binary_log, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_STRING_TABLE_MAX_SIZE", len("Retrying in %ds...\n"))
+    logger.log("Retrying in 5s...", file_path=binary_log)
+    logger.log("Error occurred while sending data: EHOSTUNREACH", file_path=binary_log)
+    logger.log("Retrying in 10s...", file_path=binary_log)
+    assert decoded(binary_log) == ["Retrying in 5s...", "Error occurred while sending data: EHOSTUNREACH",
+                                   "Retrying in 10s..."]
+    assert decode_log.load_strings(binary_log + ".str") == ["Retrying in %ds...", "%s"]
+
+
+def test_string_table_stays_within_its_size_limit(binary_log):
+    for i in range(100):
+        logger.log(f"Error occurred while sending data: unexpected reply {chr(65 + i % 26) * (i + 1)}",
+                   file_path=binary_log)
+    assert os.stat(binary_log + ".str")[6] <= logger.LOG_STRING_TABLE_MAX_SIZE
+    assert len(decoded(binary_log)) == 100
+
+
+def test_failed_flush_of_one_file_does_not_hold_back_another(binary_log, monkeypatch):
+    monkeypatch.setattr(logger, "LOG_FILE_FORMAT", "text")
+    monkeypatch.setattr(logger, "LOG_FLUSH_INTERVAL", 3600)
+    logger.log("lost", level=logger.LOG_LEVEL_ERROR, file_path="missing/dir.log")  # flushes and fails
+    assert "missing/dir.log" in logger._write_failed
+
+    line = "x" * 100
+    for _ in range(logger.LOG_BUFFER_SIZE // len(line) + 1):
+        logger.log(line, file_path=binary_log)
+    assert os.path.exists(binary_log)  # flushed on size as usual
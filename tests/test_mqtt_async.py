@@ -0,0 +1,265 @@
+import asyncio
+import json
+import sys
+
+import pytest
+
+import run_sim
+from fake_broker import FakeBroker
+from mqtt_async import MQTTClient, MQTTException
+
+TOPIC = "node/bme688"
+
+
+def client_for(broker, **options):
+    options.setdefault("clean_session", False)
+    return MQTTClient("test-node", "127.0.0.1", broker.port, keepalive=0, **options)
+
+
+async def wait_until(condition, timeout=3):
+    for _ in range(int(timeout / 0.005)):
+        if condition():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("timed out waiting")
+
+
+def payloads(broker):
+    return [payload for _, payload, _ in broker.messages]
+
+
+async def publish_and_drop(broker, client, messages):
+    """Publish messages at QoS 1 and drop the connection once the broker has them, before any PUBACK."""
+    received = len(broker.messages)
+    tasks = [asyncio.ensure_future(client.publish(TOPIC, msg, qos=1)) for msg in messages]
+    await wait_until(lambda: len(broker.messages) == received + len(messages))
+    broker.drop_clients()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, MQTTException) for result in results)
+
+
+def test_messages_cut_off_by_a_drop_are_resent_once_in_order(clock):
+    async def main():
+        broker = await FakeBroker(port=0, latency_ms=300).start()
+        client = client_for(broker, max_inflight=4)
+        try:
+            await client.connect()
+            client._pid = 0xFFFC  # the session straddles the packet id wrap
+            messages = [b"m0", b"m1", b"m2", b"m3"]
+            await publish_and_drop(broker, client, messages)
+            assert client.inflight() == 4
+
+            await client.connect()
+            assert client.session_present
+            await wait_until(lambda: client.inflight() == 0)
+            assert payloads(broker) == messages + messages
+            assert broker.duplicates == 4
+
+            # Acknowledged now: the next connection resends nothing
+            await client.disconnect()
+            await client.connect()
+            await asyncio.sleep(0.4)
+            assert len(broker.messages) == 8
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_repeating_a_failed_publish_does_not_send_a_third_copy(clock):
+    async def main():
+        broker = await FakeBroker(port=0, latency_ms=200).start()
+        client = client_for(broker)
+        try:
+            await client.connect()
+
+            # Repeated while the resend still waits for its PUBACK: the repeat waits for it too
+            await publish_and_drop(broker, client, [b"first"])
+            await client.connect()
+            await client.publish(TOPIC, b"first", qos=1)
+            assert payloads(broker).count(b"first") == 2
+
+            # Repeated after the resend was acknowledged: returns without sending
+            await publish_and_drop(broker, client, [b"second"])
+            await client.connect()
+            await wait_until(lambda: client.inflight() == 0)
+            await client.publish(TOPIC, b"second", qos=1)
+            assert payloads(broker).count(b"second") == 2
+
+            # Only once: a new message with the same payload goes out again
+            await client.publish(TOPIC, b"second", qos=1)
+            assert payloads(broker).count(b"second") == 3
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_no_more_than_max_inflight_messages_await_a_puback(clock):
+    async def main():
+        broker = await FakeBroker(port=0, latency_ms=300).start()
+        client = client_for(broker, max_inflight=2)
+        try:
+            await client.connect()
+            tasks = [asyncio.ensure_future(client.publish(TOPIC, b"m%d" % i, qos=1)) for i in range(5)]
+            await wait_until(lambda: len(broker.messages) == 2)
+            await asyncio.sleep(0.15)
+            assert len(broker.messages) == 2 and client.inflight() == 2
+            await asyncio.gather(*tasks)
+            assert payloads(broker) == [b"m%d" % i for i in range(5)]
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_packet_ids_held_by_the_session_are_skipped_after_the_wrap(clock):
+    async def main():
+        broker = await FakeBroker(port=0, latency_ms=300).start()
+        client = client_for(broker)
+        try:
+            await client.connect()
+            client._pid = 0xFFFE
+            await publish_and_drop(broker, client, [b"a", b"b", b"c"])
+            assert sorted(client._inflight) == [1, 2, 0xFFFF]
+
+            await client.connect()  # resent, PUBACKs still to come
+            client._pid = 0xFFFE  # as if the counter had gone round once since
+            task = asyncio.ensure_future(client.publish(TOPIC, b"d", qos=1))
+            await wait_until(lambda: len(client._inflight) == 4)
+            assert client._carries(client._inflight[3], TOPIC, b"d")
+            await task
+            await wait_until(lambda: client.inflight() == 0)
+            assert payloads(broker) == [b"a", b"b", b"c", b"a", b"b", b"c", b"d"]
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+class HeldAcksBroker(FakeBroker):
+    """Holds back every PUBACK until release() is called, to acknowledge messages in a chosen order."""
+
+    def __init__(self):
+        super().__init__(port=0)
+        self.held = []  # (writer, PUBACK packet), in the order the messages arrived
+
+    async def _reply(self, writer, packet):
+        if packet[0] == 0x40:
+            self.held.append((writer, packet))
+        else:
+            await super()._reply(writer, packet)
+
+    def release(self, *indexes):
+        """Send the PUBACKs of the messages received as the given indexes (0 = first held)."""
+        for i in indexes:
+            writer, packet = self.held[i]
+            if not writer.is_closing():
+                writer.write(packet)
+
+
+@pytest.fixture
+def firmware(clock):
+    """Load src/main.py against the sim modules; the test's own module imports are restored afterwards."""
+    saved = dict(sys.modules)
+    yield lambda port, **overrides: run_sim.load_firmware(overrides, port)
+    run_sim._unload_firmware()
+    sys.modules.update(saved)
+
+
+def buffered(main, count):
+    buffer = main.SampleBuffer(16)
+    for i in range(count):
+        buffer.push(20.0 + i, 1000.0, 40.0, 100000.0, 1700000000 + i)
+    return buffer
+
+
+def timestamps(broker):
+    return [json.loads(payload)["timestamp"] - 1700000000 for _, payload, _ in broker.messages]
+
+
+def test_out_of_order_pubacks_release_only_the_acknowledged_prefix(firmware):
+    async def main():
+        broker = await HeldAcksBroker().start()
+        firmware_main = firmware(broker.port, MQTT_MAX_INFLIGHT=4)
+        client = client_for(broker, max_inflight=4)
+        buffer = buffered(firmware_main, 6)
+        try:
+            await client.connect()
+            task = asyncio.ensure_future(firmware_main.send_pipelined(client, buffer))
+            await wait_until(lambda: len(broker.held) == 4)
+
+            broker.release(2, 1)  # behind the first, which is still unacknowledged
+            await wait_until(lambda: len(broker.held) == 6)  # their slots went to the last two
+            assert len(buffer) == 6
+
+            broker.release(0)
+            await wait_until(lambda: len(buffer) == 3)
+
+            broker.release(5, 3, 4)
+            assert await task == 6
+            assert len(buffer) == 0
+            assert timestamps(broker) == [0, 1, 2, 3, 4, 5]
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_drop_with_a_full_window_keeps_the_unacknowledged_readings(firmware):
+    async def main():
+        broker = await HeldAcksBroker().start()
+        firmware_main = firmware(broker.port, MQTT_MAX_INFLIGHT=4)
+        client = client_for(broker, max_inflight=4)
+        buffer = buffered(firmware_main, 6)
+        try:
+            await client.connect()
+            task = asyncio.ensure_future(firmware_main.send_pipelined(client, buffer))
+            await wait_until(lambda: len(broker.held) == 4)
+            broker.release(0, 2)
+            await wait_until(lambda: len(broker.held) == 6)
+            broker.drop_clients()
+            with pytest.raises(MQTTException):
+                await task
+            # Reading 2 was acknowledged but sits behind reading 1, so the buffer keeps it
+            assert [reading[4] - 1700000000 for reading in buffer.peek(6)] == [1, 2, 3, 4, 5]
+
+            await client.connect()  # resends 1, 3, 4 and 5
+            await wait_until(lambda: len(broker.held) == 10)
+            broker.release(6, 7, 8, 9)
+            assert await firmware_main.send_pipelined(client, buffer) == 5
+            assert len(buffer) == 0
+            # Every reading delivered; only the unacknowledged ones twice
+            assert timestamps(broker) == [0, 1, 2, 3, 4, 5, 1, 3, 4, 5]
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(main())
+
+
+def test_keepalive_follows_ticks_not_the_rtc(fast_clock):
+    async def main():
+        broker = await FakeBroker(port=0).start()
+        client = MQTTClient("test-node", "127.0.0.1", broker.port, keepalive=2)
+        try:
+            await client.connect()
+            fast_clock.set_rtc(fast_clock.rtc_time() - 3600)  # e.g. the first time sync sets the clock back
+            await asyncio.sleep(fast_clock.real_seconds(10))
+            assert broker.pings >= 3
+
+            pings = broker.pings
+            fast_clock.set_rtc(fast_clock.rtc_time() + 7200)
+            await asyncio.sleep(fast_clock.real_seconds(10))
+            assert client.is_connected()
+            assert 3 <= broker.pings - pings <= 12  # one per keepalive / 2
+        finally:
+            await client.disconnect()
+            await broker.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from power import DutyCycle
+from sample_buffer import SampleBuffer
+
+READING = {"temperature": 21.5, "pressure": 1013.0, "humidity": 45.0, "gas": 150000.0}
+
+
+class Asleep(Exception):
+    """Ends DutyCycle.run() where the board would go to sleep."""
+
+
+class FakeSleeper:
+    def __init__(self):
+        self.sleeps = []
+
+    def lightsleep(self, ms):
+        self.sleeps.append(("light", ms))
+
+    def deepsleep(self, ms):
+        self.sleeps.append(("deep", ms))
+        raise Asleep()
+
+    def woke_from_deepsleep(self):
+        return bool(self.sleeps)
+
+
+class Node:
+    """The coroutines main.duty_cycle_main hands to DutyCycle, with switches for the failure cases."""
+
+    def __init__(self, buffer, online=True, connect_delay=0, publish_error=None):
+        self.buffer = buffer
+        self.online = online
+        self.connect_delay = connect_delay
+        self.publish_error = publish_error
+        self.published = []
+        self.disconnects = 0
+
+    async def connect(self):
+        await asyncio.sleep(self.connect_delay)
+        return self.online
+
+    async def read(self):
+        return READING
+
+    async def publish(self):
+        if self.publish_error:
+            raise self.publish_error
+
+        async def send(*reading):
+            self.published.append(reading)
+        await self.buffer.drain(send)
+
+    def disconnect(self):
+        self.disconnects += 1
+
+
+def cycle(node, sleeper=None, **options):
+    options.setdefault("now", lambda: 1700000000)
+    return DutyCycle(sleeper or FakeSleeper(), node.buffer, 60, node.read, node.connect, node.publish,
+                     node.disconnect, **options)
+
+
+def test_online_cycle_publishes_and_sleeps_for_the_rest_of_the_period(clock):
+    node = Node(SampleBuffer(4, "spill.bin"))
+    sleep_ms = asyncio.run(cycle(node).run_once())
+    assert node.published == [(21.5, 1013.0, 45.0, 150000.0, 1700000000)]
+    assert len(node.buffer) == 0
+    assert node.disconnects == 1
+    assert 59000 < sleep_ms <= 60000
+
+
+def test_offline_cycle_keeps_the_reading_on_flash_for_deep_sleep(clock):
+    node = Node(SampleBuffer(4, "spill.bin"), online=False)
+    asyncio.run(cycle(node).run_once())
+    assert node.published == []
+    assert node.buffer.count == 0 and node.buffer.spilled == 1  # RAM does not survive deep sleep
+
+    # After the wake the spilled reading goes out first
+    node = Node(SampleBuffer(4, "spill.bin"))
+    asyncio.run(cycle(node, now=lambda: 1700000060).run_once())
+    assert [reading[4] for reading in node.published] == [1700000000, 1700000060]
+
+
+def test_light_sleep_keeps_readings_in_ram(clock):
+    node = Node(SampleBuffer(4, "spill.bin"), online=False)
+    asyncio.run(cycle(node, deep=False).run_once())
+    assert node.buffer.count == 1 and node.buffer.spilled == 0
+
+
+def test_connect_timeout_buffers_the_reading(fast_clock):
+    node = Node(SampleBuffer(4, "spill.bin"), connect_delay=60)
+    asyncio.run(cycle(node, awake_timeout=5).run_once())
+    assert node.published == []
+    assert len(node.buffer) == 1
+
+
+def test_failed_publish_keeps_the_reading(clock):
+    node = Node(SampleBuffer(4, "spill.bin"), publish_error=OSError("broker down"))
+    duty = cycle(node)
+    asyncio.run(duty.run_once())
+    assert duty.failed_publishes == 1
+    assert len(node.buffer) == 1
+
+
+def test_run_sleeps_between_cycles(clock):
+    sleeper = FakeSleeper()
+    node = Node(SampleBuffer(4, "spill.bin"))
+    with pytest.raises(Asleep):
+        asyncio.run(cycle(node, sleeper).run())
+    assert len(sleeper.sleeps) == 1 and sleeper.sleeps[0][0] == "deep"
+    assert 59000 < sleeper.sleeps[0][1] <= 60000
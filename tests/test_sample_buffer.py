@@ -0,0 +1,130 @@
+import asyncio
+import os
+
+import pytest
+
+import sample_buffer
+from sample_buffer import RECORD_SIZE, SampleBuffer
+
+SPILL = "samples.bin"
+
+
+def push(buffer, first, count):
+    for t in range(first, first + count):
+        buffer.push(20.0, 1000.0, 40.0, 100000.0, t)
+
+
+def timestamps(buffer):
+    return [reading[4] for reading in buffer.peek(len(buffer))]
+
+
+def drained(buffer):
+    sent = []
+
+    async def publish(*reading):
+        sent.append(reading[4])
+    asyncio.run(buffer.drain(publish))
+    return sent
+
+
+def test_full_ring_spills_to_flash_and_drains_oldest_first(clock):
+    buffer = SampleBuffer(4, SPILL)
+    push(buffer, 0, 10)
+    assert buffer.spilled == 8 and buffer.count == 2
+    assert drained(buffer) == list(range(10))
+    assert len(buffer) == 0 and not os.path.exists(SPILL)
+
+
+def test_full_spill_file_gives_up_the_oldest_readings_and_stays_bounded(clock):
+    buffer = SampleBuffer(4, SPILL, spill_max_records=10)
+    push(buffer, 0, 23)
+    # The newest 13 survive without a gap: 10 on flash, 3 in RAM
+    assert timestamps(buffer) == list(range(10, 23))
+    assert buffer.dropped == 10
+    assert os.stat(SPILL)[6] <= 10 * RECORD_SIZE
+
+
+def test_released_readings_are_compacted_away_before_the_file_outgrows_its_limit(clock):
+    buffer = SampleBuffer(4, SPILL, spill_max_records=8)
+    push(buffer, 0, 9)  # 8 on flash
+    buffer.release(6)
+    push(buffer, 9, 7)  # another spill needs the room taken by the released readings
+    assert timestamps(buffer) == list(range(6, 16))
+    assert buffer.dropped == 0
+    assert os.stat(SPILL)[6] == 6 * RECORD_SIZE
+
+
+def test_released_readings_are_not_replayed_after_a_reset(clock):
+    # RAM does not survive the reset; what was spilled does, less what was released
+    buffer = SampleBuffer(4, SPILL)
+    push(buffer, 0, 9)
+    buffer.release(3)
+    assert drained(SampleBuffer(4, SPILL)) == [3, 4, 5, 6, 7]
+
+    buffer = SampleBuffer(4, SPILL)
+    push(buffer, 0, 9)
+    sent = []
+
+    async def publish_two(*reading):
+        if len(sent) == 2:
+            raise OSError("connection lost")
+        sent.append(reading[4])
+    with pytest.raises(OSError):
+        asyncio.run(buffer.drain(publish_two))
+    assert timestamps(SampleBuffer(4, SPILL)) == list(range(2, 8))
+
+
+def test_clock_step_shifts_the_readings_of_this_boot_also_on_flash(clock):
+    buffer = SampleBuffer(4, SPILL)
+    push(buffer, 0, 8)
+    buffer.persist()
+    buffer.release(2)
+
+    buffer = SampleBuffer(4, SPILL)  # reset before the first time sync
+    push(buffer, 100, 9)  # 8 of them spilled behind the earlier run's readings
+    assert buffer.shift_timestamps(1000) == 9
+    assert timestamps(buffer) == list(range(2, 8)) + list(range(1100, 1109))
+    # Compacting on the way moved where this boot's readings start; later steps still find them
+    buffer.release(7)
+    assert buffer.shift_timestamps(-100) == 8
+    assert drained(buffer) == list(range(1001, 1009))
+
+def test_torn_record_is_dropped_and_later_spills_stay_aligned(clock):
+    buffer = SampleBuffer(4, SPILL)
+    push(buffer, 0, 5)
+    with open(SPILL, "ab") as f:
+        f.write(b"\x01" * (RECORD_SIZE // 2))  # power lost in the middle of a spill
+
+    buffer = SampleBuffer(4, SPILL)
+    assert len(buffer) == 4
+    push(buffer, 4, 5)
+    assert drained(buffer) == list(range(9))
+
+
+def test_partial_spill_write_keeps_each_reading_once(clock, monkeypatch):
+    buffer = SampleBuffer(4, SPILL)
+    push(buffer, 0, 4)
+
+    class FullFlash:
+        """Writes a record and a half, then fails like a full filesystem."""
+
+        def __init__(self, path, mode):
+            self.file = open(path, mode)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.file.close()
+
+        def write(self, data):
+            self.file.write(bytes(data[:RECORD_SIZE + RECORD_SIZE // 2]))
+            raise OSError(28, "ENOSPC")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(sample_buffer, "open", FullFlash, raising=False)
+        push(buffer, 4, 1)
+    assert buffer.spilled == 1 and buffer.count == 4
+
+    push(buffer, 5, 3)
+    assert drained(buffer) == list(range(8))
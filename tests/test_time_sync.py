@@ -0,0 +1,107 @@
+import asyncio
+
+from fake_ntp import FakeNtpServer
+import time_sync
+from time_sync import TimeSync
+
+TOLERANCE_MS = 20  # loopback round trips and the 5 ms reply polling
+
+
+def error_ms(sync, server):
+    return sync.now_ms() - server.server_time() * 1000
+
+
+def run_with_server(clock, check, **server_options):
+    async def main():
+        server = await FakeNtpServer(port=0, now=clock.time, **server_options).start()
+        try:
+            await check(TimeSync("127.0.0.1", server.port), server)
+        finally:
+            server.stop()
+    asyncio.run(main())
+
+
+def test_first_sync_steps_the_rtc(clock):
+    async def check(sync, server):
+        steps = time_sync._steps.value
+        corrections = []
+        sync.on_first_sync = corrections.append
+        assert sync.now_ms() // 1000 == int(clock.rtc_time())  # unsynced: plain RTC time
+
+        assert await sync.sync()
+        assert sync.synced()
+        assert time_sync._steps.value == steps + 1
+        assert abs(clock.rtc_time() - server.server_time()) < 1  # whole seconds stepped
+        assert abs(sync.last_correction_ms - 30000) < TOLERANCE_MS
+        assert corrections == [sync.last_correction_ms]
+        assert abs(error_ms(sync, server)) < TOLERANCE_MS
+
+    run_with_server(clock, check, offset=30)
+
+
+def test_small_offset_is_slewed_not_stepped(clock):
+    async def check(sync, server):
+        assert await sync.sync()
+        steps = time_sync._steps.value
+        server.offset += 0.5  # NTP time jumps 500 ms, below step_threshold
+        before = sync.now_ms()
+
+        assert await sync.sync()
+        assert time_sync._steps.value == steps
+        assert sync.last_correction_ms == 0
+        after = sync.now_ms()
+        assert 0 <= after - before < TOLERANCE_MS  # no jump, still monotonic
+        assert abs(error_ms(sync, server) + 500) < TOLERANCE_MS
+
+        # max_slew_ppm=500 closes 500 ms within 1000 s
+        clock.advance(1100)
+        assert abs(error_ms(sync, server)) < TOLERANCE_MS
+
+    run_with_server(clock, check, offset=3)
+
+
+def test_offset_beyond_threshold_steps_again(clock):
+    async def check(sync, server):
+        assert await sync.sync()
+        steps = time_sync._steps.value
+        server.offset += 5
+
+        assert await sync.sync()
+        assert time_sync._steps.value == steps + 1
+        assert abs(sync.last_correction_ms - 5000) < TOLERANCE_MS
+        assert abs(error_ms(sync, server)) < TOLERANCE_MS
+
+    run_with_server(clock, check, offset=3)
+
+
+def test_drift_is_estimated_and_followed_between_syncs(clock):
+    async def check(sync, server):
+        assert await sync.sync()
+        assert sync.drift is None
+
+        clock.advance(time_sync.MIN_DRIFT_INTERVAL_MS // 1000 - 60)
+        assert await sync.sync()
+        assert sync.drift is None  # too soon after the last sync to measure
+
+        clock.advance(120)
+        assert await sync.sync()
+        assert abs(sync.drift * 1000000 - 200) < 20
+
+        # An hour without a sync: now() keeps up with the server's extra 720 ms
+        clock.advance(3600)
+        assert abs(error_ms(sync, server)) < 4 * TOLERANCE_MS
+
+    run_with_server(clock, check, offset=3, drift_ppm=200)
+
+
+def test_failed_sync_keeps_the_clock(clock):
+    async def check(sync, server):
+        server.stop()
+        sync.timeout = 0.1
+        failures = time_sync._failures.value
+        assert not await sync.sync()
+        assert not sync.synced()
+        assert time_sync._failures.value == failures + 1
+        assert sync.offset_ms() == 0
+
+    run_with_server(clock, check, offset=3)
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import os
+
+import network
+import wifi
+
+CACHE = "wifi_cache.json"
+
+
+def connect(**options):
+    """One boot: fresh radio state and a new WiFi object, as after a reset."""
+    network.reset()
+    wlan = wifi.WiFi(cache_path=CACHE, **options)
+
+    async def main():
+        try:
+            return await wlan.connect_async("sim", "secret")
+        finally:
+            wlan.stop_monitor()
+    return asyncio.run(main()), wlan
+
+
+def cache():
+    with open(CACHE) as f:
+        return json.load(f)
+
+
+def outage_from_now(clock, seconds):
+    network._outages[:] = [(clock.elapsed(), clock.elapsed() + seconds)]
+
+
+def test_full_connect_caches_the_access_point_and_next_boot_takes_the_fast_path(fast_clock):
+    network._outages[:] = []
+    connected, wlan = connect()
+    assert connected and wlan.last_connect_path == "full"
+    assert cache()["bssid"] == network.BSSID.hex() and cache()["failures"] == 0
+
+    connected, wlan = connect()
+    assert connected and wlan.last_connect_path == "fast"
+    assert wlan.last_connect_ms < network.FULL_CONNECT_SECONDS * 1000
+
+
+def test_failed_fast_path_falls_back_to_a_full_connect_and_keeps_the_cache(fast_clock):
+    network._outages[:] = []
+    connect()
+    for failures in range(1, wifi.FAST_CONNECT_MAX_FAILURES):
+        outage_from_now(fast_clock, wifi.FAST_CONNECT_TIMEOUT + 1)
+        connected, wlan = connect()
+        assert connected and wlan.last_connect_path == "full"
+        assert cache()["failures"] == failures
+
+    # One more miss drops the cache; the full connect that follows writes a fresh one
+    outage_from_now(fast_clock, wifi.FAST_CONNECT_TIMEOUT + 1)
+    connected, wlan = connect()
+    assert connected and wlan.last_connect_path == "full"
+    assert cache()["failures"] == 0
+
+    network._outages[:] = []
+    connected, wlan = connect()
+    assert wlan.last_connect_path == "fast"
+
+
+def test_fast_path_success_resets_the_failure_count(fast_clock):
+    network._outages[:] = []
+    connect()
+    outage_from_now(fast_clock, wifi.FAST_CONNECT_TIMEOUT + 1)
+    connect()
+    assert cache()["failures"] == 1
+
+    network._outages[:] = []
+    connected, wlan = connect()
+    assert wlan.last_connect_path == "fast"
+    assert cache()["failures"] == 0
+
+
+def test_unreadable_bssid_is_not_looked_up_with_a_scan(fast_clock, monkeypatch):
+    network._outages[:] = []
+    config = network.WLAN.config
+
+    def config_without_bssid(self, param=None, **kwargs):
+        if param == "bssid":
+            raise ValueError("unknown config param")  # as on the Pico W
+        return config(self, param, **kwargs)
+
+    def scan(self):
+        raise AssertionError("scan() blocks for seconds")
+
+    monkeypatch.setattr(network.WLAN, "config", config_without_bssid)
+    monkeypatch.setattr(network.WLAN, "scan", scan)
+    connected, wlan = connect()
+    assert connected
+    assert cache()["bssid"] is None
+
+    # Nothing to skip without a BSSID or a reusable lease: straight to the full connect
+    connected, wlan = connect()
+    assert connected and wlan.last_connect_path == "full"
+    assert os.path.exists(CACHE)
+
+
+def test_monitor_polls_slowly_while_up_and_sees_a_lost_link_within_one_poll(fast_clock):
+    network._outages[:] = []
+    network.reset()
+    wlan = wifi.WiFi(cache_path=CACHE)
+
+    async def main():
+        try:
+            await wlan.connect_async("sim", "secret")
+            polls = wlan.polls
+            await asyncio.sleep(fast_clock.real_seconds(300))
+            idle_polls = wlan.polls - polls
+
+            lost_at = fast_clock.time()
+            outage_from_now(fast_clock, 60)
+            state = await asyncio.wait_for(wlan.wait_state_change(), fast_clock.real_seconds(30))
+            return idle_polls, state, fast_clock.time() - lost_at
+        finally:
+            wlan.stop_monitor()
+
+    idle_polls, state, detect_seconds = asyncio.run(main())
+    assert idle_polls <= 5 * 60000 // wifi.SLOW_POLL_MS + 2  # vs. 300 for a poll every second
+    assert state is False and not wlan.is_connected()
+    assert detect_seconds <= wifi.SLOW_POLL_MS / 1000 + 0.5
@@ -0,0 +1,166 @@
+"""Cross-compile the firmware in src/ to .mpy bytecode so the device does not compile on boot.
+
+Builds build/bundle-<version>/ containing:
+    *.mpy             every module in src/, main.py compiled as firmware.mpy
+    main.py           a three-line stub that imports firmware.mpy and runs it
+                      (MicroPython only runs main.py as source)
+    requirements.txt  copied from src/ for the first-boot package install
+    bundle.json       version, mpy-cross version and per-file sizes/hashes
+
+The bytecode must match the firmware: mpy-cross from the same MicroPython
+release as the board (pip install mpy-cross==<release>). config.py stays
+source so it can be edited on the device.
+
+With --manifest, a frozen-module manifest (build/manifest.py) and the
+main.py stub (build/frozen/main.py) are written instead, for building a
+custom firmware image with the modules frozen into flash (bytecode runs
+from flash, not RAM):
+    make -C ports/rp2 BOARD=RPI_PICO_W FROZEN_MANIFEST=/path/to/build/manifest.py
+
+Usage:
+    python tools/build_bundle.py [--mpy-cross mpy-cross] [--march armv6m] [--version v1] [--manifest]
+
+Deploy the bundle (remove any .py copies of the same modules first, the
+device prefers .py over .mpy):
+    mpremote fs cp build/bundle-<version>/* :/
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, "src")
+BUILD_DIR = os.path.join(ROOT, "build")
+
+# Modules that stay source: config is edited per device, the template is not deployed
+SKIP = ("config.py", "config_template.py")
+ENTRY_MODULE = "firmware"  # name main.py is compiled under
+
+MAIN_STUB = f"""# Generated by tools/build_bundle.py: the application is precompiled in {ENTRY_MODULE}.mpy
+import uasyncio as asyncio
+import {ENTRY_MODULE}
+asyncio.run({ENTRY_MODULE}.main())
+"""
+
+
+def source_modules():
+    return sorted(name for name in os.listdir(SRC_DIR) if name.endswith(".py") and name not in SKIP)
+
+
+def bundle_version():
+    """git describe of the working tree, or a timestamp outside a repository."""
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], cwd=ROOT, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+
+
+def mpy_cross_version(mpy_cross):
+    try:
+        return subprocess.run([mpy_cross, "--version"], check=True, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        sys.exit(f"{mpy_cross} not found; install it with: pip install mpy-cross==<MicroPython release of the board>")
+
+
+def compile_module(mpy_cross, source, output, module_name, march=None):
+    command = [mpy_cross, "-o", output, "-s", module_name + ".py"]
+    if march:
+        command.append(f"-march={march}")
+    subprocess.run(command + [source], check=True)
+
+
+def file_info(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return {"bytes": len(data), "sha256": hashlib.sha256(data).hexdigest()}
+
+
+def build_bundle(args):
+    version = args.version or bundle_version()
+    compiler = mpy_cross_version(args.mpy_cross)
+    out_dir = os.path.join(BUILD_DIR, f"bundle-{version}")
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+
+    files = {}
+    for name in source_modules():
+        module = name[:-3]
+        if name == "main.py":
+            module = ENTRY_MODULE
+        output = os.path.join(out_dir, module + ".mpy")
+        compile_module(args.mpy_cross, os.path.join(SRC_DIR, name), output, module, args.march)
+        files[module + ".mpy"] = dict(file_info(output), source=name, source_bytes=os.path.getsize(os.path.join(SRC_DIR, name)))
+
+    with open(os.path.join(out_dir, "main.py"), "w") as f:
+        f.write(MAIN_STUB)
+    files["main.py"] = file_info(os.path.join(out_dir, "main.py"))
+    shutil.copy(os.path.join(SRC_DIR, "requirements.txt"), out_dir)
+    files["requirements.txt"] = file_info(os.path.join(out_dir, "requirements.txt"))
+
+    info = {
+        "version": version,
+        "mpy_cross": compiler,
+        "march": args.march,
+        "built": datetime.datetime.now().isoformat(timespec="seconds"),
+        "files": files,
+    }
+    with open(os.path.join(out_dir, "bundle.json"), "w") as f:
+        json.dump(info, f, indent=2)
+        f.write("\n")
+
+    total_source = sum(entry.get("source_bytes", 0) for entry in files.values())
+    total_mpy = sum(entry["bytes"] for name, entry in files.items() if name.endswith(".mpy"))
+    print(f"Built {out_dir} ({info['mpy_cross']})")
+    print(f"{len(files) - 2} modules: {total_source} bytes of source -> {total_mpy} bytes of bytecode")
+    return out_dir
+
+
+def write_manifest():
+    """Write a frozen-module manifest for the MicroPython build system, plus the main.py stub."""
+    frozen_dir = os.path.join(BUILD_DIR, "frozen")
+    if os.path.isdir(frozen_dir):
+        shutil.rmtree(frozen_dir)
+    os.makedirs(frozen_dir)
+    # Frozen modules cannot be renamed in the manifest, so freeze a copy of main.py as firmware.py
+    shutil.copy(os.path.join(SRC_DIR, "main.py"), os.path.join(frozen_dir, ENTRY_MODULE + ".py"))
+    with open(os.path.join(frozen_dir, "main.py"), "w") as f:
+        f.write(MAIN_STUB)
+
+    lines = [
+        "# Generated by tools/build_bundle.py --manifest",
+        'include("$(PORT_DIR)/boards/manifest.py")',
+        f'module("{ENTRY_MODULE}.py", base_path="{frozen_dir}", opt=3)',
+    ]
+    for name in source_modules():
+        if name != "main.py":
+            lines.append(f'module("{name}", base_path="{SRC_DIR}", opt=3)')
+    path = os.path.join(BUILD_DIR, "manifest.py")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    print(f"Wrote {path}")
+    print(f"Copy {os.path.join(frozen_dir, 'main.py')}, config.py and requirements.txt to the device after flashing")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mpy-cross", default="mpy-cross", help="mpy-cross executable")
+    parser.add_argument("--march", help="native code architecture, armv6m for the Pico W (only matters for @native)")
+    parser.add_argument("--version", help="bundle version (default: git describe)")
+    parser.add_argument("--manifest", action="store_true", help="write a frozen-module manifest instead")
+    args = parser.parse_args()
+    if args.manifest:
+        write_manifest()
+    else:
+        build_bundle(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Decode binary log files (logger.set_file_format("binary")) back to text on the host.
+
+Usage:
+    python tools/decode_log.py log.log.2 log.log.1 log.log [--strings log.log.str]
+
+Files are decoded in the order given, so list rotated backups oldest first.
+The string table defaults to <first file without rotation suffix>.str.
+"""
+import argparse
+import struct
+import sys
+
+HEADER_FORMAT = "<BIHB"  # level, timestamp, message id, argument count (see src/logger.py)
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+LEVELS = {0: "[DEBUG]", 1: "[INFO]", 2: "[WARNING]", 3: "[ERROR]"}
+
+
+def load_strings(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line[:-1].replace("\\n", "\n") for line in f]
+
+
+def decode_records(data, strings):
+    """Yield (level, timestamp, message) for every record in data."""
+    offset = 0
+    while offset + HEADER_SIZE <= len(data):
+        level, timestamp, msg_id, count = struct.unpack_from(HEADER_FORMAT, data, offset)
+        offset += HEADER_SIZE
+        args = []
+        for _ in range(count):
+            tag = data[offset:offset + 1]
+            offset += 1
+            if tag == b"b":
+                args.append(data[offset])
+                offset += 1
+            elif tag == b"h":
+                args.append(struct.unpack_from("<h", data, offset)[0])
+                offset += 2
+            elif tag == b"i":
+                args.append(struct.unpack_from("<i", data, offset)[0])
+                offset += 4
+            elif tag == b"f":
+                args.append(float("%.6g" % struct.unpack_from("<f", data, offset)[0]))
+                offset += 4
+            elif tag == b"s":
+                length = data[offset]
+                args.append(data[offset + 1:offset + 1 + length].decode("utf-8", "replace"))
+                offset += 1 + length
+            else:
+                raise ValueError(f"Corrupt record at byte {offset - 1}: unknown argument tag {tag!r}")
+
+        fmt = strings[msg_id] if msg_id < len(strings) else f"<unknown message {msg_id}>"
+        try:
+            message = fmt % tuple(args) if args else fmt
+        except (TypeError, ValueError):
+            message = f"{fmt} {args!r}"
+        yield level, timestamp, message
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--strings", help="string table file (default: <log>.str)")
+    args = parser.parse_args(argv)
+
+    strings_path = args.strings
+    if strings_path is None:
+        base = args.files[0]
+        stem, _, suffix = base.rpartition(".")
+        if stem and suffix.isdigit():
+            base = stem
+        strings_path = base + ".str"
+    strings = load_strings(strings_path)
+
+    for path in args.files:
+        with open(path, "rb") as f:
+            data = f.read()
+        for level, timestamp, message in decode_records(data, strings):
+            print(f"{LEVELS.get(level, f'[LEVEL {level}]')} [{timestamp}]: {message}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
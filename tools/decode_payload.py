@@ -0,0 +1,34 @@
+"""Decode binary sensor payloads (PAYLOAD_FORMAT = "struct") back to JSON on the host.
+
+Usage:
+    python tools/decode_payload.py 0101...            # hex string, e.g. copied from an MQTT client
+    python tools/decode_payload.py -f payload.bin     # raw payload saved to a file
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from encoders import decode_struct  # noqa: E402
+
+
+def main(argv):
+    if len(argv) == 2 and argv[1] == "-":
+        payload = sys.stdin.buffer.read()
+    elif len(argv) == 3 and argv[1] == "-f":
+        with open(argv[2], "rb") as f:
+            payload = f.read()
+    elif len(argv) == 2:
+        payload = bytes.fromhex(argv[1])
+    else:
+        print(__doc__)
+        return 2
+
+    for reading in decode_struct(payload):
+        print(json.dumps(reading))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
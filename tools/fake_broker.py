@@ -0,0 +1,150 @@
+"""Local MQTT broker stand-in for exercising the device-side MQTT code on the host.
+
+Speaks just enough MQTT 3.1.1 for src/mqtt_async.py: CONNECT/CONNACK,
+PUBLISH (QoS 0 and 1, answered with PUBACK), PINGREQ/PINGRESP and DISCONNECT.
+Received messages are kept in FakeBroker.messages. Clients connecting with
+clean session off get the "session present" flag when they reconnect;
+retransmissions (DUP flag) are counted in FakeBroker.duplicates.
+
+Usage:
+    python tools/fake_broker.py --port 1883 [--latency-ms 100] [--jitter-ms 50]
+
+or from Python (CPython asyncio):
+    broker = FakeBroker(port=0)
+    await broker.start()
+    ... connect a client to ("127.0.0.1", broker.port) ...
+    await broker.stop()
+"""
+import argparse
+import asyncio
+import random
+
+
+class FakeBroker:
+    def __init__(self, host="127.0.0.1", port=1883, latency_ms=0, verbose=False, jitter_ms=0):
+        """
+        Args:
+            host (str): address to listen on
+            port (int): port to listen on, 0 picks a free one
+            latency_ms (int): delay added before every reply, to mimic a slow link
+            jitter_ms (int): up to this much extra random delay per reply; PUBACKs then arrive out of order
+            verbose (bool): print every received message
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.verbose = verbose
+        self.messages = []  # (topic, payload, qos)
+        self.connects = 0
+        self.pings = 0
+        self.duplicates = 0
+        self.sessions = set()  # client ids connected with clean session off
+        self.accepting = True
+        self._server = None
+        self._clients = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.drop_clients()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def drop_clients(self):
+        """Close every client connection, as if the broker went away."""
+        for writer in list(self._clients):
+            writer.close()
+        self._clients.clear()
+
+    async def _reply(self, writer, packet):
+        delay = self.latency + (random.random() * self.jitter if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if not writer.is_closing():
+            writer.write(packet)
+            await writer.drain()
+
+    async def _handle(self, reader, writer):
+        if not self.accepting:
+            writer.close()
+            return
+        self._clients.add(writer)
+        try:
+            while True:
+                header, body = await read_packet(reader)
+                kind = header & 0xF0
+                if kind == 0x10:
+                    self.connects += 1
+                    clean = body[7] & 0x02
+                    client_len = body[10] << 8 | body[11]
+                    client_id = body[12:12 + client_len].decode()
+                    present = not clean and client_id in self.sessions
+                    if clean:
+                        self.sessions.discard(client_id)
+                    else:
+                        self.sessions.add(client_id)
+                    await self._reply(writer, b"\x20\x02" + bytes((int(present), 0)))
+                elif kind == 0x30:
+                    qos = (header >> 1) & 0x03
+                    topic_len = body[0] << 8 | body[1]
+                    topic = body[2:2 + topic_len].decode()
+                    offset = 2 + topic_len
+                    if qos:
+                        pid = body[offset:offset + 2]
+                        offset += 2
+                    if header & 0x08:
+                        self.duplicates += 1
+                    self.messages.append((topic, bytes(body[offset:]), qos))
+                    if self.verbose:
+                        print(f"{topic} (qos {qos}): {bytes(body[offset:])!r}")
+                    if qos:
+                        # Reply without blocking the read loop, so replies can overlap
+                        asyncio.ensure_future(self._reply(writer, b"\x40\x02" + pid))
+                elif kind == 0xC0:
+                    self.pings += 1
+                    await self._reply(writer, b"\xd0\x00")
+                elif kind == 0xE0:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+
+async def read_packet(reader):
+    header = (await reader.readexactly(1))[0]
+    length = 0
+    shift = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    body = await reader.readexactly(length) if length else b""
+    return header, body
+
+
+async def _serve(args):
+    broker = await FakeBroker(args.host, args.port, args.latency_ms, verbose=True, jitter_ms=args.jitter_ms).start()
+    print(f"Fake MQTT broker listening on {broker.host}:{broker.port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    parser.add_argument("--jitter-ms", type=int, default=0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,106 @@
+"""Local NTP server stand-in for exercising src/time_sync.py on the host.
+
+Answers SNTP client requests with a clock that can be offset from the
+host's and run fast or slow (drift), after an optional reply delay.
+
+Usage:
+    python tools/fake_ntp.py --port 1123 [--offset 3.5] [--drift-ppm 100] [--latency-ms 20]
+
+or from Python (CPython asyncio):
+    server = await FakeNtpServer(port=0, offset=3.5).start()
+    ... point a TimeSync at ("127.0.0.1", server.port) ...
+    server.stop()
+"""
+import argparse
+import asyncio
+import struct
+import time
+
+NTP_DELTA = 2208988800  # 1900 to 1970
+
+
+class FakeNtpServer(asyncio.DatagramProtocol):
+    def __init__(self, host="127.0.0.1", port=123, offset=0.0, drift_ppm=0, latency_ms=0, now=None, verbose=False):
+        """
+        Args:
+            host (str): address to listen on
+            port (int): UDP port to listen on, 0 picks a free one
+            offset (float): seconds the served time is ahead of now()
+            drift_ppm (float): how much faster than now() the served time runs
+            latency_ms (int): delay before every reply
+            now (callable or None): reference clock in seconds since 1970, default time.time
+            verbose (bool): print every request
+        """
+        self.host = host
+        self.port = port
+        self.offset = offset
+        self.drift = drift_ppm / 1000000
+        self.latency = latency_ms / 1000
+        self.now = now or time.time
+        self.verbose = verbose
+        self.requests = 0
+        self._started = None
+        self._transport = None
+
+    async def start(self):
+        self._started = self.now()
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host, self.port))
+        self.port = self._transport.get_extra_info("sockname")[1]
+        return self
+
+    def stop(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def server_time(self):
+        """The time this server hands out, in seconds since 1970."""
+        now = self.now()
+        return now + self.offset + (now - self._started) * self.drift
+
+    def datagram_received(self, data, addr):
+        if len(data) < 48:
+            return
+        self.requests += 1
+        received = self.server_time()
+        if self.verbose:
+            print(f"request from {addr[0]}:{addr[1]}")
+        asyncio.ensure_future(self._reply(data, addr, received))
+
+    async def _reply(self, request, addr, received):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self._transport is None:
+            return
+        reply = bytearray(48)
+        reply[0] = 0x24  # version 4, server mode
+        reply[1] = 2  # stratum
+        reply[24:32] = request[40:48]  # originate: the client's transmit timestamp
+        _pack(reply, 32, received)
+        _pack(reply, 40, self.server_time())
+        self._transport.sendto(reply, addr)
+
+
+def _pack(buffer, offset, seconds):
+    whole = int(seconds)
+    struct.pack_into("!II", buffer, offset, whole + NTP_DELTA, int((seconds - whole) * 2 ** 32))
+
+
+async def _serve(args):
+    server = await FakeNtpServer(args.host, args.port, args.offset, args.drift_ppm, args.latency_ms, verbose=True).start()
+    print(f"Fake NTP server listening on {server.host}:{server.port} (offset {args.offset}s, drift {args.drift_ppm} ppm)")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=123)
+    parser.add_argument("--offset", type=float, default=0.0)
+    parser.add_argument("--drift-ppm", type=float, default=0)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
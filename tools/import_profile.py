@@ -0,0 +1,124 @@
+"""Time and heap cost of importing each firmware module. Runs on the device.
+
+Each module is imported with the garbage collector disabled, so the heap
+growth includes everything the import allocated: compiling the source (not
+needed for .mpy or frozen modules), the module's code objects and its
+module-level state. Modules are imported in dependency order, so each row is
+the cost that module adds on top of the ones above it.
+
+Run it on a freshly reset board, before main.py has imported anything:
+    mpremote soft-reset run tools/import_profile.py
+
+or on the host from the repository root, with the MicroPython unix port or
+CPython; modules the host lacks (machine, network, ...) come from sim/:
+    micropython tools/import_profile.py
+    python tools/import_profile.py
+
+Prints one JSON object per line and a final line starting with "TOTAL".
+"""
+import gc
+import json
+import sys
+import time
+
+try:
+    import uos as os
+except ImportError:
+    import os
+
+try:
+    ticks_us = time.ticks_us
+    ticks_diff = time.ticks_diff
+except AttributeError:
+    def ticks_us():
+        return time.perf_counter_ns() // 1000
+
+    def ticks_diff(end, start):
+        return end - start
+
+MODULES = (
+    "metrics", "profiler", "logger", "encoders", "sample_buffer", "dns_cache", "mqtt_async",
+    "wifi", "utilities", "dependency_manager", "memory_guard", "change_detector",
+    "window_stats", "power", "broker_pool", "time_sync",
+)
+
+
+class _HostConfig:
+    """Stand-in for the device's config.py when profiling on the host."""
+    WIFI_SSID = ""
+    WIFI_PASSWORD = ""
+    MQTT_BROKER = "127.0.0.1"
+    MQTT_USER = ""
+    MQTT_PASSWORD = ""
+    SENSOR_NAME = "bme688"
+
+
+def setup_host():
+    """On the host (run from the repository root) import from src/, falling back to sim/."""
+    try:
+        os.stat("src/main.py")
+    except OSError:
+        return False
+    sys.path.insert(0, "src")
+    sys.path.append("sim")
+    if not hasattr(time, "ticks_ms"):
+        # CPython: add the MicroPython time functions the firmware uses
+        import clock
+        clock.install()
+    try:
+        import config  # noqa: F401
+    except ImportError:
+        sys.modules["config"] = _HostConfig
+    return True
+
+
+class _TracemallocHeap:
+    """gc.mem_alloc() for CPython: bytes allocated since start(), freed memory included."""
+
+    def __init__(self):
+        import tracemalloc
+        self.tracemalloc = tracemalloc
+        tracemalloc.start()
+
+    def mem_alloc(self):
+        return self.tracemalloc.get_traced_memory()[1]
+
+
+def entry_module():
+    """main.py is compiled as firmware.mpy in a bytecode bundle."""
+    try:
+        os.stat("firmware.mpy")
+        return "firmware"
+    except OSError:
+        return "main"
+
+
+def profile(modules):
+    heap = gc if hasattr(gc, "mem_alloc") else _TracemallocHeap()
+    total_us = 0
+    total_bytes = 0
+    for name in modules:
+        gc.collect()
+        gc.disable()
+        if heap is not gc:
+            heap.tracemalloc.reset_peak()
+        before = heap.mem_alloc()
+        started = ticks_us()
+        error = None
+        try:
+            __import__(name)
+        except Exception as e:
+            error = repr(e)
+        elapsed = ticks_diff(ticks_us(), started)
+        allocated = heap.mem_alloc() - before
+        gc.enable()
+        total_us += elapsed
+        total_bytes += allocated
+        print(json.dumps({"module": name, "us": elapsed, "bytes": allocated, "error": error}))
+    gc.collect()
+    free = gc.mem_free() if hasattr(gc, "mem_free") else None
+    print("TOTAL " + json.dumps({"us": total_us, "bytes": total_bytes, "free": free}))
+
+
+setup_host()
+profile(MODULES + (entry_module(),))
@@ -0,0 +1,147 @@
+"""Compare boot cost of the firmware deployed as source and as a precompiled bundle.
+
+For each variant the script deploys the files with mpremote, then:
+  1. runs tools/import_profile.py after a soft reset: import time and heap
+     allocated per module (compile included for source)
+  2. hard-resets the board --runs times and reads the console until main.py
+     logs "First publish <ms>ms after start (..., heap free <bytes>)"
+
+Results are printed as a table and written to --output as JSON.
+
+Usage:
+    python tools/build_bundle.py
+    python tools/measure_boot.py --port /dev/ttyACM0 --bundle build/bundle-<version> [--runs 3]
+
+config.py and the installed packages (lib/) are left on the device as they are.
+Requires mpremote and pyserial (pip install mpremote).
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT, "src")
+FIRST_PUBLISH = re.compile(r"First publish (\d+)ms after start.*heap free (\d+|None)")
+
+
+def mpremote(port, *args, capture=False):
+    command = ["mpremote", "connect", port] + list(args)
+    result = subprocess.run(command, check=True, capture_output=capture, text=True)
+    return result.stdout if capture else None
+
+
+def device_files(port):
+    listing = mpremote(port, "fs", "ls", ":", capture=True)
+    return [line.split()[-1] for line in listing.splitlines()[1:] if line.strip()]
+
+
+def firmware_modules():
+    return {name[:-3] for name in os.listdir(SRC_DIR) if name.endswith(".py")} - {"config", "config_template"} | {"firmware"}
+
+
+def deploy(port, files):
+    """Copy files to the device root after removing every other copy of the firmware modules."""
+    modules = firmware_modules()
+    stale = [name for name in device_files(port)
+             if name.endswith((".py", ".mpy")) and name.rsplit(".", 1)[0] in modules]
+    for name in stale:
+        mpremote(port, "fs", "rm", ":" + name)
+    mpremote(port, "fs", "cp", *files, ":")
+
+
+def source_files():
+    return [os.path.join(SRC_DIR, name) for name in sorted(os.listdir(SRC_DIR))
+            if (name.endswith(".py") and name not in ("config.py", "config_template.py")) or name == "requirements.txt"]
+
+
+def bundle_files(bundle):
+    return [os.path.join(bundle, name) for name in sorted(os.listdir(bundle)) if name != "bundle.json"]
+
+
+def import_profile(port):
+    output = mpremote(port, "soft-reset", "run", os.path.join(ROOT, "tools", "import_profile.py"), capture=True)
+    modules = []
+    total = None
+    for line in output.splitlines():
+        if line.startswith("TOTAL "):
+            total = json.loads(line[6:])
+        elif line.startswith("{"):
+            modules.append(json.loads(line))
+    return {"modules": modules, "total": total}
+
+
+def time_to_first_publish(port, timeout):
+    import serial
+
+    mpremote(port, "reset")
+    deadline = time.monotonic() + timeout
+    console = None
+    while console is None:
+        # The USB serial port disappears while the board reboots
+        try:
+            console = serial.Serial(port, 115200, timeout=1)
+        except serial.SerialException:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{port} did not come back after reset")
+            time.sleep(0.2)
+    try:
+        while time.monotonic() < deadline:
+            line = console.readline().decode(errors="replace")
+            match = FIRST_PUBLISH.search(line)
+            if match:
+                free = match.group(2)
+                return int(match.group(1)), None if free == "None" else int(free)
+    finally:
+        console.close()
+    raise TimeoutError(f"No first publish within {timeout}s")
+
+
+def measure(port, files, runs, timeout):
+    deploy(port, files)
+    result = import_profile(port)
+    result["boots"] = []
+    for _ in range(runs):
+        ms, free = time_to_first_publish(port, timeout)
+        result["boots"].append({"first_publish_ms": ms, "heap_free": free})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", required=True, help="serial port of the board, e.g. /dev/ttyACM0 or COM3")
+    parser.add_argument("--bundle", required=True, help="directory written by tools/build_bundle.py")
+    parser.add_argument("--runs", type=int, default=3, help="boots per variant")
+    parser.add_argument("--timeout", type=int, default=120, help="seconds to wait for the first publish")
+    parser.add_argument("--output", default="boot_results.json")
+    args = parser.parse_args()
+
+    results = {
+        "source": measure(args.port, source_files(), args.runs, args.timeout),
+        "bytecode": measure(args.port, bundle_files(args.bundle), args.runs, args.timeout),
+    }
+    with open(args.bundle + "/bundle.json") as f:
+        results["bundle"] = json.load(f)["version"]
+
+    print(f"{'variant':<10} {'import ms':>10} {'import bytes':>13} {'first publish ms':>17} {'heap free':>10}")
+    for variant in ("source", "bytecode"):
+        result = results[variant]
+        boots = result["boots"]
+        first_publish = sorted(boot["first_publish_ms"] for boot in boots)[len(boots) // 2]
+        frees = [boot["heap_free"] for boot in boots if boot["heap_free"] is not None]
+        total = result["total"] or {}
+        print(f"{variant:<10} {total.get('us', 0) / 1000:>10.1f} {total.get('bytes', 0):>13} {first_publish:>17} "
+              f"{min(frees) if frees else '-':>10}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+    print(f"results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())